@@ -27,6 +27,9 @@ def get_pipeline():
 async def run_pipeline_async(pipeline, user_id, messages, meta_time):
     return await pipeline.process_chat(user_id, messages, meta_time)
 
+async def run_turn_async(pipeline, user_id, content, meta_time, metadata):
+    return await pipeline.process_turn(user_id, content, meta_time, metadata)
+
 def json_response(data, status=200):
     return Response(
         json.dumps(data, ensure_ascii=False),
@@ -39,6 +42,13 @@ def create_app():
     CORS(app)
     app.config['DEBUG'] = settings.DEBUG
 
+    # Прогрев кеша конфигурации до первых запросов
+    try:
+        from app.config.production_config_manager import warm_up_config_cache
+        warm_up_config_cache()
+    except ImportError:
+        pass
+
     @app.route('/healthz')
     def health_check():
         return json_response({
@@ -74,6 +84,7 @@ def create_app():
                 'health': '/healthz',
                 'readiness': '/readyz',
                 'chat': '/api/chat',
+                'turn': '/api/turn',
                 'memory': {
                     'add': '/api/memory/<user_id>/add',
                     'search': '/api/memory/<user_id>/search', 
@@ -120,6 +131,40 @@ def create_app():
         except Exception as e:
             return json_response({'error': str(e), 'type': type(e).__name__}), 500
 
+    @app.route('/api/turn', methods=['POST'])
+    def turn():
+        """Один ход диалога: сохраняет сообщение в память и возвращает ответ"""
+        try:
+            data = request.get_json()
+            if not data:
+                return json_response({'error': 'No data provided'}), 400
+
+            user_id = data.get('user_id')
+            content = data.get('content')
+            metadata = data.get('metadata', {})
+            meta_time = data.get('metaTime')
+
+            if not user_id:
+                return json_response({'error': 'user_id is required'}), 400
+
+            if not content:
+                return json_response({'error': 'content is required'}), 400
+
+            pipeline = get_pipeline()
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                response = loop.run_until_complete(
+                    run_turn_async(pipeline, user_id, content, meta_time, metadata)
+                )
+            finally:
+                loop.close()
+
+            return json_response(response)
+
+        except Exception as e:
+            return json_response({'error': str(e), 'type': type(e).__name__}), 500
+
     # Memory Management Endpoints
     @app.route('/api/memory/<user_id>/add', methods=['POST'])
     def add_to_memory(user_id):
@@ -0,0 +1,118 @@
+"""
+Планировщик доставки многочастных ответов
+
+Отправляет части ответа MessageSplitter с их задержками и индикатором
+набора текста на таймерах event loop: обработчик апдейта не ждет и
+не спит, а оставшиеся части отменяются, когда пользователь пишет снова.
+"""
+import asyncio
+import logging
+import itertools
+from typing import Dict, List, Callable, Awaitable, Optional, Any, Set
+
+logger = logging.getLogger(__name__)
+
+SendCallable = Callable[[str], Awaitable[Any]]
+TypingCallable = Callable[[], Awaitable[Any]]
+
+
+class _Delivery:
+    """Состояние доставки одного ответа в один чат"""
+
+    __slots__ = ('parts', 'delays_ms', 'send', 'send_typing', 'index', 'handle', 'cancelled')
+
+    def __init__(self, parts: List[str], delays_ms: List[int], send: SendCallable,
+                 send_typing: Optional[TypingCallable]):
+        self.parts = parts
+        self.delays_ms = delays_ms
+        self.send = send
+        self.send_typing = send_typing
+        self.index = 0
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.cancelled = False
+
+
+class ReplyDeliveryScheduler:
+    """
+    Доставка частей ответа по таймерам.
+
+    Первая часть отправляется сразу, перед каждой следующей показывается
+    "печатает..." и выдерживается delays_ms[i]. Части одного чата уходят
+    строго по очереди: следующий таймер ставится после отправки предыдущей.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Any, _Delivery] = {}
+        # Ссылки на запущенные задачи: event loop держит только слабые
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, chat_id: Any, parts: List[str], delays_ms: Optional[List[int]],
+                 send: SendCallable, send_typing: Optional[TypingCallable] = None) -> None:
+        """Планирует доставку; предыдущая незавершенная доставка в этот чат отменяется"""
+        self.cancel(chat_id)
+
+        # Пустые части отбрасываются вместе со своими задержками
+        pairs = [(part, delay) for part, delay in itertools.zip_longest(parts, delays_ms or [], fillvalue=0)
+                 if part]
+        if not pairs:
+            return
+
+        delivery = _Delivery([part for part, _ in pairs], [delay for _, delay in pairs], send, send_typing)
+        self._pending[chat_id] = delivery
+        self._start(asyncio.get_running_loop(), chat_id, delivery)
+
+    def cancel(self, chat_id: Any) -> bool:
+        """Отменяет неотправленные части ответа; True если было что отменять"""
+        delivery = self._pending.pop(chat_id, None)
+        if not delivery:
+            return False
+
+        delivery.cancelled = True
+        if delivery.handle:
+            delivery.handle.cancel()
+        return True
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def _send_next(self, chat_id: Any, delivery: _Delivery) -> None:
+        if delivery.cancelled:
+            return
+
+        try:
+            await delivery.send(delivery.parts[delivery.index])
+        except Exception as e:
+            logger.error(f"Failed to deliver reply part to chat {chat_id}: {e}")
+            self._finish(chat_id, delivery)
+            return
+
+        delivery.index += 1
+        if delivery.index >= len(delivery.parts) or delivery.cancelled:
+            self._finish(chat_id, delivery)
+            return
+
+        if delivery.send_typing:
+            try:
+                await delivery.send_typing()
+            except Exception as e:
+                logger.debug(f"Failed to send typing action to chat {chat_id}: {e}")
+
+        loop = asyncio.get_running_loop()
+        delivery.handle = loop.call_later(
+            delivery.delays_ms[delivery.index] / 1000,
+            self._start, loop, chat_id, delivery
+        )
+
+    def _start(self, loop: asyncio.AbstractEventLoop, chat_id: Any, delivery: _Delivery) -> None:
+        task = loop.create_task(self._send_next(chat_id, delivery))
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Reply delivery task failed: {task.exception()}")
+
+    def _finish(self, chat_id: Any, delivery: _Delivery) -> None:
+        if self._pending.get(chat_id) is delivery:
+            del self._pending[chat_id]
@@ -0,0 +1,136 @@
+"""
+GCRA rate limiter для ботов: O(1) проверка, одно число состояния на ключ
+Поддерживает локальный backend (in-process) и Redis (общие лимиты между процессами)
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Redis опционален - без него лимиты действуют в пределах процесса
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalRateLimitBackend:
+    """
+    In-process хранилище TAT (theoretical arrival time) для GCRA.
+
+    Ключи упорядочены по последнему обращению; простаивающие ключи
+    (TAT в прошлом - их состояние эквивалентно отсутствию) вытесняются
+    с начала очереди за амортизированное O(1).
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def acquire(self, key: str, emission_interval: float, period: float) -> bool:
+        now = time.monotonic()
+
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + emission_interval
+            allowed = new_tat - period <= now + 1e-9
+
+            if allowed:
+                self._tat[key] = new_tat
+                self._tat.move_to_end(key)
+
+            self._evict_idle(now)
+
+        return allowed
+
+    def _evict_idle(self, now: float) -> None:
+        while self._tat:
+            oldest_key, oldest_tat = next(iter(self._tat.items()))
+            if oldest_tat > now and len(self._tat) <= self._max_keys:
+                break
+            del self._tat[oldest_key]
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+
+class RedisRateLimitBackend:
+    """Общее для всех процессов хранилище GCRA в Redis (атомарно через Lua)"""
+
+    # Время берется с сервера Redis, чтобы процессы с разными часами
+    # видели одно и то же состояние; ключ живет ровно до TAT
+    _GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local emission_interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + emission_interval
+if new_tat - period > now + 1e-9 then
+    return 0
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return 1
+"""
+
+    def __init__(self, redis_url: str, key_prefix: str = 'ratelimit:', socket_timeout: float = 0.5):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is required for the redis rate limit backend")
+
+        self._client = redis.Redis.from_url(redis_url, socket_timeout=socket_timeout,
+                                            socket_connect_timeout=socket_timeout)
+        self._script = self._client.register_script(self._GCRA_SCRIPT)
+        self._key_prefix = key_prefix
+
+    def acquire(self, key: str, emission_interval: float, period: float) -> bool:
+        return bool(self._script(keys=[f"{self._key_prefix}{key}"], args=[emission_interval, period]))
+
+    def __len__(self) -> int:
+        return 0  # Ключи истекают в Redis сами
+
+
+class GCRARateLimiter:
+    """
+    Rate limiter по алгоритму GCRA (эквивалент token bucket).
+
+    Пропускает до `limit` событий за `period` секунд (включая мгновенный
+    burst из `limit` событий). Состояние - одно число на ключ, проверка O(1).
+    При ошибке общего backend'а временно работает на локальном.
+    """
+
+    def __init__(self, limit: int, period: float, backend=None):
+        self.limit = max(1, int(limit))
+        self.period = float(period)
+        self.emission_interval = self.period / self.limit
+        self.backend = backend if backend is not None else LocalRateLimitBackend()
+        self._fallback = self.backend if isinstance(self.backend, LocalRateLimitBackend) else LocalRateLimitBackend()
+
+    def allow(self, key) -> bool:
+        """Регистрирует событие; False если лимит исчерпан"""
+        key = str(key)
+        try:
+            return self.backend.acquire(key, self.emission_interval, self.period)
+        except Exception as e:
+            logger.warning(f"Rate limit backend error, using local fallback: {e}")
+            return self._fallback.acquire(key, self.emission_interval, self.period)
+
+
+def create_rate_limit_backend(backend_type: str = 'local', redis_url: Optional[str] = None,
+                              key_prefix: str = 'ratelimit:'):
+    """Создает backend по имени из конфигурации (local | redis)"""
+    if backend_type == 'redis':
+        if redis_url and REDIS_AVAILABLE:
+            try:
+                return RedisRateLimitBackend(redis_url, key_prefix=key_prefix)
+            except Exception as e:
+                logger.warning(f"Failed to initialize redis rate limit backend: {e}")
+        logger.warning("Redis rate limit backend unavailable, falling back to local backend")
+
+    return LocalRateLimitBackend()
@@ -3,16 +3,18 @@ import os
 import json
 import asyncio
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Set
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import traceback
 
 # Импорты с fallback
 try:
     import telegram
     from telegram import Update, BotCommand
+    from telegram.constants import ChatAction
     from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
     TELEGRAM_AVAILABLE = True
 except ImportError:
@@ -24,13 +26,29 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
+# Сначала через пакет app: тот же модуль конфигурации, что у pipeline, - один менеджер на процесс
 try:
-    from config.production_config_manager import get_config
-    from memory.enhanced_buffer_memory import EnhancedBufferMemory
-    from memory.hybrid_memory import HybridMemory
-    from utils.time_utils import get_current_time
-except ImportError as e:
-    print(f"⚠️ Memory system imports not available: {e}")
+    from app.config.production_config_manager import get_config
+    from app.memory.enhanced_buffer_memory import EnhancedBufferMemory
+    from app.memory.hybrid_memory import HybridMemory
+    from app.utils.time_utils import get_current_time
+except ImportError:
+    try:
+        from config.production_config_manager import get_config
+        from memory.enhanced_buffer_memory import EnhancedBufferMemory
+        from memory.hybrid_memory import HybridMemory
+        from utils.time_utils import get_current_time
+    except ImportError as e:
+        print(f"⚠️ Memory system imports not available: {e}")
+
+try:
+    from .rate_limiter import GCRARateLimiter, create_rate_limit_backend
+    from .webhook import WebhookConfig, run_webhook
+    from .delivery import ReplyDeliveryScheduler
+except ImportError:
+    from rate_limiter import GCRARateLimiter, create_rate_limit_backend
+    from webhook import WebhookConfig, run_webhook
+    from delivery import ReplyDeliveryScheduler
 
 
 @dataclass
@@ -44,19 +62,25 @@ class BotConfig:
     max_message_length: int = 4096
     rate_limit_messages_per_minute: int = 20
     rate_limit_commands_per_hour: int = 100
+    rate_limit_backend: str = 'local'  # local | redis
+    rate_limit_redis_url: Optional[str] = None
+    session_idle_seconds: int = 3600
+    max_sessions: int = 10000
     commands: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     messages: Dict[str, str] = field(default_factory=dict)
     memory_integration: Dict[str, Any] = field(default_factory=dict)
     logging_config: Dict[str, Any] = field(default_factory=dict)
+    response_mode: str = 'embedded'  # embedded | http | none
+    api_base_url: str = 'http://localhost:5000'
+    response_timeout: int = 30
+    ingestion: Dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass
 class UserSession:
-    """Сессия пользователя для rate limiting"""
+    """Сессия пользователя (состояние rate limit хранится в GCRARateLimiter)"""
     user_id: int
     username: Optional[str]
-    message_times: List[datetime] = field(default_factory=list)
-    command_times: List[datetime] = field(default_factory=list)
     last_activity: datetime = field(default_factory=datetime.now)
     message_count: int = 0
     command_count: int = 0
@@ -73,15 +97,24 @@ class ProductionTelegramBot:
         self.config: Optional[BotConfig] = None
         self.application: Optional[Application] = None
         self.memory_system: Optional[HybridMemory] = None
+        self.pipeline = None  # AgathaPipeline в режиме embedded
+        self._pipeline_loop: Optional[asyncio.AbstractEventLoop] = None  # event loop pipeline (свой поток)
+        self._http_session = None  # aiohttp сессия в режиме http
         
-        # Сессии пользователей для rate limiting
-        self.user_sessions: Dict[int, UserSession] = {}
+        # Сессии пользователей (в порядке последней активности, простаивающие вытесняются)
+        self.user_sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        self.message_limiter: Optional[GCRARateLimiter] = None
+        self.command_limiter: Optional[GCRARateLimiter] = None
+        
+        # Доставка частей ответа с паузами (не блокирует обработчик)
+        self.delivery = ReplyDeliveryScheduler()
         
         # Статистика
         self.stats = {
             'messages_processed': 0,
             'commands_executed': 0,
             'memory_operations': 0,
+            'responses_generated': 0,
             'errors': 0,
             'started_at': datetime.now()
         }
@@ -92,7 +125,9 @@ class ProductionTelegramBot:
         # Инициализация
         self._load_config()
         self._setup_logging()
+        self._initialize_rate_limiters()
         self._initialize_memory_system()
+        self._initialize_response_engine()
         self._setup_bot()
     
     def _load_config(self):
@@ -129,6 +164,13 @@ class ProductionTelegramBot:
                 except (json.JSONDecodeError, ValueError) as e:
                     self.logger.warning(f"Failed to parse admin users from {admin_env_var}: {e}")
             
+            rate_limit_settings = bot_settings.get('rate_limit', {})
+            redis_url_env_var = rate_limit_settings.get('redis_url_env_var', 'REDIS_URL')
+            
+            # Генерация ответов: embedded / http / none
+            response_settings = bot_settings.get('response_generation', {})
+            api_url_env_var = response_settings.get('api_base_url_env_var', 'AGATHA_API_URL')
+            
             # Создаем конфигурацию
             self.config = BotConfig(
                 token=token,
@@ -137,12 +179,20 @@ class ProductionTelegramBot:
                 allowed_users=set(bot_settings.get('allowed_users', [])),
                 admin_users=admin_users,
                 max_message_length=bot_settings.get('max_message_length', 4096),
-                rate_limit_messages_per_minute=bot_settings.get('rate_limit', {}).get('messages_per_minute', 20),
-                rate_limit_commands_per_hour=bot_settings.get('rate_limit', {}).get('commands_per_hour', 100),
+                rate_limit_messages_per_minute=rate_limit_settings.get('messages_per_minute', 20),
+                rate_limit_commands_per_hour=rate_limit_settings.get('commands_per_hour', 100),
+                rate_limit_backend=rate_limit_settings.get('backend', 'local'),
+                rate_limit_redis_url=os.getenv(redis_url_env_var),
+                session_idle_seconds=rate_limit_settings.get('session_idle_seconds', 3600),
+                max_sessions=rate_limit_settings.get('max_sessions', 10000),
                 commands=bot_settings.get('commands', {}),
                 messages=bot_settings.get('messages', {}),
                 memory_integration=bot_settings.get('memory_integration', {}),
-                logging_config=bot_settings.get('logging', {})
+                logging_config=bot_settings.get('logging', {}),
+                response_mode=response_settings.get('mode', 'embedded'),
+                api_base_url=os.getenv(api_url_env_var) or response_settings.get('api_base_url', 'http://localhost:5000'),
+                response_timeout=response_settings.get('timeout', 30),
+                ingestion=bot_settings.get('ingestion', {})
             )
             
             self.logger.info(f"Bot config loaded successfully. Admin users: {len(admin_users)}")
@@ -167,6 +217,16 @@ class ProductionTelegramBot:
         telegram_logger = logging.getLogger('telegram')
         telegram_logger.setLevel(logging.WARNING)  # Меньше спама
     
+    def _initialize_rate_limiters(self):
+        """Создает GCRA лимитеры сообщений и команд"""
+        backend = create_rate_limit_backend(
+            self.config.rate_limit_backend,
+            redis_url=self.config.rate_limit_redis_url,
+            key_prefix='telegram_bot:ratelimit:'
+        )
+        self.message_limiter = GCRARateLimiter(self.config.rate_limit_messages_per_minute, 60, backend)
+        self.command_limiter = GCRARateLimiter(self.config.rate_limit_commands_per_hour, 3600, backend)
+    
     def _initialize_memory_system(self):
         """Инициализирует систему памяти"""
         try:
@@ -176,6 +236,59 @@ class ProductionTelegramBot:
             self.logger.error(f"Failed to initialize memory system: {e}")
             self.memory_system = None
     
+    def _initialize_response_engine(self):
+        """Инициализирует генерацию ответов (embedded pipeline или HTTP API)"""
+        if self.config.response_mode != 'embedded':
+            self.logger.info(f"Response generation mode: {self.config.response_mode}")
+            return
+        
+        try:
+            # Pipeline делит с ботом процесс (реестр памяти пользователей и кеши
+            # конфигурации общие), но работает в своем event loop в отдельном потоке:
+            # синхронные узлы (psycopg2, эмбеддинги, Redis) не блокируют апдейты бота
+            from app.graph.pipeline import AgathaPipeline
+            self.pipeline = AgathaPipeline()
+            self._pipeline_loop = asyncio.new_event_loop()
+            threading.Thread(target=self._pipeline_loop.run_forever,
+                             name='agatha-pipeline', daemon=True).start()
+            self.logger.info("Embedded AgathaPipeline initialized")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize embedded pipeline, falling back to store-only mode: {e}")
+            self.pipeline = None
+            self.config.response_mode = 'none'
+    
+    async def _generate_reply(self, telegram_user_id: str, message_text: str,
+                              metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Генерирует ответ на сообщение.
+        
+        Возвращает ответ pipeline ({'parts', 'has_question', 'delays_ms', 'memory'})
+        или None, если генерация отключена. Сообщение сохраняется в память
+        самим pipeline.
+        """
+        if self.config.response_mode == 'embedded' and self.pipeline:
+            future = asyncio.run_coroutine_threadsafe(
+                self.pipeline.process_turn(telegram_user_id, message_text, metadata=metadata),
+                self._pipeline_loop
+            )
+            return await asyncio.wrap_future(future)
+        
+        if self.config.response_mode == 'http':
+            import aiohttp
+            if self._http_session is None or self._http_session.closed:
+                self._http_session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.config.connection_pool_size),
+                    timeout=aiohttp.ClientTimeout(total=self.config.response_timeout)
+                )
+            async with self._http_session.post(
+                f"{self.config.api_base_url}/api/turn",
+                json={'user_id': telegram_user_id, 'content': message_text, 'metadata': metadata}
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+        
+        return None
+    
     def _setup_bot(self):
         """Настраивает Telegram бота"""
         if not self.config:
@@ -226,37 +339,37 @@ class ProductionTelegramBot:
     
     def _get_user_session(self, user_id: int, username: Optional[str] = None) -> UserSession:
         """Получает или создает сессию пользователя"""
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = UserSession(user_id=user_id, username=username)
+        session = self.user_sessions.get(user_id)
+        if session is None:
+            session = UserSession(user_id=user_id, username=username)
+            self.user_sessions[user_id] = session
+        else:
+            self.user_sessions.move_to_end(user_id)
         
-        session = self.user_sessions[user_id]
         session.last_activity = datetime.now()
+        self._evict_idle_sessions(session.last_activity)
         return session
     
+    def _evict_idle_sessions(self, now: datetime):
+        """Вытесняет простаивающие сессии (самые старые - в начале)"""
+        idle_cutoff = now - timedelta(seconds=self.config.session_idle_seconds)
+        while self.user_sessions:
+            oldest = next(iter(self.user_sessions.values()))
+            if oldest.last_activity > idle_cutoff and len(self.user_sessions) <= self.config.max_sessions:
+                break
+            del self.user_sessions[oldest.user_id]
+    
     def _check_rate_limit(self, user_id: int, is_command: bool = False) -> bool:
         """Проверяет rate limit для пользователя"""
         session = self._get_user_session(user_id)
-        now = datetime.now()
         
         if is_command:
-            # Очищаем старые команды (старше часа)
-            cutoff = now - timedelta(hours=1)
-            session.command_times = [t for t in session.command_times if t > cutoff]
-            
-            if len(session.command_times) >= self.config.rate_limit_commands_per_hour:
+            if not self.command_limiter.allow(f"cmd:{user_id}"):
                 return False
-            
-            session.command_times.append(now)
             session.command_count += 1
         else:
-            # Очищаем старые сообщения (старше минуты)
-            cutoff = now - timedelta(minutes=1)
-            session.message_times = [t for t in session.message_times if t > cutoff]
-            
-            if len(session.message_times) >= self.config.rate_limit_messages_per_minute:
+            if not self.message_limiter.allow(f"msg:{user_id}"):
                 return False
-            
-            session.message_times.append(now)
             session.message_count += 1
         
         return True
@@ -355,6 +468,7 @@ class ProductionTelegramBot:
 • Сообщений обработано: {self.stats['messages_processed']}
 • Команд выполнено: {self.stats['commands_executed']}
 • Операций памяти: {self.stats['memory_operations']}
+• Ответов сгенерировано: {self.stats['responses_generated']}
 • Ошибок: {self.stats['errors']}
 • Активных сессий: {len(self.user_sessions)}
 
@@ -401,6 +515,8 @@ class ProductionTelegramBot:
 • Разрешенные: {len(self.config.allowed_users) if self.config.allowed_users else 'все'}
 • Админы: {len(self.config.admin_users)}
 
+💬 Генерация ответов: {self.config.response_mode}
+
 🧠 Интеграция памяти:
 • Сохранение диалогов: {self.config.memory_integration.get('store_conversations', False)}
 • Префикс пользователей: {self.config.memory_integration.get('user_prefix', 'telegram_user_')}
@@ -606,6 +722,10 @@ class ProductionTelegramBot:
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик обычных сообщений"""
         user_id = update.effective_user.id
+        chat_id = update.effective_chat.id
+        
+        # Пользователь написал снова - недоставленные части прошлого ответа уже неактуальны
+        self.delivery.cancel(chat_id)
         
         if not self._check_rate_limit(user_id):
             return
@@ -622,21 +742,37 @@ class ProductionTelegramBot:
                 await update.message.reply_text(f"❌ Сообщение слишком длинное (макс. {self.config.max_message_length} символов)")
                 return
             
-            # Сохраняем в память если включено
-            if self.config.memory_integration.get('store_conversations', True) and self.memory_system:
-                telegram_user_id = f"{self.config.memory_integration.get('user_prefix', 'telegram_user_')}{user_id}"
-                
+            telegram_user_id = f"{self.config.memory_integration.get('user_prefix', 'telegram_user_')}{user_id}"
+            metadata = {
+                'source': 'telegram_bot',
+                'telegram_user_id': user_id,
+                'telegram_username': update.effective_user.username,
+                'chat_id': chat_id,
+                'message_id': update.message.message_id
+            }
+            
+            # Генерируем ответ (pipeline сам сохраняет сообщение в память)
+            reply = await self._generate_reply(telegram_user_id, message_text, metadata)
+            
+            if reply is not None:
+                parts = reply.get('parts', [])
+                if parts:
+                    self.delivery.schedule(
+                        chat_id, parts, reply.get('delays_ms'),
+                        send=update.message.reply_text,
+                        send_typing=lambda: context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+                    )
+                    self.stats['responses_generated'] += 1
+                if reply.get('memory', {}).get('short_term'):
+                    self.stats['memory_operations'] += 1
+            
+            elif self.config.memory_integration.get('store_conversations', True) and self.memory_system:
+                # Генерация отключена - только сохраняем в память
                 result = self.memory_system.add_message(
                     user_id=telegram_user_id,
                     message=message_text,
                     role="user",
-                    metadata={
-                        'source': 'telegram_bot',
-                        'telegram_user_id': user_id,
-                        'telegram_username': update.effective_user.username,
-                        'chat_id': update.effective_chat.id,
-                        'message_id': update.message.message_id
-                    }
+                    metadata=metadata
                 )
                 
                 if result:
@@ -700,11 +836,33 @@ class ProductionTelegramBot:
         
         self.logger.info("Starting Telegram bot...")
         
+        if self.config.ingestion.get('mode', 'polling') == 'webhook':
+            # Webhook: ingress + партиционированные воркеры (роль процесса из BOT_ROLE)
+            webhook_config = WebhookConfig.from_settings(self.config.ingestion)
+            await self.application.initialize()
+            if webhook_config.role != 'worker':
+                await self.setup_bot_commands()
+            try:
+                await run_webhook(self.application, webhook_config)
+            finally:
+                await self._release_resources()
+            return
+        
         # Настраиваем команды
         await self.setup_bot_commands()
         
         # Запускаем polling
-        await self.application.run_polling(drop_pending_updates=True)
+        try:
+            await self.application.run_polling(drop_pending_updates=True)
+        finally:
+            await self._release_resources()
+    
+    async def _release_resources(self):
+        """Закрывает HTTP сессию и останавливает event loop pipeline"""
+        if self._http_session and not self._http_session.closed:
+            await self._http_session.close()
+        if self._pipeline_loop and self._pipeline_loop.is_running():
+            self._pipeline_loop.call_soon_threadsafe(self._pipeline_loop.stop)
     
     def run(self):
         """Синхронный запуск бота"""
@@ -722,7 +880,12 @@ def main():
     try:
         # Пытаемся использовать ProductionConfigManager
         try:
-            from config.production_config_manager import config_manager
+            # Тот же модуль, что импортирует AgathaPipeline, - один кеш конфигурации на процесс
+            try:
+                from app.config.production_config_manager import config_manager, warm_up_config_cache
+            except ImportError:
+                from config.production_config_manager import config_manager, warm_up_config_cache
+            warm_up_config_cache()
             bot = ProductionTelegramBot(config_manager=config_manager)
         except ImportError:
             # Fallback: без config manager
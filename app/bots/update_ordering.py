@@ -0,0 +1,86 @@
+"""
+Порядок обработки апдейтов Telegram в polling режиме
+
+Апдейты разных чатов обрабатываются параллельно (до max_concurrent_updates),
+а апдейты одного чата - строго по очереди, в порядке поступления: следующее
+сообщение пользователя не обгоняет предыдущее и не пишет в память раньше
+него. Сначала берется блокировка чата и только потом общий слот, поэтому
+очередь одного активного чата не занимает слоты остальных.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+try:
+    from telegram.ext import BaseUpdateProcessor
+    TELEGRAM_AVAILABLE = True
+except ImportError:
+    TELEGRAM_AVAILABLE = False
+    BaseUpdateProcessor = object
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSerializer:
+    """
+    Блокировки по чатам: работа одного чата выполняется последовательно.
+    Блокировка удаляется, когда у чата не остается ожидающих.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Any, asyncio.Lock] = {}
+        self._waiters: Dict[Any, int] = {}
+
+    async def run(self, chat_id: Any, coroutine: Awaitable[Any]) -> Any:
+        """Выполняет coroutine после всех ранее поставленных работ этого чата"""
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._waiters[chat_id] = self._waiters.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                return await coroutine
+        finally:
+            self._waiters[chat_id] -= 1
+            if not self._waiters[chat_id]:
+                del self._waiters[chat_id]
+                del self._locks[chat_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+def update_chat_id(update: Any) -> Optional[int]:
+    """Чат апдейта (или пользователь, если чата нет); None - апдейт без чата"""
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, 'effective_user', None)
+    return user.id if user is not None else None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Процессор апдейтов: параллельно по чатам, последовательно внутри чата"""
+
+    def __init__(self, max_concurrent_updates: int):
+        if not TELEGRAM_AVAILABLE:
+            raise ImportError("python-telegram-bot не установлен")
+        super().__init__(max_concurrent_updates)
+        self._chats = ChatSerializer()
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id = update_chat_id(update)
+        if chat_id is None:
+            await super().process_update(update, coroutine)
+            return
+        # Общий слот берется внутри блокировки чата
+        await self._chats.run(chat_id, super().process_update(update, coroutine))
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,322 @@
+"""
+Webhook режим для Telegram ботов с горизонтальным масштабированием
+
+Ingress принимает webhook от Telegram и раскладывает апдейты по партициям
+очереди (chat_id % partitions). Каждая партиция обрабатывается ровно одним
+воркером последовательно, поэтому порядок сообщений внутри чата сохраняется,
+а разные чаты обрабатываются параллельно несколькими процессами.
+"""
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+try:
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    aioredis = None
+
+try:
+    from telegram import Update
+    TELEGRAM_AVAILABLE = True
+except ImportError:
+    TELEGRAM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ROLE_INGRESS = 'ingress'
+ROLE_WORKER = 'worker'
+ROLE_ALL = 'all'
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+@dataclass
+class WebhookConfig:
+    """Конфигурация webhook режима (секция ingestion в bot_settings.yml + окружение)"""
+    webhook_url: Optional[str] = None
+    secret_token: Optional[str] = None
+    listen_host: str = '0.0.0.0'
+    listen_port: int = 8443
+    path: str = '/telegram/webhook'
+    partitions: int = 16
+    queue_backend: str = 'redis'  # redis | local
+    redis_url: Optional[str] = None
+    queue_prefix: str = 'telegram:updates:'
+    role: str = ROLE_ALL  # ingress | worker | all
+    worker_index: int = 0
+    worker_count: int = 1
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> 'WebhookConfig':
+        """Собирает конфигурацию; роль и номер воркера задаются окружением процесса"""
+        return cls(
+            webhook_url=os.getenv(settings.get('webhook_url_env_var', 'TELEGRAM_WEBHOOK_URL')),
+            secret_token=os.getenv(settings.get('secret_token_env_var', 'TELEGRAM_WEBHOOK_SECRET')),
+            listen_host=settings.get('listen_host', '0.0.0.0'),
+            listen_port=int(os.getenv('BOT_WEBHOOK_PORT', settings.get('listen_port', 8443))),
+            path=settings.get('path', '/telegram/webhook'),
+            partitions=int(settings.get('partitions', 16)),
+            queue_backend=settings.get('queue_backend', 'redis'),
+            redis_url=os.getenv(settings.get('redis_url_env_var', 'REDIS_URL')),
+            queue_prefix=settings.get('queue_prefix', 'telegram:updates:'),
+            role=os.getenv('BOT_ROLE', ROLE_ALL),
+            worker_index=int(os.getenv('BOT_WORKER_INDEX', '0')),
+            worker_count=int(os.getenv('BOT_WORKER_COUNT', '1'))
+        )
+
+    def owned_partitions(self) -> List[int]:
+        """Партиции, которые обрабатывает этот воркер"""
+        return [p for p in range(self.partitions) if p % self.worker_count == self.worker_index]
+
+
+def extract_chat_id(update_data: Dict[str, Any]) -> int:
+    """Достает chat_id (или id пользователя) из сырого апдейта без десериализации"""
+    for key, value in update_data.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        if isinstance(value.get('chat'), dict):
+            return int(value['chat'].get('id', 0))
+        message = value.get('message')
+        if isinstance(message, dict) and isinstance(message.get('chat'), dict):
+            return int(message['chat'].get('id', 0))
+        if isinstance(value.get('from'), dict):
+            return int(value['from'].get('id', 0))
+    return 0
+
+
+def partition_for(chat_id: int, partitions: int) -> int:
+    """Номер партиции для чата (для отрицательных id групп тоже неотрицательный)"""
+    return chat_id % partitions
+
+
+class LocalUpdateQueue:
+    """In-process очередь: ingress и воркер в одном процессе (роль all)"""
+
+    def __init__(self, partitions: int, pop_timeout: float = 5.0):
+        self._queues = [asyncio.Queue() for _ in range(partitions)]
+        self._pop_timeout = pop_timeout
+
+    async def push(self, partition: int, payload: bytes) -> None:
+        await self._queues[partition].put(payload)
+
+    async def pop(self, partition: int) -> Optional[bytes]:
+        try:
+            return await asyncio.wait_for(self._queues[partition].get(), timeout=self._pop_timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ack(self, partition: int, payload: bytes) -> None:
+        pass
+
+    async def recover(self, partition: int) -> int:
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisUpdateQueue:
+    """
+    Партиционированная очередь на Redis lists.
+
+    Взятый апдейт атомарно перемещается в processing-список партиции и
+    удаляется после обработки; при рестарте воркер возвращает
+    необработанные апдейты в голову очереди (at-least-once).
+    """
+
+    def __init__(self, redis_url: str, prefix: str = 'telegram:updates:', pop_timeout: float = 5.0):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is required for the redis update queue")
+
+        self._client = aioredis.Redis.from_url(redis_url)
+        self._prefix = prefix
+        self._pop_timeout = pop_timeout
+
+    def _key(self, partition: int) -> str:
+        return f"{self._prefix}{partition}"
+
+    def _processing_key(self, partition: int) -> str:
+        return f"{self._prefix}{partition}:processing"
+
+    async def push(self, partition: int, payload: bytes) -> None:
+        await self._client.lpush(self._key(partition), payload)
+
+    async def pop(self, partition: int) -> Optional[bytes]:
+        return await self._client.blmove(
+            self._key(partition), self._processing_key(partition),
+            self._pop_timeout, 'RIGHT', 'LEFT'
+        )
+
+    async def ack(self, partition: int, payload: bytes) -> None:
+        await self._client.lrem(self._processing_key(partition), 1, payload)
+
+    async def recover(self, partition: int) -> int:
+        recovered = 0
+        while await self._client.lmove(self._processing_key(partition), self._key(partition), 'LEFT', 'RIGHT'):
+            recovered += 1
+        return recovered
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+def create_update_queue(config: WebhookConfig):
+    """Создает очередь апдейтов по конфигурации"""
+    if config.queue_backend == 'redis':
+        if not config.redis_url:
+            raise ValueError("Redis URL is required for the redis update queue")
+        return RedisUpdateQueue(config.redis_url, prefix=config.queue_prefix)
+
+    if config.role != ROLE_ALL:
+        raise ValueError("Local update queue works only when ingress and worker share a process (BOT_ROLE=all)")
+    return LocalUpdateQueue(config.partitions)
+
+
+class WebhookIngress:
+    """Легкий HTTP приемник webhook: проверка секрета и постановка в очередь"""
+
+    def __init__(self, config: WebhookConfig, queue):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is required for webhook ingress")
+
+        self.config = config
+        self.queue = queue
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> 'web.Application':
+        app = web.Application()
+        app.router.add_post(self.config.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def handle_update(self, request: 'web.Request') -> 'web.Response':
+        if self.config.secret_token and request.headers.get(SECRET_TOKEN_HEADER) != self.config.secret_token:
+            return web.Response(status=403)
+
+        payload = await request.read()
+        try:
+            update_data = json.loads(payload)
+        except ValueError:
+            return web.Response(status=400)
+
+        partition = partition_for(extract_chat_id(update_data), self.config.partitions)
+        await self.queue.push(partition, payload)
+        return web.Response(status=200)
+
+    async def handle_health(self, request: 'web.Request') -> 'web.Response':
+        return web.json_response({'status': 'healthy', 'service': 'telegram-webhook-ingress'})
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.config.listen_host, self.config.listen_port)
+        await site.start()
+        logger.info(f"Webhook ingress listening on {self.config.listen_host}:{self.config.listen_port}{self.config.path}")
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class PartitionedUpdateWorker:
+    """Обрабатывает свои партиции: по одной задаче на партицию, апдейты внутри - строго по порядку"""
+
+    def __init__(self, application, queue, partitions: List[int]):
+        self.application = application
+        self.queue = queue
+        self.partitions = partitions
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        logger.info(f"Update worker consuming partitions: {self.partitions}")
+        consumers = [asyncio.create_task(self._consume(p)) for p in self.partitions]
+        try:
+            await self._stopping.wait()
+        finally:
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _consume(self, partition: int) -> None:
+        recovered = await self.queue.recover(partition)
+        if recovered:
+            logger.warning(f"Recovered {recovered} unacknowledged updates in partition {partition}")
+
+        while not self._stopping.is_set():
+            try:
+                payload = await self.queue.pop(partition)
+            except Exception as e:
+                logger.error(f"Update queue error in partition {partition}: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if payload is None:
+                continue
+
+            try:
+                update = Update.de_json(json.loads(payload), self.application.bot)
+                await self.application.process_update(update)
+            except Exception as e:
+                logger.error(f"Failed to process update in partition {partition}: {e}")
+            finally:
+                await self.queue.ack(partition, payload)
+
+
+async def run_webhook(application, config: WebhookConfig) -> None:
+    """
+    Запускает процесс в webhook режиме в соответствии с ролью:
+    ingress - прием webhook и регистрация его в Telegram,
+    worker - обработка своих партиций, all - оба в одном процессе.
+    """
+    if not TELEGRAM_AVAILABLE:
+        raise RuntimeError("python-telegram-bot is required for webhook mode")
+
+    queue = create_update_queue(config)
+    ingress = None
+    worker = None
+
+    await application.initialize()
+    try:
+        if config.role in (ROLE_INGRESS, ROLE_ALL):
+            ingress = WebhookIngress(config, queue)
+            await ingress.start()
+            if config.webhook_url:
+                await application.bot.set_webhook(
+                    url=config.webhook_url,
+                    secret_token=config.secret_token,
+                    allowed_updates=Update.ALL_TYPES
+                )
+                logger.info(f"Webhook registered: {config.webhook_url}")
+            else:
+                logger.warning("Webhook URL not configured, assuming it is registered externally")
+
+        if config.role in (ROLE_WORKER, ROLE_ALL):
+            await application.start()
+            worker = PartitionedUpdateWorker(application, queue, config.owned_partitions())
+            await worker.run()
+        else:
+            await asyncio.Event().wait()  # Ingress работает до остановки процесса
+
+    finally:
+        if ingress:
+            await ingress.stop()
+        if worker and application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await queue.close()
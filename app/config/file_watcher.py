@@ -0,0 +1,212 @@
+"""
+Отслеживание изменений файлов конфигурации для hot-reload
+
+На Linux используется inotify (через libc, без внешних зависимостей): поток
+спит в select() до реального изменения. На других платформах или если
+inotify недоступен - опрос mtime с интервалом. Пачки событий (редакторы
+пишут файл в несколько приемов) склеиваются окном debounce.
+"""
+import os
+import sys
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Маски inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+# Удаление и переименование тоже изменение: закешированный файл должен сброситься
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY | IN_DELETE | IN_MOVED_FROM
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+INOTIFY_AVAILABLE = _libc is not None
+
+ChangeCallback = Callable[[Set[Path]], None]
+
+
+class ConfigFileWatcher:
+    """
+    Следит за каталогами с конфигурацией и вызывает on_change(paths)
+    с множеством измененных (в т.ч. удаленных и переименованных) файлов
+    после паузы debounce_seconds.
+    """
+
+    def __init__(self,
+                 directories: Iterable[Path],
+                 on_change: ChangeCallback,
+                 debounce_seconds: float = 0.2,
+                 poll_interval: float = 5.0,
+                 use_inotify: bool = True):
+        self.directories = [Path(d) for d in dict.fromkeys(directories)]
+        self.on_change = on_change
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and INOTIFY_AVAILABLE
+
+        self._stop_event = threading.Event()
+        # Наблюдение установлено: изменения после этого момента не пропускаются
+        self.ready = threading.Event()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._fd_lock = threading.Lock()
+        self._inotify_fd: Optional[int] = None
+        self._watch_dirs: Dict[int, Path] = {}
+
+    @property
+    def mode(self) -> str:
+        return 'inotify' if self._inotify_fd is not None else 'polling'
+
+    def run(self) -> None:
+        """Основной цикл (блокирующий, запускается в отдельном потоке)"""
+        if self.use_inotify and self._init_inotify():
+            logger.info(f"Config file watcher using inotify for {len(self._watch_dirs)} directories")
+            self.ready.set()
+            self._inotify_loop()
+        else:
+            logger.info(f"Config file watcher polling every {self.poll_interval}s")
+            self._polling_loop()
+
+    def stop(self) -> None:
+        """Останавливает цикл и будит поток, если он ждет событий"""
+        self._stop_event.set()
+        with self._fd_lock:
+            # После close() номер дескриптора мог достаться другому файлу
+            if self._wakeup_w is None:
+                return
+            try:
+                os.write(self._wakeup_w, b'x')
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        with self._fd_lock:
+            for fd in (self._inotify_fd, self._wakeup_r, self._wakeup_w):
+                if fd is not None:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+            self._inotify_fd = None
+            self._wakeup_r = self._wakeup_w = None
+
+    def _init_inotify(self) -> bool:
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+            return False
+
+        for directory in self.directories:
+            wd = _libc.inotify_add_watch(fd, os.fsencode(str(directory)), _WATCH_MASK)
+            if wd < 0:
+                logger.warning(f"inotify_add_watch failed for {directory}: {os.strerror(ctypes.get_errno())}")
+                os.close(fd)
+                self._watch_dirs.clear()
+                return False
+            self._watch_dirs[wd] = directory
+
+        self._inotify_fd = fd
+        return True
+
+    def _read_inotify_events(self) -> Set[Path]:
+        changed: Set[Path] = set()
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # Очередь ядра переполнена - часть событий потеряна, проверяем все файлы
+                changed |= set(self._snapshot_mtimes())
+                continue
+
+            directory = self._watch_dirs.get(wd)
+            if directory is not None and name:
+                changed.add(directory / os.fsdecode(name))
+        return changed
+
+    def _inotify_loop(self) -> None:
+        pending: Set[Path] = set()
+
+        while not self._stop_event.is_set():
+            # Без накопленных изменений ждем бесконечно; иначе - до конца окна debounce
+            timeout = self.debounce_seconds if pending else None
+            try:
+                readable, _, _ = select.select([self._inotify_fd, self._wakeup_r], [], [], timeout)
+            except InterruptedError:
+                continue
+
+            if self._stop_event.is_set():
+                break
+
+            if self._inotify_fd in readable:
+                pending |= self._read_inotify_events()
+                continue
+
+            if pending:
+                self._dispatch(pending)
+                pending = set()
+
+    def _polling_loop(self) -> None:
+        mtimes = self._snapshot_mtimes()
+        self.ready.set()
+
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._snapshot_mtimes()
+            changed = {path for path, mtime in current.items() if mtimes.get(path) != mtime}
+            # Удаленные и переименованные файлы
+            changed.update(path for path in mtimes if path not in current)
+            mtimes = current
+            if changed:
+                self._dispatch(changed)
+
+    def _snapshot_mtimes(self) -> Dict[Path, float]:
+        mtimes = {}
+        for directory in self.directories:
+            try:
+                for entry in os.scandir(directory):
+                    if entry.is_file():
+                        mtimes[Path(entry.path)] = entry.stat().st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def _dispatch(self, changed: Set[Path]) -> None:
+        try:
+            self.on_change(changed)
+        except Exception as e:
+            logger.error(f"Config file change handler error: {e}")
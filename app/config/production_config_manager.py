@@ -9,11 +9,11 @@ import time
 import logging
 import threading
 import select
-from typing import Dict, Any, Optional, List, Union, Callable
+from typing import Dict, Any, Optional, List, Union, Callable, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import OrderedDict
 from threading import Lock, Thread
 import weakref
 
@@ -28,21 +28,111 @@ except ImportError:
     DB_AVAILABLE = False
     psycopg2 = None
 
+try:
+    from .file_watcher import ConfigFileWatcher
+except ImportError:
+    from file_watcher import ConfigFileWatcher
+
 logger = logging.getLogger(__name__)
 
+# Счетчики горячего пути, которые не пишутся в memory_metrics
+_HOT_PATH_METRICS = frozenset({'config_requests', 'cache_hits', 'cache_misses', 'bulk_prefetches'})
+
+# Признак "конфигурация из БД еще не загружена" (None означает "в БД пусто")
+_DB_NOT_LOADED = object()
+
+# Эффективная конфигурация для всех ключей и пачки пользователей одним запросом;
+# слияние совпадает с функцией get_effective_config (global || user override)
+_BULK_EFFECTIVE_CONFIG_QUERY = """
+    WITH keys AS (
+        SELECT unnest(%(config_keys)s::varchar[]) AS config_key
+        UNION
+        SELECT config_key FROM config_versions
+        WHERE active = TRUE AND environment = %(environment)s
+    ),
+    users AS (
+        SELECT unnest(%(user_ids)s::varchar[]) AS user_id
+    )
+    SELECT u.user_id, k.config_key,
+           COALESCE(g.payload, '{}'::jsonb) || COALESCE(uc.config_value, '{}'::jsonb) AS config
+    FROM users u
+    CROSS JOIN keys k
+    LEFT JOIN LATERAL (
+        SELECT payload FROM config_versions
+        WHERE config_key = k.config_key AND active = TRUE AND environment = %(environment)s
+        LIMIT 1
+    ) g ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT config_value FROM user_configs
+        WHERE user_id = u.user_id AND config_key = k.config_key
+          AND (expires_at IS NULL OR expires_at > NOW())
+        ORDER BY priority ASC
+        LIMIT 1
+    ) uc ON TRUE
+"""
+
 
 @dataclass
 class CacheEntry:
-    """Элемент кеша с TTL"""
+    """Элемент кеша с TTL (время по монотонным часам)"""
     value: Any
-    created_at: datetime
-    ttl_seconds: int
+    expires_at: float
     namespace: str = 'default'
+    last_access: float = 0.0
     
     @property
     def is_expired(self) -> bool:
         """Проверяет истек ли TTL"""
-        return datetime.now() > self.created_at + timedelta(seconds=self.ttl_seconds)
+        return time.monotonic() > self.expires_at
+
+
+class FrozenConfig(dict):
+    """
+    Неизменяемый снимок конфигурации.
+    
+    Снимки собираются один раз на (config_key, user_id) и отдаются всем
+    вызывающим по ссылке; version растет при каждом изменении конфига,
+    поэтому устаревший снимок определяется сравнением одного числа.
+    """
+    
+    __slots__ = ('version',)
+    
+    def __init__(self, data: Optional[Dict[str, Any]] = None, version: int = 0):
+        super().__init__(data or {})
+        self.version = version
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Config snapshot is read-only, use dict(config) or copy.deepcopy(config) to modify")
+    
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    
+    def __copy__(self) -> Dict[str, Any]:
+        return dict(self)
+    
+    def __deepcopy__(self, memo) -> Dict[str, Any]:
+        return thaw_config(self)
+    
+    def __reduce__(self):
+        return (FrozenConfig, (dict(self), self.version))
+
+
+def freeze_config(value: Any, version: int = 0) -> Any:
+    """Рекурсивно превращает конфигурацию в неизменяемую (dict -> FrozenConfig, list -> tuple)"""
+    if isinstance(value, dict):
+        return FrozenConfig({k: freeze_config(v) for k, v in value.items()}, version)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_config(v) for v in value)
+    return value
+
+
+def thaw_config(value: Any) -> Any:
+    """Изменяемая глубокая копия снимка конфигурации"""
+    if isinstance(value, dict):
+        return {k: thaw_config(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw_config(v) for v in value]
+    return value
 
 
 @dataclass
@@ -65,6 +155,8 @@ class ConfigManagerConfig:
     # Hot-reload
     auto_reload: bool = field(default_factory=lambda: os.getenv('CONFIG_AUTO_RELOAD', 'true').lower() == 'true')
     file_watch_enabled: bool = field(default_factory=lambda: os.getenv('CONFIG_FILE_WATCH', 'true').lower() == 'true')
+    file_watch_debounce_ms: int = field(default_factory=lambda: int(os.getenv('CONFIG_FILE_WATCH_DEBOUNCE_MS', '200')))
+    file_poll_interval: float = field(default_factory=lambda: float(os.getenv('CONFIG_FILE_POLL_INTERVAL', '5')))
     db_listen_channel: str = field(default_factory=lambda: os.getenv('CONFIG_LISTEN_CHANNEL', 'memory_config_updates'))
     
     # Окружение
@@ -77,114 +169,158 @@ class ConfigManagerConfig:
     log_config_access: bool = field(default_factory=lambda: os.getenv('CONFIG_LOG_ACCESS', 'false').lower() == 'true')
     mask_secrets: bool = field(default_factory=lambda: os.getenv('CONFIG_MASK_SECRETS', 'true').lower() == 'true')
     
+    # Прогрев кеша для недавно активных пользователей при старте
+    warmup_enabled: bool = field(default_factory=lambda: os.getenv('CONFIG_WARMUP_ENABLED', 'true').lower() == 'true')
+    warmup_max_users: int = field(default_factory=lambda: int(os.getenv('CONFIG_WARMUP_MAX_USERS', '200')))
+    warmup_active_hours: int = field(default_factory=lambda: int(os.getenv('CONFIG_WARMUP_ACTIVE_HOURS', '24')))
+    prefetch_batch_size: int = field(default_factory=lambda: int(os.getenv('CONFIG_PREFETCH_BATCH_SIZE', '100')))
+    
     # Метрики
     metrics_enabled: bool = field(default_factory=lambda: os.getenv('CONFIG_METRICS_ENABLED', 'true').lower() == 'true')
 
 
+class _CacheShard:
+    """Шард кеша одного namespace: ключи в порядке последнего обращения"""
+    
+    __slots__ = ('entries', 'lock')
+    
+    def __init__(self):
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.lock = Lock()
+
+
 class ConfigCache:
-    """Потокобезопасный кеш с TTL и namespace support"""
+    """
+    Потокобезопасный кеш с TTL и namespace support.
+    
+    Каждый namespace - отдельный шард со своим локом и OrderedDict, поэтому
+    LRU вытеснение стоит O(1), а запись в один конфиг не блокирует другие.
+    Попадание в кеш читается без блокировки; перемещение ключа в конец
+    LRU делается только если лок шарда свободен.
+    """
     
     def __init__(self, max_size: int = 1000):
-        self._cache: Dict[str, CacheEntry] = {}
-        self._access_times: Dict[str, datetime] = {}
-        self._lock = Lock()
+        self._shards: Dict[str, _CacheShard] = {}
+        self._shards_lock = Lock()
         self._max_size = max_size
     
+    def _get_shard(self, namespace: str) -> _CacheShard:
+        shard = self._shards.get(namespace)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.setdefault(namespace, _CacheShard())
+        return shard
+    
     def get(self, key: str, namespace: str = 'default') -> Optional[Any]:
         """Получает значение из кеша"""
-        cache_key = f"{namespace}:{key}"
+        shard = self._shards.get(namespace)
+        if shard is None:
+            return None
         
-        with self._lock:
-            entry = self._cache.get(cache_key)
-            if not entry:
-                return None
-            
-            if entry.is_expired:
-                del self._cache[cache_key]
-                if cache_key in self._access_times:
-                    del self._access_times[cache_key]
-                return None
-            
-            self._access_times[cache_key] = datetime.now()
-            return entry.value
+        entry = shard.entries.get(key)
+        if entry is None:
+            return None
+        
+        now = time.monotonic()
+        if now > entry.expires_at:
+            with shard.lock:
+                if shard.entries.get(key) is entry:
+                    del shard.entries[key]
+            return None
+        
+        entry.last_access = now
+        if shard.lock.acquire(blocking=False):
+            try:
+                if shard.entries.get(key) is entry:
+                    shard.entries.move_to_end(key)
+            finally:
+                shard.lock.release()
+        
+        return entry.value
     
     def set(self, key: str, value: Any, ttl_seconds: int, namespace: str = 'default') -> None:
         """Сохраняет значение в кеше"""
-        cache_key = f"{namespace}:{key}"
+        now = time.monotonic()
+        entry = CacheEntry(value=value, expires_at=now + ttl_seconds, namespace=namespace, last_access=now)
+        shard = self._get_shard(namespace)
         
-        with self._lock:
-            # Очистка переполненного кеша
-            if len(self._cache) >= self._max_size:
-                self._evict_lru()
-            
-            self._cache[cache_key] = CacheEntry(
-                value=value,
-                created_at=datetime.now(),
-                ttl_seconds=ttl_seconds,
-                namespace=namespace
-            )
-            self._access_times[cache_key] = datetime.now()
+        with shard.lock:
+            shard.entries[key] = entry
+            shard.entries.move_to_end(key)
+        
+        # Очистка переполненного кеша (вне лока шарда, чтобы не брать два лока сразу)
+        while len(self) > self._max_size:
+            if not self._evict_lru():
+                break
     
     def invalidate(self, key: Optional[str] = None, namespace: Optional[str] = None) -> int:
         """Инвалидирует кеш по ключу или namespace"""
-        removed_count = 0
-        
-        with self._lock:
-            if key and namespace:
-                # Инвалидация конкретного ключа
-                cache_key = f"{namespace}:{key}"
-                if cache_key in self._cache:
-                    del self._cache[cache_key]
-                    if cache_key in self._access_times:
-                        del self._access_times[cache_key]
-                    removed_count = 1
-                    
-            elif namespace:
+        if namespace:
+            shard = self._shards.get(namespace)
+            if shard is None:
+                return 0
+            
+            with shard.lock:
+                if key:
+                    # Инвалидация конкретного ключа
+                    return 1 if shard.entries.pop(key, None) is not None else 0
+                
                 # Инвалидация всего namespace
-                keys_to_remove = [k for k in self._cache.keys() if k.startswith(f"{namespace}:")]
-                for cache_key in keys_to_remove:
-                    del self._cache[cache_key]
-                    if cache_key in self._access_times:
-                        del self._access_times[cache_key]
-                    removed_count += 1
-                    
-            else:
-                # Полная очистка кеша
-                removed_count = len(self._cache)
-                self._cache.clear()
-                self._access_times.clear()
+                removed_count = len(shard.entries)
+                shard.entries.clear()
+                return removed_count
         
+        # Полная очистка кеша
+        removed_count = 0
+        for shard in list(self._shards.values()):
+            with shard.lock:
+                removed_count += len(shard.entries)
+                shard.entries.clear()
         return removed_count
     
-    def _evict_lru(self) -> None:
-        """Удаляет наименее недавно используемые элементы"""
-        if not self._access_times:
-            return
+    def _evict_lru(self) -> bool:
+        """Удаляет наименее недавно используемый элемент среди голов шардов"""
+        oldest_shard = None
+        oldest_access = None
         
-        # Удаляем 10% самых старых элементов
-        sorted_by_access = sorted(self._access_times.items(), key=lambda x: x[1])
-        to_remove = max(1, len(sorted_by_access) // 10)
+        for shard in list(self._shards.values()):
+            with shard.lock:
+                if not shard.entries:
+                    continue
+                head = next(iter(shard.entries.values()))
+            if oldest_access is None or head.last_access < oldest_access:
+                oldest_shard, oldest_access = shard, head.last_access
+        
+        if oldest_shard is None:
+            return False
         
-        for cache_key, _ in sorted_by_access[:to_remove]:
-            if cache_key in self._cache:
-                del self._cache[cache_key]
-            del self._access_times[cache_key]
+        with oldest_shard.lock:
+            if oldest_shard.entries:
+                oldest_shard.entries.popitem(last=False)
+        return True
+    
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in list(self._shards.values()))
     
     def get_stats(self) -> Dict[str, Any]:
         """Возвращает статистику кеша"""
-        with self._lock:
-            expired_count = sum(1 for entry in self._cache.values() if entry.is_expired)
-            namespaces = defaultdict(int)
-            for key in self._cache.keys():
-                namespace = key.split(':', 1)[0]
-                namespaces[namespace] += 1
-            
-            return {
-                'total_entries': len(self._cache),
-                'expired_entries': expired_count,
-                'max_size': self._max_size,
-                'namespaces': dict(namespaces)
-            }
+        now = time.monotonic()
+        expired_count = 0
+        namespaces = {}
+        
+        for namespace, shard in list(self._shards.items()):
+            with shard.lock:
+                entries = list(shard.entries.values())
+            if entries:
+                namespaces[namespace] = len(entries)
+            expired_count += sum(1 for entry in entries if now > entry.expires_at)
+        
+        return {
+            'total_entries': sum(namespaces.values()),
+            'expired_entries': expired_count,
+            'max_size': self._max_size,
+            'namespaces': namespaces
+        }
 
 
 class ProductionConfigManager:
@@ -205,8 +341,13 @@ class ProductionConfigManager:
         # Управление потоками
         self._shutdown_event = threading.Event()
         self._reload_thread: Optional[Thread] = None
+        self._file_watcher: Optional[ConfigFileWatcher] = None
         self._listener_thread: Optional[Thread] = None
         
+        # Версии конфигураций (растут при каждой инвалидации)
+        self._config_versions: Dict[str, int] = {}
+        self._versions_lock = Lock()
+        
         # Callback для уведомлений об изменениях
         self._change_callbacks: List[Callable[[str, Dict[str, Any]], None]] = []
         
@@ -218,6 +359,7 @@ class ProductionConfigManager:
             'db_fallbacks': 0,
             'file_fallbacks': 0,
             'hot_reloads': 0,
+            'bulk_prefetches': 0,
             'errors': 0
         }
         self._metrics_lock = Lock()
@@ -240,6 +382,7 @@ class ProductionConfigManager:
                 logger.warning("Database not available or not configured, using file-only mode")
             
             # 3. Запускаем hot-reload если нужно
+            # (прогрев кеша - явно при старте приложения, см. warm_up_config_cache)
             if self.config.auto_reload:
                 self._start_auto_reload()
             
@@ -320,6 +463,12 @@ class ProductionConfigManager:
     def _start_auto_reload(self):
         """Запускает auto-reload потоки"""
         if self.config.file_watch_enabled:
+            self._file_watcher = ConfigFileWatcher(
+                [Path(self.config.config_dir)] if Path(self.config.config_dir).exists() else [],
+                on_change=self._on_config_files_changed,
+                debounce_seconds=self.config.file_watch_debounce_ms / 1000,
+                poll_interval=self.config.file_poll_interval
+            )
             self._reload_thread = Thread(
                 target=self._file_watch_loop,
                 name="ConfigFileWatcher",
@@ -338,27 +487,36 @@ class ProductionConfigManager:
             logger.info(f"Database listener thread started for channel: {self.config.db_listen_channel}")
     
     def _file_watch_loop(self):
-        """Цикл отслеживания изменений файлов"""
+        """Цикл отслеживания изменений файлов (inotify, при недоступности - опрос mtime)"""
         logger.debug("File watch loop started")
         
-        while not self._shutdown_event.is_set():
+        try:
+            self._file_watcher.run()
+        except Exception as e:
+            logger.error(f"File watch error: {e}")
+            self._record_error("file_watch_error", str(e))
+        finally:
+            self._file_watcher.close()
+    
+    def _on_config_files_changed(self, paths):
+        """Перезагружает только файлы конфигурации, у которых действительно сменился mtime"""
+        for path in sorted(paths):
+            file_path = str(path)
+            if not any(path.match(pattern) for pattern in self.config.file_patterns):
+                continue
+            
             try:
-                for file_path, last_mtime in list(self._file_watchers.items()):
-                    path = Path(file_path)
-                    if path.exists():
-                        current_mtime = path.stat().st_mtime
-                        if current_mtime > last_mtime:
-                            logger.info(f"Config file changed: {file_path}")
-                            self._reload_file_config(path)
-                            self._file_watchers[file_path] = current_mtime
-                            self._record_metric('hot_reloads')
-                
-                time.sleep(5)  # Проверяем каждые 5 секунд
-                
-            except Exception as e:
-                logger.error(f"File watch error: {e}")
-                self._record_error("file_watch_error", str(e))
-                time.sleep(10)  # Увеличиваем интервал при ошибке
+                current_mtime = path.stat().st_mtime
+            except OSError:
+                continue  # Файл удален или переименован - оставляем последнюю версию
+            
+            if self._file_watchers.get(file_path) == current_mtime:
+                continue
+            
+            logger.info(f"Config file changed: {file_path}")
+            self._reload_file_config(path)
+            self._file_watchers[file_path] = current_mtime
+            self._record_metric('hot_reloads')
     
     def _db_listen_loop(self):
         """Цикл прослушивания изменений в БД"""
@@ -389,10 +547,12 @@ class ProductionConfigManager:
                                 config_key = payload.get('config_key')
                                 if config_key:
                                     self._invalidate_config_cache(config_key)
+                                    self._notify_config_change(config_key, self.get_config(config_key))
                                     self._record_metric('hot_reloads')
                         except json.JSONDecodeError:
                             # Если не JSON, считаем что это config_key
                             self._invalidate_config_cache(notify.payload)
+                            self._notify_config_change(notify.payload, self.get_config(notify.payload))
                             self._record_metric('hot_reloads')
                         except Exception as e:
                             logger.error(f"Error processing notification: {e}")
@@ -438,6 +598,9 @@ class ProductionConfigManager:
     
     def _invalidate_config_cache(self, config_key: str):
         """Инвалидирует кеш для конфигурации"""
+        with self._versions_lock:
+            self._config_versions[config_key] = self._config_versions.get(config_key, 0) + 1
+        
         removed_count = self._cache.invalidate(namespace=config_key)
         logger.debug(f"Invalidated {removed_count} cache entries for config: {config_key}")
     
@@ -460,23 +623,64 @@ class ProductionConfigManager:
         2. Пользовательские настройки из БД
         3. Глобальная конфигурация из БД
         4. Fallback конфигурация из файлов
+        
+        Возвращает общий неизменяемый снимок (FrozenConfig); для изменений
+        нужна копия: dict(config) или copy.deepcopy(config).
         """
         self._record_metric('config_requests')
         
         if self.config.log_config_access:
             logger.debug(f"Getting config: {config_key} for user: {user_id}")
         
-        # Проверяем кеш
-        cache_key = f"{config_key}:{user_id or 'global'}"
+        snapshot = self._get_snapshot(config_key, user_id, force_reload)
+        
+        # Если ничего не найдено, используем default
+        if not snapshot and default is not None:
+            return default if isinstance(default, dict) else {'default': default}
+        
+        return snapshot
+    
+    def _get_snapshot(self, config_key: str, user_id: Optional[str] = None,
+                      force_reload: bool = False) -> FrozenConfig:
+        """Снимок из кеша (один поиск в словаре) или новый, если кеш пуст или устарел"""
+        cache_key = user_id or 'global'
         if not force_reload:
-            cached_value = self._cache.get(cache_key, namespace=config_key)
-            if cached_value is not None:
+            snapshot = self._cache.get(cache_key, namespace=config_key)
+            if snapshot is not None:
                 self._record_metric('cache_hits')
-                return cached_value
+                return snapshot
         
         self._record_metric('cache_misses')
         
-        # Собираем конфигурацию из всех источников
+        # С БД промах по одному ключу обновляет сразу все ключи пользователя одним запросом
+        if self._db_pool:
+            snapshots = self._prefetch([user_id], [config_key])
+            if (user_id, config_key) in snapshots:
+                return snapshots[(user_id, config_key)]
+        
+        version = self.get_config_version(config_key)
+        snapshot = self._build_snapshot(config_key, user_id, version)
+        self._store_snapshot(config_key, user_id, snapshot, version)
+        return snapshot
+    
+    def _store_snapshot(self, config_key: str, user_id: Optional[str],
+                        snapshot: FrozenConfig, version: int) -> FrozenConfig:
+        """Кладет снимок в кеш; если содержимое не изменилось, продлевает прежний объект"""
+        cache_key = user_id or 'global'
+        
+        current = self._cache.get(cache_key, namespace=config_key)
+        if current is not None and current.version == snapshot.version and current == snapshot:
+            snapshot = current
+        
+        # Не кешируем снимок, если конфиг изменился, пока мы его собирали
+        if self.get_config_version(config_key) == version:
+            self._cache.set(cache_key, snapshot, self.config.cache_ttl_seconds, namespace=config_key)
+        
+        return snapshot
+    
+    def _build_snapshot(self, config_key: str, user_id: Optional[str], version: int,
+                        db_config: Any = _DB_NOT_LOADED) -> FrozenConfig:
+        """Собирает конфигурацию из всех источников и замораживает ее"""
         final_config = {}
         
         # 1. Базовая конфигурация из файлов
@@ -484,8 +688,9 @@ class ProductionConfigManager:
         if file_config:
             final_config.update(file_config)
         
-        # 2. Конфигурация из БД
-        db_config = self._load_config_from_db(config_key, user_id)
+        # 2. Конфигурация из БД (если не загружена заранее пачкой)
+        if db_config is _DB_NOT_LOADED:
+            db_config = self._load_config_from_db(config_key, user_id)
         if db_config:
             final_config = self._deep_merge(final_config, db_config)
         elif self._db_pool:
@@ -500,20 +705,147 @@ class ProductionConfigManager:
         if env_overrides:
             final_config = self._deep_merge(final_config, env_overrides)
         
-        # Если ничего не найдено, используем default
-        if not final_config and default is not None:
-            final_config = default if isinstance(default, dict) else {'default': default}
-        
-        # Кешируем результат
-        if final_config:
-            self._cache.set(cache_key, final_config, self.config.cache_ttl_seconds, namespace=config_key)
-        
         # Маскируем секреты в логах
         if self.config.log_config_access:
             safe_config = self._mask_secrets(final_config) if self.config.mask_secrets else final_config
             logger.debug(f"Resolved config for {config_key}: {safe_config}")
         
-        return final_config
+        return freeze_config(final_config, version)
+    
+    def prefetch_user_configs(self,
+                              user_ids: List[Optional[str]],
+                              config_keys: Optional[List[str]] = None) -> int:
+        """
+        Загружает конфигурацию пользователей одним запросом на пачку и кладет
+        готовые снимки в кеш. Без config_keys берутся все известные ключи
+        (файлы + активные версии в БД). Возвращает число снимков.
+        """
+        total = 0
+        batch_size = max(1, self.config.prefetch_batch_size)
+        
+        for start in range(0, len(user_ids), batch_size):
+            total += len(self._prefetch(user_ids[start:start + batch_size], config_keys or []))
+        
+        return total
+    
+    def _prefetch(self, user_ids: List[Optional[str]],
+                  extra_keys: List[str]) -> Dict[Tuple[Optional[str], str], FrozenConfig]:
+        """Один запрос к БД на все ключи пачки пользователей; ключ результата - (user_id, config_key)"""
+        if not self._db_pool or not user_ids:
+            return {}
+        
+        config_keys = sorted(set(self._fallback_configs) | set(extra_keys))
+        versions = {key: self.get_config_version(key) for key in config_keys}
+        
+        conn = None
+        try:
+            conn = self._get_db_connection()
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(_BULK_EFFECTIVE_CONFIG_QUERY, {
+                    'config_keys': config_keys,
+                    'user_ids': list(user_ids),
+                    'environment': self.config.environment
+                })
+                rows = cur.fetchall()
+        except Exception as e:
+            logger.error(f"Bulk config prefetch error for {len(user_ids)} users: {e}")
+            self._record_error("db_bulk_prefetch_error", str(e))
+            return {}
+        finally:
+            if conn:
+                self._return_db_connection(conn)
+        
+        self._record_metric('bulk_prefetches')
+        
+        snapshots = {}
+        for row in rows:
+            config_key = row['config_key']
+            version = versions.get(config_key, self.get_config_version(config_key))
+            snapshot = self._build_snapshot(
+                config_key, row['user_id'], version,
+                db_config=dict(row['config']) if row['config'] else None
+            )
+            snapshots[(row['user_id'], config_key)] = self._store_snapshot(
+                config_key, row['user_id'], snapshot, version
+            )
+        
+        return snapshots
+    
+    def warm_up(self, user_ids: Optional[List[str]] = None) -> int:
+        """
+        Прогревает кеш снимками для недавно активных пользователей (или для
+        переданных user_ids). Число пользователей ограничено так, чтобы
+        прогрев не вытеснил из кеша больше его половины.
+        """
+        if not self._db_pool:
+            return 0
+        
+        keys_count = max(1, len(self._fallback_configs))
+        max_users = min(self.config.warmup_max_users, self.config.cache_max_size // (2 * keys_count))
+        
+        if user_ids is None:
+            user_ids = self._load_recent_user_ids(max_users)
+        user_ids = [None] + list(user_ids)[:max_users]
+        
+        started_at = time.monotonic()
+        total = self.prefetch_user_configs(user_ids)
+        logger.info(f"Config cache warmed up: {total} snapshots for {len(user_ids)} users "
+                    f"in {time.monotonic() - started_at:.2f}s")
+        return total
+    
+    def _load_recent_user_ids(self, limit: int) -> List[str]:
+        """Пользователи, активные за последние warmup_active_hours часов"""
+        if limit <= 0:
+            return []
+        
+        conn = None
+        try:
+            conn = self._get_db_connection()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT user_id FROM users
+                    WHERE last_activity > NOW() - make_interval(hours => %s)
+                    ORDER BY last_activity DESC
+                    LIMIT %s
+                """, (self.config.warmup_active_hours, limit))
+                return [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            # Без таблицы users прогреваем только глобальную конфигурацию
+            logger.warning(f"Failed to load recently active users for config warm-up: {e}")
+            if conn:
+                conn.rollback()
+            return []
+        finally:
+            if conn:
+                self._return_db_connection(conn)
+    
+    def get_config_version(self, config_key: str) -> int:
+        """Текущая версия конфигурации (для дешевой проверки устаревания снимков)"""
+        return self._config_versions.get(config_key, 0)
+    
+    def get_compiled_config(self,
+                            name: str,
+                            sources: Tuple[str, ...],
+                            build: Callable[..., Dict[str, Any]],
+                            user_id: Optional[str] = None) -> FrozenConfig:
+        """
+        Производная конфигурация из нескольких снимков (например, слияние
+        memory_levels_config и enhanced_memory_config). build(*snapshots)
+        вызывается только когда изменился хотя бы один из исходных снимков.
+        """
+        snapshots = tuple(self._get_snapshot(key, user_id) for key in sources)
+        cache_key = user_id or 'global'
+        namespace = f"compiled:{name}"
+        
+        cached = self._cache.get(cache_key, namespace=namespace)
+        if cached is not None:
+            cached_sources, compiled = cached
+            if len(cached_sources) == len(snapshots) and all(a is b for a, b in zip(cached_sources, snapshots)):
+                return compiled
+        
+        compiled = freeze_config(build(*snapshots), sum(snapshot.version for snapshot in snapshots))
+        self._cache.set(cache_key, (snapshots, compiled), self.config.cache_ttl_seconds, namespace=namespace)
+        return compiled
     
     def _load_config_from_db(self, config_key: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
         """Загружает конфигурацию из БД"""
@@ -659,8 +991,9 @@ class ProductionConfigManager:
         with self._metrics_lock:
             self._metrics[metric_name] = self._metrics.get(metric_name, 0) + value
         
-        # Опционально записываем в БД
-        if self.config.metrics_enabled and self._db_pool:
+        # Опционально записываем в БД (кроме счетчиков каждого get_config -
+        # они доступны через get_stats и не должны стоить запроса к БД)
+        if self.config.metrics_enabled and self._db_pool and metric_name not in _HOT_PATH_METRICS:
             self._record_db_metric('config_manager', metric_name, value)
     
     def _record_error(self, error_type: str, error_message: str):
@@ -787,6 +1120,63 @@ class ProductionConfigManager:
             if conn:
                 self._return_db_connection(conn)
     
+    def _get_feature_row(self, feature_name: str) -> Optional[Dict[str, Any]]:
+        """Строка feature_flags (кешируется в namespace feature_flags вместе с остальными конфигами)"""
+        cached = self._cache.get(feature_name, namespace='feature_flags')
+        if cached is not None:
+            return cached or None
+        
+        row = {}
+        conn = None
+        try:
+            conn = self._get_db_connection()
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT enabled, config, dependencies FROM feature_flags
+                    WHERE feature_name = %s AND environment = %s
+                """, (feature_name, self.config.environment))
+                result = cur.fetchone()
+                if result:
+                    row = freeze_config({
+                        'enabled': bool(result['enabled']),
+                        'config': dict(result['config']) if result['config'] else {},
+                        'dependencies': list(result['dependencies'] or [])
+                    })
+        except Exception as e:
+            logger.error(f"Feature flag load error for {feature_name}: {e}")
+            self._record_error("feature_flag_load_error", str(e))
+            return None
+        finally:
+            if conn:
+                self._return_db_connection(conn)
+        
+        self._cache.set(feature_name, row, self.config.cache_ttl_seconds, namespace='feature_flags')
+        return row or None
+    
+    def get_feature_flag(self, feature_name: str, default: bool = False) -> bool:
+        """Проверяет включен ли флаг функции (без БД - переменная окружения FEATURE_<NAME>)"""
+        if not self._db_pool:
+            return os.getenv(f"FEATURE_{feature_name.upper()}", str(default)).lower() == 'true'
+        
+        row = self._get_feature_row(feature_name)
+        return row['enabled'] if row else default
+    
+    def get_feature_config(self, feature_name: str) -> Dict[str, Any]:
+        """Конфигурация включенного флага функции"""
+        if not self._db_pool:
+            return {}
+        
+        row = self._get_feature_row(feature_name)
+        return row['config'] if row and row['enabled'] else {}
+    
+    def check_dependencies(self, feature_name: str) -> List[str]:
+        """Зависимости флага функции"""
+        if not self._db_pool:
+            return []
+        
+        row = self._get_feature_row(feature_name)
+        return list(row['dependencies']) if row else []
+    
     def add_change_callback(self, callback: Callable[[str, Dict[str, Any]], None]):
         """Добавляет callback для уведомлений об изменениях"""
         self._change_callbacks.append(callback)
@@ -815,6 +1205,8 @@ class ProductionConfigManager:
         
         # Останавливаем потоки
         self._shutdown_event.set()
+        if self._file_watcher:
+            self._file_watcher.stop()
         
         if self._reload_thread and self._reload_thread.is_alive():
             self._reload_thread.join(timeout=5)
@@ -837,12 +1229,34 @@ import atexit
 atexit.register(config_manager.shutdown)
 
 
+def warm_up_config_cache() -> int:
+    """
+    Прогрев кеша конфигурации при старте приложения (API, бот, воркер).
+    Выполняется явно, а не при импорте модуля: импорт не должен ходить в БД.
+    """
+    if not config_manager.config.warmup_enabled:
+        return 0
+    try:
+        return config_manager.warm_up()
+    except Exception as e:
+        logger.warning(f"Config cache warm-up failed: {e}")
+        return 0
+
+
 # Удобные функции для быстрого доступа
 def get_config(config_key: str, user_id: Optional[str] = None, default: Any = None) -> Dict[str, Any]:
     """Быстрый доступ к конфигурации"""
     return config_manager.get_config(config_key, user_id, default)
 
 
+def get_compiled_config(name: str,
+                        sources: Tuple[str, ...],
+                        build: Callable[..., Dict[str, Any]],
+                        user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Быстрый доступ к производной конфигурации из нескольких источников"""
+    return config_manager.get_compiled_config(name, sources, build, user_id)
+
+
 def get_memory_thresholds(user_id: Optional[str] = None) -> Dict[str, float]:
     """Быстрый доступ к порогам памяти"""
     return config_manager.get_config('memory_thresholds', user_id, {})
@@ -858,6 +1272,11 @@ def reload_config(config_key: str, version: str) -> bool:
     return config_manager.reload_config(config_key, version)
 
 
+def get_feature_flag(feature_name: str, default: bool = False) -> bool:
+    """Быстрая проверка флага функции"""
+    return config_manager.get_feature_flag(feature_name, default)
+
+
 if __name__ == "__main__":
     # Тест менеджера конфигурации
     print("🧪 Testing ProductionConfigManager")
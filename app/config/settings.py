@@ -34,6 +34,11 @@ class Settings:
     CELERY_BROKER_URL: str = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/1')
     CELERY_RESULT_BACKEND: str = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/2')
     
+    # Celery priority lanes: batch-задачи уступают интерактивным
+    BATCH_INTERACTIVE_BACKLOG_THRESHOLD: int = int(os.getenv('BATCH_INTERACTIVE_BACKLOG_THRESHOLD', '0'))
+    BATCH_DEFER_SECONDS: int = int(os.getenv('BATCH_DEFER_SECONDS', '10'))
+    BATCH_MAX_WAIT_SECONDS: int = int(os.getenv('BATCH_MAX_WAIT_SECONDS', '600'))
+    
     # LLM Configuration
     OPENAI_API_KEY: Optional[str] = os.getenv('OPENAI_API_KEY')
     LLM_MODEL: str = os.getenv('LLM_MODEL', 'gpt-4')
@@ -47,9 +52,32 @@ class Settings:
     BASE_PROMPT_PATH: str = os.getenv('BASE_PROMPT_PATH', 'app/config/prompts')
     DAYS_SCENARIO_COUNT: int = int(os.getenv('DAYS_SCENARIO_COUNT', '30'))
     QUESTION_FREQUENCY: int = int(os.getenv('QUESTION_FREQUENCY', '3'))
-    
+    # Состояние диалога (ритм вопросов, последние темы): local | redis (общее для воркеров)
+    CONVERSATION_STATE_BACKEND: str = os.getenv('CONVERSATION_STATE_BACKEND', 'local').lower()
+    CONVERSATION_STATE_TTL_DAYS: int = int(os.getenv('CONVERSATION_STATE_TTL_DAYS', '30'))
+    CONVERSATION_STATE_MAX_USERS: int = int(os.getenv('CONVERSATION_STATE_MAX_USERS', '10000'))
+    CONVERSATION_STATE_IDLE_SECONDS: float = float(os.getenv('CONVERSATION_STATE_IDLE_SECONDS', '3600'))
+    # Файлы промптов: hot-reload через наблюдатель каталогов, иначе проверка mtime не чаще интервала
+    PROMPT_ASSETS_WATCH: bool = os.getenv('PROMPT_ASSETS_WATCH', 'True').lower() == 'true'
+    PROMPT_ASSETS_CHECK_INTERVAL: float = float(os.getenv('PROMPT_ASSETS_CHECK_INTERVAL', '2.0'))
+    # Бюджет токенов системного промпта и лимиты его секций
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv('PROMPT_TOKEN_BUDGET', '6500'))
+    PROMPT_BIO_MAX_TOKENS: int = int(os.getenv('PROMPT_BIO_MAX_TOKENS', '4000'))
+    PROMPT_FACTS_MAX_TOKENS: int = int(os.getenv('PROMPT_FACTS_MAX_TOKENS', '800'))
+    PROMPT_SEMANTIC_MAX_TOKENS: int = int(os.getenv('PROMPT_SEMANTIC_MAX_TOKENS', '600'))
+    PROMPT_SUMMARY_MAX_TOKENS: int = int(os.getenv('PROMPT_SUMMARY_MAX_TOKENS', '300'))
+
     # Memory
     MEMORY_TYPE: str = os.getenv('MEMORY_TYPE', 'hybrid')
     VECTOR_STORE_TYPE: str = os.getenv('VECTOR_STORE_TYPE', 'pgvector')
+    
+    # pgvector ANN: тип индекса (hnsw | ivfflat) и параметры поиска (сам индекс создается миграцией)
+    VECTOR_INDEX_TYPE: str = os.getenv('VECTOR_INDEX_TYPE', 'hnsw').lower()
+    VECTOR_HNSW_EF_SEARCH: int = int(os.getenv('VECTOR_HNSW_EF_SEARCH', '100'))
+    VECTOR_IVFFLAT_PROBES: int = int(os.getenv('VECTOR_IVFFLAT_PROBES', '10'))
+    # Сколько кандидатов по расстоянию брать на один результат перед пересортировкой по важности
+    VECTOR_CANDIDATE_MULTIPLIER: int = int(os.getenv('VECTOR_CANDIDATE_MULTIPLIER', '4'))
+    # Итеративный обход индекса при фильтре по user_id (pgvector >= 0.8): off | relaxed_order | strict_order
+    VECTOR_ITERATIVE_SCAN: str = os.getenv('VECTOR_ITERATIVE_SCAN', 'relaxed_order').lower()
 
 settings = Settings() 
\ No newline at end of file
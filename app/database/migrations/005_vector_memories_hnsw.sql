@@ -0,0 +1,26 @@
+-- HNSW-индекс по эмбеддингам vector_memories вместо IVFFlat
+-- Версия: 1.0
+-- Выполняется вне транзакции (psql без --single-transaction): CONCURRENTLY
+-- строит индекс без блокировки записи, приложение индекс не создает.
+-- Для VECTOR_INDEX_TYPE=ivfflat миграцию не применять.
+
+-- Недостроенный индекс после прерванного CONCURRENTLY остается INVALID - убираем его
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_vector_memories_embedding_hnsw' AND NOT i.indisvalid
+    ) THEN
+        RAISE NOTICE '[VECTOR_MIGRATION] Dropping invalid idx_vector_memories_embedding_hnsw';
+        DROP INDEX idx_vector_memories_embedding_hnsw;
+    END IF;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vector_memories_embedding_hnsw
+ON vector_memories
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- IVFFlat-индекс больше не используется поиском, но замедляет запись
+DROP INDEX CONCURRENTLY IF EXISTS idx_vector_memories_embedding;
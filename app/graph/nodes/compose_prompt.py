@@ -1,29 +1,72 @@
 
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
 from typing import Dict, Any
 import logging
-import os
 from datetime import datetime
+from ...config.settings import settings
 from ...utils.agata_prompt_loader import agata_loader
 from ...utils.daily_behavior import daily_behavior
 from ...utils.message_splitter import message_splitter
+from ...utils.prompt_assets import prompt_assets
+from ...utils.prompt_budget import PromptAssembler, PromptSection, get_token_counter
+from ...utils.prompt_template import CompiledPromptTemplate, PrefixCache
 from ...utils.question_controller import question_controller
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT_PATH = "config/prompts/system_core.txt"
+
+# Слоты, стабильные в пределах дня общения: они входят в кешируемый префикс
+# системного промпта, все остальные (память, время, вопросы) - в хвост
+STATIC_PROMPT_SLOTS = ('day_instructions', 'agatha_bio')
+
 
 class ComposePromptNode:   
     def __init__(self):
-        self.system_prompt = self._load_system_prompt()
-        self.prompt_template = self._create_prompt_template()
+        # Слоты подставляются внутрь шаблона, разделитель между ними не нужен
+        self.budget = PromptAssembler(
+            settings.PROMPT_TOKEN_BUDGET, get_token_counter(settings.LLM_MODEL), separator=""
+        )
+        self._get_compiled_prompt()
+    
+    @property
+    def system_prompt(self) -> str:
+        return self._get_compiled_prompt()['source']
+    
+    @property
+    def prompt_template(self) -> CompiledPromptTemplate:
+        return self._get_compiled_prompt()['template']
+    
+    def _get_compiled_prompt(self) -> Dict[str, Any]:
+        """Скомпилированный системный промпт (перекомпилируется после правки файла)"""
+        return prompt_assets.derived(
+            'compose_prompt_system', [SYSTEM_PROMPT_PATH], self._compile_system_prompt
+        )
+    
+    def _compile_system_prompt(self) -> Dict[str, Any]:
+        source = self._load_system_prompt()
+        try:
+            template = CompiledPromptTemplate(source)
+        except ValueError as e:
+            logger.warning(f"Системный промпт не разбирается как шаблон ({e}), используем как текст")
+            template = CompiledPromptTemplate.literal(source)
+        
+        prefix, suffix = template.split(STATIC_PROMPT_SLOTS)
+        return {
+            'source': source,
+            'template': template,
+            # Токены текста шаблона без подстановок - постоянная часть бюджета
+            'static_tokens': self.budget.counter.count(template.render(**dict.fromkeys(template.variables, ''))),
+            'prefix': PrefixCache(prefix),
+            'suffix': suffix
+        }
     
     def _load_system_prompt(self) -> str:
         """Загружает системный промпт из файла"""
         try:
-            prompt_path = "config/prompts/system_core.txt"
-            if os.path.exists(prompt_path):
-                with open(prompt_path, "r", encoding="utf-8") as f:
-                    return f.read().strip()
+            content = prompt_assets.read(SYSTEM_PROMPT_PATH)
+            if content is not None:
+                return content
             
             # Если нет, создаем системный промпт из новых компонентов
             logger.info("Создаем системный промпт из agata_prompt_data")
@@ -39,20 +82,41 @@ class ComposePromptNode:
 Используй информацию из памяти о пользователе и свою биографию для ответов.
 Отвечай естественно и дружелюбно."""
     
-    def _create_prompt_template(self) -> ChatPromptTemplate:
-        """Создает шаблон промпта с полным набором переменных"""
-        
-        # Добавляем все переменные, которые используются в системном промпте
-        template_vars = [
-            "input_text", "short_memory_summary", "long_memory_facts", "semantic_context",
-            "day_instructions", "behavior_style", "agatha_bio", "tone_style", "now_iso",
-            "day_number", "last_diff_sec", "may_ask_question", "time_greeting", "absence_comment"
+    def _apply_budget(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Обрезает секции памяти и биографию по бюджету токенов. При нехватке
+        первой режется семантика, затем сводка и факты; биография - последней,
+        чтобы кешируемый префикс промпта менялся как можно реже.
+        """
+        sections = [
+            PromptSection('semantic_context', values['semantic_context'], priority=0,
+                          max_tokens=settings.PROMPT_SEMANTIC_MAX_TOKENS),
+            PromptSection('short_memory_summary', values['short_memory_summary'], priority=1,
+                          max_tokens=settings.PROMPT_SUMMARY_MAX_TOKENS, keep_tail=True),
+            PromptSection('long_memory_facts', values['long_memory_facts'], priority=2,
+                          max_tokens=settings.PROMPT_FACTS_MAX_TOKENS),
+            PromptSection('agatha_bio', values['agatha_bio'], priority=3,
+                          max_tokens=settings.PROMPT_BIO_MAX_TOKENS),
         ]
+        budgeted = {section.name for section in sections}
+        counter = self.budget.counter
+        # Остальные слоты (инструкции дня, время, стиль) не режутся
+        reserved = self._get_compiled_prompt()['static_tokens'] + sum(
+            counter.count(str(value)) for name, value in values.items() if name not in budgeted
+        )
         
-        return ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("user", "{input_text}")
-        ])
+        assembled = self.budget.assemble(sections, reserved_tokens=reserved)
+        for name, text in assembled.sections.items():
+            values[name] = text or "—"
+        return assembled.report
+    
+    def render_system_prompt(self, **values: Any) -> str:
+        """
+        Системный промпт: префикс со статичными слотами берется из кеша
+        (одна и та же строка между ходами), подставляется только хвост
+        """
+        compiled = self._get_compiled_prompt()
+        return compiled['prefix'].render(**values) + compiled['suffix'].render(**values)
     
     def compose_prompt(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -64,17 +128,8 @@ class ComposePromptNode:
         Returns:
             Обновленное состояние с промптом
         """
-        # ДИАГНОСТИКА: откуда вызывается этот метод
-        import traceback
-        stack_trace = traceback.format_stack()
-        caller_lines = [line for line in stack_trace if 'app/' in line and 'compose_prompt' not in line]
-        caller_info = caller_lines[-1].strip() if caller_lines else "Unknown"
-        logger.info(f"🚨 ДИАГНОСТИКА: ComposePromptNode.compose_prompt вызван из: {caller_info}")
-        print(f"🚨 ДИАГНОСТИКА: ComposePromptNode.compose_prompt вызван из: {caller_info}")
-        logger.info(f"🚨 ДИАГНОСТИКА: Состояние содержит memory: {bool(state.get('memory'))}")
-        print(f"🚨 ДИАГНОСТИКА: Состояние содержит memory: {bool(state.get('memory'))}")
-        logger.info(f"🚨 ДИАГНОСТИКА: Состояние содержит memory_context: {len(state.get('memory_context', ''))} символов")
-        print(f"🚨 ДИАГНОСТИКА: Состояние содержит memory_context: {len(state.get('memory_context', ''))} символов")
+        logger.debug(f"ComposePromptNode: memory={bool(state.get('memory'))}, "
+                     f"memory_context={len(state.get('memory_context', ''))} символов")
         
         try:
             # Получаем данные из состояния
@@ -236,8 +291,7 @@ class ComposePromptNode:
             logger.info(f"   semantic_context: {final_semantic_context[:200]}...")
             
 
-            formatted_prompt = self.prompt_template.format_messages(
-                input_text=input_text,
+            prompt_values = dict(
                 short_memory_summary=final_short_summary,
                 long_memory_facts=final_long_facts,
                 semantic_context=final_semantic_context,
@@ -252,6 +306,17 @@ class ComposePromptNode:
                 time_greeting=time_greeting,
                 absence_comment=absence_comment
             )
+            budget_report = self._apply_budget(prompt_values)
+            section_tokens = ", ".join(
+                f"{name}={section['tokens']}" for name, section in budget_report['sections'].items()
+            )
+            logger.info(f"Бюджет промпта: {budget_report['total_tokens']}/{budget_report['budget']} токенов ({section_tokens})")
+            
+            system_text = self.render_system_prompt(**prompt_values)
+            formatted_prompt = [
+                SystemMessage(content=system_text),
+                HumanMessage(content=input_text)
+            ]
             
             # Логируем финальный промпт
             logger.info(f"🚨 ФИНАЛЬНЫЙ ПРОМПТ (первые 500 символов):")
@@ -263,6 +328,7 @@ class ComposePromptNode:
                 "formatted_prompt": formatted_prompt,
                 "may_ask_question": may_ask_question,
                 "system_prompt_used": True,
+                "prompt_budget": budget_report,
                 "final_prompt": "\n".join([msg.content for msg in formatted_prompt])
             }
             
@@ -331,8 +397,12 @@ class ComposePromptNode:
     
     def get_prompt_info(self) -> Dict[str, Any]:
         """Возвращает информацию о промпте для диагностики"""
+        compiled = self._get_compiled_prompt()
         return {
-            "system_prompt_length": len(self.system_prompt),
-            "template_created": self.prompt_template is not None,
-            "prompt_path": "config/prompts/system_core.txt"
+            "system_prompt_length": len(compiled['source']),
+            "template_created": compiled['template'] is not None,
+            "template_variables": list(compiled['template'].variables),
+            "static_slots": list(compiled['prefix'].template.variables),
+            "token_budget": self.budget.get_stats(),
+            "prompt_path": SYSTEM_PROMPT_PATH
         }
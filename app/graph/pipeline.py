@@ -1,5 +1,6 @@
 import os
 import re
+import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional, TypedDict
 from langgraph.graph import StateGraph
@@ -41,12 +42,13 @@ class PipelineState(TypedDict):
     day_number: int
     question_count: int
     processing_start: datetime
+    message_metadata: Dict[str, Any]
+    memory_write: Dict[str, bool]
 
 class AgathaPipeline:
     def __init__(self):
         self.prompt_loader = PromptLoader()
         self.time_utils = TimeUtils()
-        self.message_controllers = {}
         self.behavioral_analyzer = BehavioralAnalyzer()
         self.prompt_composer = PromptComposer()
         self.memories = {}
@@ -132,6 +134,27 @@ class AgathaPipeline:
             log_info(f"Ensured stage {stage_number} data in state")
 
     async def process_chat(self, user_id: str, messages: List[Dict], meta_time: Optional[str] = None) -> Dict[str, Any]:
+        result = await self._run_graph(user_id, messages, meta_time)
+        return result["processed_response"]
+
+    async def process_turn(self, user_id: str, content: str, meta_time: Optional[str] = None,
+                           metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Один ход диалога: сохраняет сообщение в память и генерирует ответ.
+
+        Сообщение записывается в память ровно один раз (узлом short_memory),
+        результат записи возвращается вместе с ответом.
+        """
+        # turn_id отличает ход от предыдущего с тем же текстом (инкрементальный анализ поведения)
+        messages = [{'role': 'user', 'content': content, 'turn_id': uuid.uuid4().hex}]
+        result = await self._run_graph(user_id, messages, meta_time, metadata)
+        return {
+            **result["processed_response"],
+            'memory': result.get("memory_write") or {'short_term': False, 'long_term': False}
+        }
+
+    async def _run_graph(self, user_id: str, messages: List[Dict], meta_time: Optional[str] = None,
+                         metadata: Optional[Dict[str, Any]] = None) -> PipelineState:
         log_info(f"Pipeline START for user {user_id}")
 
         state: PipelineState = {
@@ -152,7 +175,9 @@ class AgathaPipeline:
             "day_number": 1,
             "stage_number": 1,
             "question_count": 0,
-            "processing_start": datetime.utcnow()
+            "processing_start": datetime.utcnow(),
+            "message_metadata": metadata or {},
+            "memory_write": {}
         }
         
         if meta_time:
@@ -178,7 +203,7 @@ class AgathaPipeline:
             # Используем АСИНХРОННЫЙ ainvoke()
             result = await self.graph.ainvoke(state)
             log_info(f"✅ LangGraph Pipeline COMPLETED: {result}")
-            return result["processed_response"]
+            return result
         except Exception as e:
             log_info(f"❌ LangGraph Pipeline FAILED: {e}")
             raise e
@@ -241,12 +266,14 @@ class AgathaPipeline:
                     role="user",
                     content=state["normalized_input"],
                     metadata={
+                        **state.get("message_metadata", {}),
                         'timestamp': (state["meta_time"] or datetime.utcnow()).isoformat(),
                         'day_number': state["day_number"],
                         'user_id': user_id
                     },
                     user_id=user_id
                 )
+                state["memory_write"] = result
                 log_info(f"✅ Сообщение добавлено в унифицированную память: {result}")
             
             # Передаем memory_adapter для совместимости
@@ -261,13 +288,16 @@ class AgathaPipeline:
                 message = Message(
                     role="user",
                     content=state["normalized_input"],
-                    timestamp=state["meta_time"] or datetime.utcnow()
+                    timestamp=state["meta_time"] or datetime.utcnow(),
+                    metadata=state.get("message_metadata", {})
                 )
                 context = MemoryContext(
                     user_id=user_id,
                     day_number=state["day_number"]
                 )
-                memory.add_message(message, context)
+                result = memory.add_message(message, context)
+                if isinstance(result, dict):
+                    state["memory_write"] = result
 
         
         try:
@@ -386,7 +416,8 @@ class AgathaPipeline:
             behavioral_analysis = self.behavioral_analyzer.analyze_user_behavior(
                 messages=state["messages"],
                 user_profile=user_profile,
-                conversation_context=conversation_context
+                conversation_context=conversation_context,
+                user_id=user_id
             )
 
             # Выбираем стратегию на основе анализа
@@ -618,14 +649,15 @@ class AgathaPipeline:
                 log_info(f"📝 Formatted prompt type: {type(state['formatted_prompt'])}")
                 
                 try:
-                    # Вызываем LLM с новым промптом (список сообщений)
-                    response = self.llm.invoke(state["formatted_prompt"])
+                    # Вызываем LLM с новым промптом (список сообщений);
+                    # ainvoke не блокирует event loop (бот в режиме embedded)
+                    response = await self.llm.ainvoke(state["formatted_prompt"])
                     state["llm_response"] = response.content.strip()
                     log_info(f"✅ LLM вызван с новым системным промптом")
                 except Exception as e:
                     log_info(f"❌ Ошибка с новым промптом: {e}, fallback к старому")
                     # Fallback к старому способу
-                    response = self.llm.invoke([HumanMessage(content=state["final_prompt"])])
+                    response = await self.llm.ainvoke([HumanMessage(content=state["final_prompt"])])
                     state["llm_response"] = response.content.strip()
                 
             else:
@@ -667,8 +699,8 @@ class AgathaPipeline:
                 else:
                     log_info(f"⚠️ ПРИНУДИТЕЛЬНОЕ ИСПРАВЛЕНИЕ: memory_context не содержит 'глеб': {memory_context[:100]}...")
 
-                # Синхронный вызов LLM
-                response = self.llm.invoke([HumanMessage(content=state["final_prompt"])])
+                # Асинхронный вызов LLM
+                response = await self.llm.ainvoke([HumanMessage(content=state["final_prompt"])])
                 state["llm_response"] = response.content.strip()
 
             log_info(f"✅ OpenAI response length: {len(state['llm_response'])} chars")
@@ -688,10 +720,9 @@ class AgathaPipeline:
         user_id = state["user_id"]
         memory = self._get_memory(user_id)
 
-        # Получаем или создаем MessageController для пользователя
-        if user_id not in self.message_controllers:
-            self.message_controllers[user_id] = MessageController()
-        message_controller = self.message_controllers[user_id]
+        # MessageController держит состояние пользователя в хранилище диалогов,
+        # поэтому создается на ход, а не копится в словаре на каждого пользователя
+        message_controller = MessageController(user_id=user_id)
         
         # Создаем контекст для MessageController
         context = {
@@ -0,0 +1,231 @@
+"""
+Пакетная запись воспоминаний (vector_memories) и истории диалога (messages) через COPY
+
+Вместо построчных INSERT с эмбеддингом в виде строки '[0.1,0.2,...]' строки
+кодируются в бинарный формат COPY: эмбеддинг упаковывается как vector
+(dim, unused, float4[]) одним struct.pack, без форматирования чисел в текст.
+Пачка уходит на сервер одним потоком данных, поэтому импорт истории
+пользователя упирается в диск, а не в количество round-trip.
+
+Наивное время везде считается UTC (как datetime.utcnow() в пайплайне),
+независимо от часового пояса воркера.
+"""
+import io
+import json
+import uuid
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TypeVar, Union
+
+# Заголовок бинарного COPY: сигнатура, флаги, длина расширения заголовка
+_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_COPY_TRAILER = struct.pack('>h', -1)
+
+_INT16 = struct.Struct('>h')
+_INT32 = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_FLOAT8 = struct.Struct('>d')
+_NULL = _INT32.pack(-1)
+
+# OID типов элементов для бинарных массивов
+_TEXT_OID = 25
+_INT4_OID = 23
+
+# Эпоха PostgreSQL для timestamptz
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+VECTOR_MEMORY_COLUMNS = (
+    'user_id', 'content', 'role', 'timestamp', 'day_number', 'importance_score',
+    'topics', 'emotions', 'metadata', 'embedding'
+)
+
+_COPY_STATEMENT = (
+    f"COPY vector_memories ({', '.join(VECTOR_MEMORY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+)
+
+MESSAGE_COLUMNS = (
+    'conversation_id', 'user_id', 'created_at', 'role', 'content', 'parts', 'delays_ms',
+    'has_question', 'prompt_strategy', 'processing_time_ms', 'embedding'
+)
+
+_MESSAGES_COPY_STATEMENT = (
+    f"COPY messages ({', '.join(MESSAGE_COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+)
+
+DEFAULT_COPY_BATCH_SIZE = 5000
+
+
+@dataclass
+class VectorMemoryRow:
+    """Строка vector_memories для пакетной записи"""
+    user_id: str
+    content: str
+    role: str
+    timestamp: datetime
+    day_number: int
+    importance_score: float
+    embedding: List[float]
+    topics: List[str] = field(default_factory=list)
+    emotions: List[str] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class MessageRow:
+    """Строка messages (история диалога) для пакетной записи"""
+    conversation_id: Union[str, uuid.UUID]
+    user_id: Union[str, uuid.UUID]
+    role: str
+    content: str
+    created_at: datetime
+    parts: List[str] = field(default_factory=list)
+    delays_ms: List[int] = field(default_factory=list)
+    has_question: bool = False
+    prompt_strategy: Optional[str] = None
+    processing_time_ms: Optional[int] = None
+    embedding: Optional[List[float]] = None
+
+
+def as_utc(value: datetime) -> datetime:
+    """Наивное время - UTC; время с часовым поясом не меняется"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _text(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return _INT32.pack(len(data)) + data
+
+
+def _jsonb(value: Any) -> bytes:
+    # Бинарный jsonb: байт версии формата (1) + текст JSON
+    data = b'\x01' + json.dumps(value, ensure_ascii=False).encode('utf-8')
+    return _INT32.pack(len(data)) + data
+
+
+def _optional_text(value: Optional[str]) -> bytes:
+    return _NULL if value is None else _text(value)
+
+
+def _uuid(value: Union[str, uuid.UUID]) -> bytes:
+    data = (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).bytes
+    return _INT32.pack(16) + data
+
+
+def _array(values: Sequence[Any], element_oid: int, encode: Callable[[Any], bytes]) -> bytes:
+    # Одномерный массив без NULL: ndim, флаги, OID элемента, (размер, нижняя граница), элементы
+    if values:
+        data = struct.pack('>iiiii', 1, 0, element_oid, len(values), 1) + b''.join(map(encode, values))
+    else:
+        data = struct.pack('>iii', 0, 0, element_oid)
+    return _INT32.pack(len(data)) + data
+
+
+def _int4(value: int) -> bytes:
+    return _INT32.pack(4) + _INT32.pack(int(value))
+
+
+def _timestamptz(value: datetime) -> bytes:
+    delta = as_utc(value) - _PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return _INT32.pack(8) + _INT64.pack(micros)
+
+
+def encode_vector(embedding: List[float]) -> bytes:
+    """Бинарное представление pgvector: int16 dim, int16 unused, float4[dim]"""
+    dim = len(embedding)
+    return struct.pack(f'>hh{dim}f', dim, 0, *embedding)
+
+
+def _vector(embedding: Optional[List[float]]) -> bytes:
+    if not embedding:
+        return _NULL
+    vector = encode_vector(embedding)
+    return _INT32.pack(len(vector)) + vector
+
+
+def _encode_row(row: VectorMemoryRow) -> bytes:
+    return b''.join((
+        _INT16.pack(len(VECTOR_MEMORY_COLUMNS)),
+        _text(row.user_id),
+        _text(row.content),
+        _text(row.role),
+        _timestamptz(row.timestamp),
+        _int4(row.day_number),
+        _INT32.pack(8) + _FLOAT8.pack(float(row.importance_score)),
+        _jsonb(row.topics),
+        _jsonb(row.emotions),
+        _jsonb(row.metadata),
+        _vector(row.embedding),
+    ))
+
+
+def _encode_message_row(row: MessageRow) -> bytes:
+    return b''.join((
+        _INT16.pack(len(MESSAGE_COLUMNS)),
+        _uuid(row.conversation_id),
+        _uuid(row.user_id),
+        _timestamptz(row.created_at),
+        _text(row.role),
+        _text(row.content),
+        _array(row.parts, _TEXT_OID, _text),
+        _array(row.delays_ms, _INT4_OID, _int4),
+        _INT32.pack(1) + (b'\x01' if row.has_question else b'\x00'),
+        _optional_text(row.prompt_strategy),
+        _NULL if row.processing_time_ms is None else _int4(row.processing_time_ms),
+        _vector(row.embedding),
+    ))
+
+
+_Row = TypeVar('_Row')
+
+
+def _batches(rows: Iterable[_Row], batch_size: int) -> Iterator[List[_Row]]:
+    batch: List[_Row] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def copy_vector_memories(conn, rows: Iterable[VectorMemoryRow],
+                         batch_size: int = DEFAULT_COPY_BATCH_SIZE) -> int:
+    """
+    Записывает строки в vector_memories бинарным COPY пачками по batch_size.
+    Транзакцию не фиксирует - commit остается за вызывающим кодом.
+    Возвращает количество записанных строк.
+    """
+    return _copy_rows(conn, _COPY_STATEMENT, _encode_row, rows, batch_size)
+
+
+def copy_messages(conn, rows: Iterable[MessageRow],
+                  batch_size: int = DEFAULT_COPY_BATCH_SIZE) -> int:
+    """
+    Записывает историю диалога в messages бинарным COPY пачками по batch_size.
+    conversation_id и user_id - UUID (строкой или uuid.UUID). Транзакцию
+    не фиксирует. Возвращает количество записанных строк.
+    """
+    return _copy_rows(conn, _MESSAGES_COPY_STATEMENT, _encode_message_row, rows, batch_size)
+
+
+def encode_copy_batch(encode: Callable[[_Row], bytes], rows: Iterable[_Row]) -> bytes:
+    """Пачка строк в бинарном формате COPY (заголовок, строки, завершитель)"""
+    buffer = io.BytesIO()
+    buffer.write(_COPY_HEADER)
+    for row in rows:
+        buffer.write(encode(row))
+    buffer.write(_COPY_TRAILER)
+    return buffer.getvalue()
+
+
+def _copy_rows(conn, statement: str, encode: Callable[[_Row], bytes],
+               rows: Iterable[_Row], batch_size: int) -> int:
+    written = 0
+    with conn.cursor() as cursor:
+        for batch in _batches(rows, batch_size):
+            cursor.copy_expert(statement, io.BytesIO(encode_copy_batch(encode, batch)))
+            written += len(batch)
+    return written
@@ -0,0 +1,287 @@
+"""
+Общий пул соединений PostgreSQL для памяти (pgvector)
+
+Один пул на процесс: если ProductionConfigManager уже поднял пул по
+DATABASE_URL, используется он, иначе создается собственный по параметрам
+DATABASE_HOST/PORT/USER/PASSWORD/NAME. Соединения проверяются перед выдачей,
+после ошибки подключения повторные попытки идут с экспоненциальной паузой,
+а частые запросы подготавливаются (PREPARE) один раз на соединение.
+Когда все соединения заняты, выдача ждет освобождения не дольше
+checkout_timeout и затем поднимает PoolExhaustedError - нагрузка не
+выдается за недоступность БД.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+import psycopg2
+import psycopg2.pool
+import psycopg2.extensions
+import psycopg2.errors
+
+try:
+    from ..config.production_config_manager import config_manager as _config_manager
+except ImportError:
+    _config_manager = None
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Предел показателя степени в backoff: дальше пауза все равно упирается в backoff_max
+_MAX_BACKOFF_EXPONENT = 16
+
+# Пауза между попытками взять соединение из общего пула, занятого другими модулями
+_CHECKOUT_RETRY_INTERVAL = 0.05
+
+
+class PoolExhaustedError(RuntimeError):
+    """Все соединения пула заняты дольше checkout_timeout (БД при этом доступна)"""
+
+
+class PgConnectionProvider:
+    """Выдача соединений из общего пула с health-check и backoff"""
+
+    def __init__(self,
+                 min_connections: int = 1,
+                 max_connections: int = 10,
+                 connect_timeout: int = 5,
+                 health_check_interval: float = 30.0,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 checkout_timeout: float = 10.0):
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.checkout_timeout = checkout_timeout
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._last_checked: Dict[int, float] = {}
+        self._prepared: Dict[Tuple[int, int], set] = {}
+        self._prepared_lock = threading.Lock()
+        # Не больше max_connections выданных соединений: остальные ждут своей очереди
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    @property
+    def available(self) -> bool:
+        return self._get_pool() is not None
+
+    def _get_pool(self):
+        if self._pool is not None:
+            return self._pool
+
+        with self._lock:
+            if self._pool is not None:
+                return self._pool
+
+            shared_pool = getattr(_config_manager, '_db_pool', None)
+            if shared_pool is not None:
+                self._pool = shared_pool
+                logger.info("Memory DB uses the shared ProductionConfigManager pool")
+                return self._pool
+
+            if time.monotonic() < self._retry_at:
+                return None
+
+            try:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=self.min_connections,
+                    maxconn=self.max_connections,
+                    host=settings.DATABASE_HOST,
+                    port=settings.DATABASE_PORT,
+                    user=settings.DATABASE_USER,
+                    password=settings.DATABASE_PASSWORD,
+                    database=settings.DATABASE_NAME,
+                    connect_timeout=self.connect_timeout
+                )
+                self._failures = 0
+                logger.info(f"Memory DB pool created: {settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}")
+            except Exception as e:
+                self._register_failure(e)
+
+            return self._pool
+
+    def _register_failure(self, error: Exception) -> None:
+        self._failures += 1
+        exponent = min(self._failures - 1, _MAX_BACKOFF_EXPONENT)
+        delay = min(self.backoff_base * (2 ** exponent), self.backoff_max)
+        self._retry_at = time.monotonic() + delay
+        logger.error(f"Memory DB unavailable ({error}), next attempt in {delay:.0f}s")
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+
+        now = time.monotonic()
+        if now - self._last_checked.get(id(conn), 0.0) < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+
+        self._last_checked[id(conn)] = now
+        return True
+
+    def _discard(self, pool, conn) -> None:
+        self._last_checked.pop(id(conn), None)
+        # Удаляем записи на месте: другие потоки держат ссылку на тот же словарь
+        with self._prepared_lock:
+            for key in [key for key in self._prepared if key[0] == id(conn)]:
+                self._prepared.pop(key, None)
+        try:
+            pool.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self) -> Iterator[Optional[Any]]:
+        """
+        Соединение из пула или None, если БД недоступна (вызывающий код
+        работает в деградированном режиме). Если все соединения заняты,
+        ждет не дольше checkout_timeout, затем поднимает PoolExhaustedError.
+        Незавершенная транзакция откатывается при возврате соединения в пул.
+        """
+        pool = self._get_pool()
+        # После ошибки подключения пауза действует и на выдачу из готового пула
+        if pool is None or time.monotonic() < self._retry_at:
+            yield None
+            return
+
+        deadline = time.monotonic() + self.checkout_timeout
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolExhaustedError(f"no free memory DB connection in {self.checkout_timeout:.1f}s")
+
+        try:
+            conn = self._checkout(pool, deadline)
+            if conn is None:
+                yield None
+                return
+
+            if self._failures:
+                self._failures = 0
+
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                if broken or conn.closed:
+                    self._discard(pool, conn)
+                else:
+                    if conn.status != psycopg2.extensions.STATUS_READY:
+                        try:
+                            conn.rollback()
+                        except psycopg2.Error:
+                            self._discard(pool, conn)
+                            conn = None
+                    if conn is not None:
+                        pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def _checkout(self, pool, deadline: float) -> Optional[Any]:
+        """Здоровое соединение из пула; None - БД недоступна (с backoff)"""
+        conn = None
+        try:
+            for _ in range(2):
+                conn = self._getconn(pool, deadline)
+                if self._is_healthy(conn):
+                    return conn
+                self._discard(pool, conn)
+                conn = None
+        except PoolExhaustedError:
+            raise
+        except Exception as e:
+            if conn is not None:
+                self._discard(pool, conn)
+            self._register_failure(e)
+            return None
+
+        self._register_failure(RuntimeError("no healthy connection in pool"))
+        return None
+
+    @staticmethod
+    def _getconn(pool, deadline: float):
+        # Общий пул ProductionConfigManager могут занимать и другие модули
+        while True:
+            try:
+                return pool.getconn()
+            except psycopg2.pool.PoolError as e:
+                if getattr(pool, 'closed', False):
+                    raise
+                if time.monotonic() >= deadline:
+                    raise PoolExhaustedError(f"memory DB pool exhausted: {e}") from e
+                time.sleep(_CHECKOUT_RETRY_INTERVAL)
+
+    def execute_prepared(self, cursor, name: str, statement: str, types: Sequence[str],
+                         params: Sequence[Any],
+                         local_settings: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Выполняет именованный prepared statement, подготавливая его один раз
+        на соединение. statement использует $1..$n, types - их типы в SQL.
+        local_settings - параметры сервера (SET LOCAL) на время транзакции,
+        отправляются одним запросом вместе с EXECUTE.
+        Предназначен для чтения: при повторной подготовке транзакция откатывается.
+        """
+        conn = cursor.connection
+        key = (id(conn), conn.get_backend_pid())
+        prepared = self._prepared.setdefault(key, set())
+
+        if name not in prepared:
+            self._prepare(cursor, name, statement, types)
+            prepared.add(name)
+
+        query = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+        args = tuple(params)
+        if local_settings:
+            query = ''.join(f"SET LOCAL {key} = %s; " for key in local_settings) + query
+            args = tuple(local_settings.values()) + args
+
+        try:
+            cursor.execute(query, args)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Сессия на сервере сменилась - подготавливаем заново
+            conn.rollback()
+            self._prepare(cursor, name, statement, types)
+            cursor.execute(query, args)
+
+    @staticmethod
+    def _prepare(cursor, name: str, statement: str, types: Sequence[str]) -> None:
+        try:
+            cursor.execute(f"PREPARE {name} ({', '.join(types)}) AS {statement}")
+        except psycopg2.errors.DuplicatePreparedStatement:
+            cursor.connection.rollback()
+
+
+_provider: Optional[PgConnectionProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_connection_provider() -> PgConnectionProvider:
+    """Общий на процесс провайдер соединений памяти"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = PgConnectionProvider(
+                    min_connections=int(os.getenv('DB_POOL_MIN', '1')),
+                    max_connections=int(os.getenv('DB_POOL_MAX', '10')),
+                    connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+                    checkout_timeout=float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '10'))
+                )
+    return _provider
@@ -20,8 +20,9 @@ except ImportError:
 
 # Импорты проекта
 from .base import MemoryAdapter, Message, MemoryContext
+from ..utils.lexicon_matcher import lexicon_service, memory_config_lexicons
 try:
-    from ..config.production_config_manager import get_config
+    from ..config.production_config_manager import get_compiled_config
     CONFIG_MANAGER_AVAILABLE = True
 except ImportError:
     CONFIG_MANAGER_AVAILABLE = False
@@ -165,14 +166,16 @@ class EnhancedBufferMemory(MemoryAdapter):
         if CONFIG_MANAGER_AVAILABLE:
             try:
                 # Используем ProductionConfigManager для загрузки правильной конфигурации
-                enhanced_config = get_config('enhanced_memory_config', self.user_id, {})
-                system_config = get_config('system_defaults', self.user_id, {})
-                
-                return {
-                    **enhanced_config,  # Полная конфигурация для эмоций, важности и тем
-                    **system_config.get('system', {}).get('limits', {}),
-                    **system_config.get('system', {}).get('thresholds', {}).get('memory', {})
-                }
+                return get_compiled_config(
+                    'enhanced_buffer_memory',
+                    ('enhanced_memory_config', 'system_defaults'),
+                    lambda enhanced_config, system_config: {
+                        **enhanced_config,  # Полная конфигурация для эмоций, важности и тем
+                        **system_config.get('system', {}).get('limits', {}),
+                        **system_config.get('system', {}).get('thresholds', {}).get('memory', {})
+                    },
+                    self.user_id
+                )
             except Exception as e:
                 self.logger.warning(f"Failed to load config from ProductionConfigManager: {e}")
         
@@ -262,17 +265,24 @@ class EnhancedBufferMemory(MemoryAdapter):
         except Exception as e:
             self.logger.error(f"Failed to add message: {e}")
     
+    def _lexicon_hits(self, text: str) -> Dict[str, float]:
+        """Маркеры эмоций, тем и важности из конфигурации, найденные в тексте (общий проход)"""
+        namespace = lexicon_service.register_content('enhanced_buffer_memory',
+                                                     lambda: memory_config_lexicons(self.config),
+                                                     source=self.config)
+        return lexicon_service.match(namespace, text)
+    
     def _detect_emotion(self, text: str) -> Optional[EmotionTag]:
         """Автоматическое определение эмоции в тексте без хардкода"""
         try:
             # Получаем эмоциональные маркеры из конфигурации
             emotion_markers = self.config.get('emotion_markers', {})
             
-            text_lower = text.lower()
+            hits = self._lexicon_hits(text)
             
             # Проверяем каждую эмоцию из конфигурации
-            for emotion_name, markers in emotion_markers.items():
-                if any(marker in text_lower for marker in markers):
+            for emotion_name in emotion_markers:
+                if f'emotion:{emotion_name}' in hits:
                     try:
                         return EmotionTag(emotion_name.lower())
                     except ValueError:
@@ -293,16 +303,15 @@ class EnhancedBufferMemory(MemoryAdapter):
             # Базовая важность по роли
             base_importance = importance_config.get('role_weights', {}).get(role, 0.5)
             
-            text_lower = text.lower()
+            hits = self._lexicon_hits(text)
             
             # Проверяем маркеры важности из конфигурации
             importance_markers = importance_config.get('importance_markers', {})
             
             for category, data in importance_markers.items():
-                markers = data.get('markers', [])
                 weight = data.get('weight', 0.0)
                 
-                if any(marker in text_lower for marker in markers):
+                if f'importance:{category}' in hits:
                     base_importance += weight
                     break  # Используем только первый найденный маркер
             
@@ -426,30 +435,18 @@ class EnhancedBufferMemory(MemoryAdapter):
     
     def _extract_topics_single(self, text: str) -> List[str]:
         """Извлекает темы из одного сообщения без хардкода"""
-        topics = set()
-        
         # Получаем ключевые слова для тем из конфигурации
         topic_keywords = self.config.get('topic_keywords', {})
         
-        text_lower = text.lower()
-        for topic, keywords in topic_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                topics.add(topic)
-        
-        return list(topics)
+        hits = self._lexicon_hits(text)
+        return [topic for topic in topic_keywords if f'topic:{topic}' in hits]
     
     def _extract_topics(self, messages: List[EnhancedMessage]) -> List[str]:
         """Извлекает темы из сообщений без хардкода"""
         topics = set()
         
-        # Получаем ключевые слова для тем из конфигурации
-        topic_keywords = self.config.get('topic_keywords', {})
-        
         for msg in messages:
-            text_lower = msg.content.lower()
-            for topic, keywords in topic_keywords.items():
-                if any(keyword in text_lower for keyword in keywords):
-                    topics.add(topic)
+            topics.update(self._extract_topics_single(msg.content))
         
         return list(topics)
     
@@ -29,8 +29,9 @@ except ImportError:
 
 # Импорты проекта
 from .base import MemoryAdapter, Message, MemoryContext
+from ..utils.lexicon_matcher import lexicon_service, memory_config_lexicons
 try:
-    from ..config.production_config_manager import get_config
+    from ..config.production_config_manager import get_compiled_config
     CONFIG_MANAGER_AVAILABLE = True
 except ImportError:
     CONFIG_MANAGER_AVAILABLE = False
@@ -119,14 +120,16 @@ class IntelligentVectorMemory:
         if CONFIG_MANAGER_AVAILABLE:
             try:
                 # Загружаем конфигурацию векторной памяти
-                vector_config = get_config('vector_memory_config', self.user_id, {})
-                enhanced_config = get_config('enhanced_memory_config', self.user_id, {})
-                
-                return {
-                    **vector_config,
-                    'llm': enhanced_config.get('llm', {}),
-                    'features': enhanced_config.get('features', {})
-                }
+                return get_compiled_config(
+                    'intelligent_vector_memory',
+                    ('vector_memory_config', 'enhanced_memory_config'),
+                    lambda vector_config, enhanced_config: {
+                        **vector_config,
+                        'llm': enhanced_config.get('llm', {}),
+                        'features': enhanced_config.get('features', {})
+                    },
+                    self.user_id
+                )
             except Exception as e:
                 self.logger.warning(f"Failed to load config: {e}")
         
@@ -500,15 +503,17 @@ class IntelligentVectorMemory:
         
         # Проверяем ключевые слова важности - ИСПРАВЛЕНО: учитываем ВСЕ маркеры
         importance_markers = self.config.get('importance_calculation', {}).get('importance_markers', {})
-        content_lower = message.content.lower()
+        namespace = lexicon_service.register_content('intelligent_vector_memory',
+                                                     lambda: memory_config_lexicons(self.config),
+                                                     source=self.config)
+        hits = lexicon_service.match(namespace, message.content)
         
         # Ищем максимальный вес среди всех найденных маркеров
         max_weight = 0.0
         for category, data in importance_markers.items():
-            markers = data.get('markers', [])
             weight = data.get('weight', 0.0)
             
-            if any(marker in content_lower for marker in markers):
+            if f'importance:{category}' in hits:
                 max_weight = max(max_weight, weight)
         
         base_importance += max_weight
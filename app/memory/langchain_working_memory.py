@@ -18,6 +18,8 @@ except ImportError as e:
     print(f"⚠️ LangChain импорт ошибка: {e}")
 
 # Проект imports
+from ..utils.lexicon_matcher import lexicon_service, memory_config_lexicons
+
 try:
     from ..config.production_config_manager import get_config
     CONFIG_AVAILABLE = True
@@ -220,14 +222,21 @@ class WorkingMemorySystem:
             self.logger.error(f"Ошибка добавления сообщения: {e}")
             return {"error": str(e)}
     
+    def _lexicon_hits(self, text: str) -> Dict[str, float]:
+        """Маркеры эмоций и тем из YAML конфигурации, найденные в тексте (общий проход)"""
+        namespace = lexicon_service.register_content('working_memory',
+                                                     lambda: memory_config_lexicons(self.config),
+                                                     source=self.config)
+        return lexicon_service.match(namespace, text)
+    
     def _detect_emotion(self, text: str) -> Optional[str]:
         """Определяет эмоцию из YAML конфигурации (БЕЗ ХАРДКОДА)"""
         try:
             emotion_markers = self.config.get("emotion_markers", {})
-            text_lower = text.lower()
+            hits = self._lexicon_hits(text)
             
-            for emotion, markers in emotion_markers.items():
-                if any(marker in text_lower for marker in markers):
+            for emotion in emotion_markers:
+                if f"emotion:{emotion}" in hits:
                     return emotion
             
             return None
@@ -239,14 +248,9 @@ class WorkingMemorySystem:
         """Определяет темы из YAML конфигурации (БЕЗ ХАРДКОДА)"""
         try:
             topic_keywords = self.config.get("topic_keywords", {})
-            text_lower = text.lower()
-            topics = []
-            
-            for topic, keywords in topic_keywords.items():
-                if any(keyword in text_lower for keyword in keywords):
-                    topics.append(topic)
+            hits = self._lexicon_hits(text)
             
-            return topics
+            return [topic for topic in topic_keywords if f"topic:{topic}" in hits]
         except Exception as e:
             self.logger.warning(f"Ошибка определения тем: {e}")
             return []
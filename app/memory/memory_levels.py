@@ -18,7 +18,7 @@ from .base import Message, MemoryContext, MemoryAdapter
 
 # Импорты конфигурации
 try:
-    from ..config.production_config_manager import get_config
+    from ..config.production_config_manager import get_compiled_config
     CONFIG_MANAGER_AVAILABLE = True
 except ImportError:
     CONFIG_MANAGER_AVAILABLE = False
@@ -90,10 +90,12 @@ class MemoryLevelsManager:
         """Загружает конфигурацию без хардкода"""
         if CONFIG_MANAGER_AVAILABLE:
             try:
-                return {
-                    **get_config('memory_levels_config', self.user_id, {}),
-                    **get_config('enhanced_memory_config', self.user_id, {}).get('features', {})
-                }
+                return get_compiled_config(
+                    'memory_levels',
+                    ('memory_levels_config', 'enhanced_memory_config'),
+                    lambda levels, enhanced: {**levels, **enhanced.get('features', {})},
+                    self.user_id
+                )
             except Exception as e:
                 self.logger.warning(f"Failed to load config: {e}")
         
@@ -7,9 +7,17 @@ import logging
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from .intelligent_vector_memory import IntelligentVectorMemory
+from ..utils.lexicon_matcher import lexicon_service
 
 logger = logging.getLogger(__name__)
 
+LEXICON_NAMESPACE = 'unified_memory'
+
+# Маркеры сообщений с фактами о пользователе (имя, возраст, работа, хобби)
+lexicon_service.register(LEXICON_NAMESPACE, {
+    'fact': ['зовут', 'лет', 'работаю', 'хобби', 'увлекаюсь', 'senior', 'python']
+})
+
 class UnifiedMemoryManager:
     """
     Унифицированный менеджер памяти
@@ -156,7 +164,7 @@ class UnifiedMemoryManager:
                 for msg in user_messages:
                     content = msg['content']
                     # Ищем сообщения с фактами (имя, возраст, работа, хобби)
-                    if any(keyword in content.lower() for keyword in ['зовут', 'лет', 'работаю', 'хобби', 'увлекаюсь', 'senior', 'python']):
+                    if 'fact' in lexicon_service.match(LEXICON_NAMESPACE, content):
                         if not content.startswith("Промежуточное"):
                             recent_facts.append(f"• {content}")
                 
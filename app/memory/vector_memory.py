@@ -7,68 +7,130 @@ import psycopg2.extras
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from .base import MemoryAdapter, Message, MemoryContext
+from .db_pool import PoolExhaustedError, get_connection_provider
+from .bulk_ingest import VectorMemoryRow, as_utc, copy_vector_memories
+from ..utils.lexicon_matcher import lexicon_service
 
 # Quiet mode setting
 QUIET_MODE = os.getenv('AGATHA_QUIET', 'false').lower() == 'true'
 
+
+class MemoryWriteError(RuntimeError):
+    """Пакет сообщений не записан (БД недоступна, пул занят или COPY не удался)"""
+
 def log_info(message: str):
     """Условное логирование - только если не quiet mode"""
     if not QUIET_MODE:
         print(message)
 from ..config.settings import settings
 
+LEXICON_NAMESPACE = 'vector_memory'
+
+# Маркеры для оценки важности и эмоций (общий автомат сервиса лексиконов)
+_MARKERS = {
+    'first_person': ['я ', 'мне ', 'мой ', 'моя ', 'мои ', 'меня '],
+    'positive': [':)', '😊'],
+    'negative': [':(', '😢'],
+}
+lexicon_service.register(LEXICON_NAMESPACE, _MARKERS)
+
 class VectorMemory(MemoryAdapter):
     """
     Векторная память с настоящей БД (pgvector) для семантического поиска
     """
     
+    # Таблицы проверяются один раз на процесс, а не для каждого пользователя
+    _tables_created = False
+    
+    # Поддерживает ли сервер итеративный обход ANN-индекса (pgvector >= 0.8)
+    _iterative_scan_supported = True
+    
+    # ANN-индексы по типу (создаются миграциями, см. 005_vector_memories_hnsw.sql)
+    _INDEX_NAMES = {
+        'hnsw': 'idx_vector_memories_embedding_hnsw',
+        'ivfflat': 'idx_vector_memories_embedding',
+    }
+    
+    # Верхняя граница hnsw.ef_search в pgvector
+    _MAX_EF_SEARCH = 1000
+    
+    # Запросы семантического поиска (подготавливаются один раз на соединение).
+    # Сортировка только по расстоянию идет через ANN-индекс; важность учитывается
+    # вторым этапом на ограниченном наборе кандидатов ($4).
+    _SEARCH_STATEMENT = """
+        WITH candidates AS (
+            SELECT 
+                content, role, timestamp, day_number, importance_score,
+                topics, emotions, metadata,
+                (embedding <=> $2) as similarity_score
+            FROM vector_memories 
+            WHERE user_id = $1
+            ORDER BY embedding <=> $2
+            LIMIT $4
+        )
+        SELECT * FROM candidates
+        ORDER BY similarity_score + (1 - importance_score)
+        LIMIT $3
+    """
+    _CONTEXT_STATEMENT = """
+        SELECT content, importance_score, topics, emotions
+        FROM vector_memories
+        WHERE user_id = $1
+        ORDER BY embedding <=> $2
+        LIMIT 5
+    """
+    
     def __init__(self, user_id: str, max_memories: int = 1000):
         self.user_id = user_id
         self.max_memories = max_memories
-        self.db_pool = None
-        self.connection_error = False
+        # Общий на процесс пул соединений (с health-check и backoff)
+        self.db_pool = get_connection_provider()
         # Добавляем недостающий атрибут memories для совместимости
         self.memories = []
-        
-    def _get_db_pool(self):
-        """Получить пул соединений с БД (устаревший метод)"""
-        print("⚠️ _get_db_pool устарел, используйте _get_db_conn")
-        return None
-
-    def _get_db_conn(self):
-        """Получить соединение с БД PostgreSQL"""
-        try:
-            if self.connection_error:
-                print("⚠️ Соединение с БД ранее не удалось, пропускаем")
-                return None
-
-            conn = psycopg2.connect(
-                host=settings.DATABASE_HOST,
-                port=settings.DATABASE_PORT,
-                user=settings.DATABASE_USER,
-                password=settings.DATABASE_PASSWORD,
-                database=settings.DATABASE_NAME
-            )
-            conn.autocommit = False
-            return conn
-
-        except Exception as e:
-            print(f"❌ Ошибка подключения к БД: {e}")
-            print(f"📍 Попытка подключения к: {settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}")
-            self.connection_error = True
-            return None
+    
+    def _connection(self):
+        """
+        Соединение из общего пула (None если БД недоступна), возвращается в пул при выходе.
+        PoolExhaustedError - все соединения заняты дольше таймаута выдачи
+        """
+        return self.db_pool.connection()
+    
+    @staticmethod
+    def _index_type() -> str:
+        return 'ivfflat' if settings.VECTOR_INDEX_TYPE == 'ivfflat' else 'hnsw'
+    
+    @staticmethod
+    def _ann_settings(candidates: int) -> Dict[str, Any]:
+        """Параметры ANN-поиска на время запроса (SET LOCAL)"""
+        ann_settings = {
+            # ef_search не меньше числа кандидатов, иначе HNSW вернет меньше строк,
+            # но не больше допустимого pgvector (иначе SET LOCAL падает)
+            'hnsw.ef_search': min(max(settings.VECTOR_HNSW_EF_SEARCH, candidates), VectorMemory._MAX_EF_SEARCH),
+            'ivfflat.probes': settings.VECTOR_IVFFLAT_PROBES,
+        }
+        if VectorMemory._iterative_scan_supported and settings.VECTOR_ITERATIVE_SCAN != 'off':
+            # Фильтр по user_id после обхода индекса: продолжаем обход, пока не наберем LIMIT
+            ann_settings[f'{VectorMemory._index_type()}.iterative_scan'] = settings.VECTOR_ITERATIVE_SCAN
+        return ann_settings
+    
+    @staticmethod
+    def _to_vector(embedding: List[float]) -> str:
+        """Эмбеддинг в текстовый формат pgvector"""
+        return f"[{','.join(map(str, embedding))}]"
     
     def _ensure_tables(self):
         """Создать таблицы если их нет"""
         # Кэшируем результат - не создаем таблицы повторно
-        if hasattr(self, '_tables_created') and self._tables_created:
+        if VectorMemory._tables_created:
             return True
-            
-        conn = self._get_db_conn()
-        if not conn:
-            print("⚠️ БД недоступна, пропускаем создание таблиц")
-            return False
-            
+        
+        with self._connection() as conn:
+            if not conn:
+                print("⚠️ БД недоступна, пропускаем создание таблиц")
+                return False
+            return self._create_tables(conn)
+    
+    def _create_tables(self, conn) -> bool:
         try:
             with conn.cursor() as cursor:
                 # Создаем таблицу для векторных воспоминаний
@@ -94,28 +156,48 @@ class VectorMemory(MemoryAdapter):
                     CREATE INDEX IF NOT EXISTS idx_vector_memories_user_id ON vector_memories(user_id);
                     CREATE INDEX IF NOT EXISTS idx_vector_memories_timestamp ON vector_memories(timestamp);
                     CREATE INDEX IF NOT EXISTS idx_vector_memories_importance ON vector_memories(importance_score);
+                    CREATE INDEX IF NOT EXISTS idx_vector_memories_user_importance
+                        ON vector_memories(user_id, importance_score DESC);
                 """)
                 
-                # Создаем векторный индекс для семантического поиска
-                try:
-                    cursor.execute("""
-                        CREATE INDEX IF NOT EXISTS idx_vector_memories_embedding 
-                        ON vector_memories 
-                        USING ivfflat (embedding vector_cosine_ops) 
-                        WITH (lists = 100);
-                    """)
-                except Exception as e:
-                    print(f"⚠️ Векторный индекс не создан (возможно pgvector не установлен): {e}")
+                # Векторный индекс создается миграцией - только проверяем его наличие
+                self._check_vector_index(cursor)
                 
                 conn.commit()
                 print("✅ Таблицы и индексы созданы/проверены")
-                self._tables_created = True  # Кэшируем результат
+                VectorMemory._tables_created = True  # Кэшируем результат
                 return True
                 
         except Exception as e:
             print(f"❌ Ошибка создания таблиц: {e}")
+            conn.rollback()
             return False
     
+    def _check_vector_index(self, cursor) -> None:
+        """
+        Проверка ANN-индекса по эмбеддингам и поддержки iterative scan.
+        Индекс строится миграцией (CREATE INDEX CONCURRENTLY), а не здесь:
+        сборка HNSW по заполненной таблице внутри запроса блокирует запись.
+        """
+        cursor.execute("SELECT 1 FROM pg_indexes WHERE tablename = 'vector_memories' AND indexname = %s",
+                       (self._INDEX_NAMES[self._index_type()],))
+        if cursor.fetchone() is None:
+            print(f"⚠️ Векторный индекс {self._INDEX_NAMES[self._index_type()]} не найден, поиск без индекса. "
+                  f"Примените app/database/migrations/005_vector_memories_hnsw.sql")
+        
+        if settings.VECTOR_ITERATIVE_SCAN == 'off':
+            return
+        
+        cursor.execute("SAVEPOINT vm_iterative_scan")
+        try:
+            cursor.execute(f"SET LOCAL {self._index_type()}.iterative_scan = %s",
+                           (settings.VECTOR_ITERATIVE_SCAN,))
+            cursor.execute("RELEASE SAVEPOINT vm_iterative_scan")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT vm_iterative_scan")
+            VectorMemory._iterative_scan_supported = False
+            print(f"⚠️ Iterative scan недоступен (pgvector < 0.8?), поиск без него: {e}")
+    
     def _generate_embedding(self, text: str) -> List[float]:
         """Генерируем векторное представление текста"""
         try:
@@ -144,14 +226,94 @@ class VectorMemory(MemoryAdapter):
             print("💡 Система не может работать без OpenAI API")
             raise Exception(f"Embedding generation failed: {e}")
     
+    def _generate_embeddings(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+        """Эмбеддинги для списка текстов пачками (один запрос к OpenAI на пачку)"""
+        import openai
+        if not settings.OPENAI_API_KEY:
+            raise Exception("OpenAI API key required")
+        
+        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), batch_size):
+            response = client.embeddings.create(
+                input=texts[start:start + batch_size],
+                model="text-embedding-ada-002"
+            )
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return embeddings
+    
+    def _message_metadata(self, message: Message, context: MemoryContext) -> Dict[str, Any]:
+        return {
+            'message_length': len(message.content),
+            'has_question': '?' in message.content,
+            'day_context': context.day_number
+        }
+    
+    def add_messages(self, messages: List[Message], context: MemoryContext,
+                     embeddings: Optional[List[List[float]]] = None) -> int:
+        """
+        Пакетная запись сообщений (импорт истории, отложенная запись).
+        Важные сообщения сохраняются одним бинарным COPY; embeddings можно
+        передать заранее посчитанными (по одному на сообщение), иначе они
+        запрашиваются пачками. Возвращает число сохраненных сообщений
+        (0 - ни одно не прошло порог важности). Если БД недоступна или
+        запись не удалась, поднимает MemoryWriteError: ничего не записано,
+        пачку можно повторить.
+        """
+        if embeddings is not None and len(embeddings) != len(messages):
+            raise ValueError("embeddings must match messages one-to-one")
+        
+        selected = [i for i, message in enumerate(messages)
+                    if self._meets_importance_threshold(message)]
+        if not selected:
+            return 0
+        
+        try:
+            if not self._ensure_tables():
+                raise MemoryWriteError("БД недоступна, сообщения не сохранены")
+            
+            if embeddings is None:
+                selected_embeddings = self._generate_embeddings([messages[i].content for i in selected])
+            else:
+                selected_embeddings = [embeddings[i] for i in selected]
+            
+            rows = [
+                VectorMemoryRow(
+                    user_id=self.user_id,
+                    content=messages[i].content,
+                    role=messages[i].role,
+                    timestamp=messages[i].timestamp,
+                    day_number=context.day_number,
+                    importance_score=self._calculate_importance(messages[i], context),
+                    embedding=embedding,
+                    topics=self._extract_topics(messages[i].content),
+                    emotions=self._detect_emotions(messages[i].content),
+                    metadata=self._message_metadata(messages[i], context)
+                )
+                for i, embedding in zip(selected, selected_embeddings)
+            ]
+            
+            with self._connection() as conn:
+                if not conn:
+                    raise MemoryWriteError("БД недоступна, сообщения не сохранены")
+                
+                written = copy_vector_memories(conn, rows)
+                conn.commit()
+                print(f"🧠 VectorMemory: Пакетно сохранено {written} из {len(messages)} сообщений")
+                
+                # Лимит проверяем один раз на пачку, а не на каждую строку
+                self._cleanup_old_memories(conn)
+                return written
+                
+        except MemoryWriteError:
+            raise
+        except Exception as e:
+            raise MemoryWriteError(f"Ошибка пакетного сохранения в VectorMemory: {e}") from e
+    
     def add_message(self, message: Message, context: MemoryContext) -> None:
         """Добавить сообщение в векторную БД"""
         try:
-            # Проверяем доступность БД только один раз
-            if not hasattr(self, '_db_available'):
-                self._db_available = self._ensure_tables()
-            
-            if not self._db_available:
+            if not self._ensure_tables():
                 print("⚠️ БД недоступна, сообщение не сохранено")
                 return
             
@@ -168,11 +330,14 @@ class VectorMemory(MemoryAdapter):
                 embedding = self._generate_embedding(message.content)
                 
                 # Сохраняем в БД
-                conn = self._get_db_conn()
-                if conn:
+                with self._connection() as conn:
+                    if not conn:
+                        print("⚠️ БД недоступна, сообщение не сохранено")
+                        return
+                    
                     with conn.cursor() as cursor:
                         # Преобразуем эмбеддинг в формат для PostgreSQL
-                        embedding_str = f"[{','.join(map(str, embedding))}]"
+                        embedding_str = self._to_vector(embedding)
                         
                         cursor.execute("""
                             INSERT INTO vector_memories 
@@ -181,13 +346,9 @@ class VectorMemory(MemoryAdapter):
                             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::vector)
                         """, 
                         (self.user_id, message.content, message.role, 
-                         message.timestamp, context.day_number, importance_score,
+                         as_utc(message.timestamp), context.day_number, importance_score,
                          json.dumps(topics), json.dumps(emotions),
-                         json.dumps({
-                             'message_length': len(message.content),
-                             'has_question': '?' in message.content,
-                             'day_context': context.day_number
-                         }),
+                         json.dumps(self._message_metadata(message, context)),
                          embedding_str)
                         )
                     
@@ -195,22 +356,18 @@ class VectorMemory(MemoryAdapter):
                     print(f"🧠 VectorMemory: Сохранено в БД (важность: {importance_score:.2f})")
                     
                     # Очищаем старые записи если превышен лимит
-                    self._cleanup_old_memories()
-                else:
-                    print("⚠️ БД недоступна, сообщение не сохранено")
+                    self._cleanup_old_memories(conn)
             else:
                 print(f"🧠 VectorMemory: Сообщение не важное, не сохраняем")
                 
+        except PoolExhaustedError as e:
+            print(f"⚠️ Пул соединений БД перегружен, сообщение не сохранено: {e}")
         except Exception as e:
             print(f"❌ Ошибка сохранения в VectorMemory: {e}")
     
-    def _cleanup_old_memories(self):
+    def _cleanup_old_memories(self, conn):
         """Очищаем старые записи если превышен лимит"""
         try:
-            conn = self._get_db_conn()
-            if not conn:
-                return
-                
             with conn.cursor() as cursor:
                 # Получаем количество записей для пользователя
                 cursor.execute(
@@ -237,74 +394,73 @@ class VectorMemory(MemoryAdapter):
                     
         except Exception as e:
             print(f"⚠️ Ошибка очистки памяти: {e}")
+            conn.rollback()
     
     def get_context(self, context: MemoryContext, query: str = "") -> str:
         """Получить контекст из векторной БД с семантическим поиском"""
         try:
-            # Проверяем доступность БД только один раз
-            if not hasattr(self, '_db_available'):
-                self._db_available = self._ensure_tables()
-            
-            if not self._db_available:
+            if not self._ensure_tables():
                 return "БД недоступна, используем базовый контекст."
             
-            conn = self._get_db_conn()
-            if not conn:
-                return "БД недоступна, используем базовый контекст."
+            # Эмбеддинг считаем до взятия соединения, чтобы не держать его на время запроса к OpenAI
+            query_embedding = self._generate_embedding(query) if query else None
             
-            with conn.cursor() as cursor:
-                # Получаем общее количество сообщений
-                cursor.execute(
-                    "SELECT COUNT(*) FROM vector_memories WHERE user_id = %s",
-                    (self.user_id,)
-                )
-                total_count = cursor.fetchone()[0]
-                
-                print(f"🧠 VectorMemory: Запрос контекста. Всего в БД: {total_count}")
-                
-                if total_count == 0:
-                    return "Это наше первое общение."
-                
-                # Семантический поиск если есть запрос
-                if query:
-                    query_embedding = self._generate_embedding(query)
-                    cursor.execute("""
-                        SELECT content, importance_score, topics, emotions
-                        FROM vector_memories
-                        WHERE user_id = %s
-                        ORDER BY embedding <=> %s, importance_score DESC
-                        LIMIT 5
-                    """, (self.user_id, query_embedding))
-                    relevant_memories = cursor.fetchall()
-                else:
-                    # Берем самые важные воспоминания
-                    cursor.execute("""
-                        SELECT content, importance_score, topics, emotions
-                        FROM vector_memories
-                        WHERE user_id = %s
-                        ORDER BY importance_score DESC
-                        LIMIT 5
-                    """, (self.user_id,))
-                    relevant_memories = cursor.fetchall()
-                
-                if not relevant_memories:
-                    return f"У нас уже было {total_count} важных разговоров."
-                
-                # Формируем умный контекст
-                context_parts = [f"Мы общаемся уже {total_count} важных сообщений."]
-                
-                for memory in relevant_memories:
-                    if memory[1] > 0.5:  # importance_score
-                        content_preview = memory[0][:100] + "..." if len(memory[0]) > 100 else memory[0]  # content
-                        context_parts.append(f"Помню: {content_preview}")
-                
-                print(f"🧠 Сформированный контекст: {' | '.join(context_parts)}")
-                return " | ".join(context_parts)
+            with self._connection() as conn:
+                if not conn:
+                    return "БД недоступна, используем базовый контекст."
+                return self._build_context(conn, query_embedding)
                 
         except Exception as e:
             print(f"❌ Ошибка получения контекста: {e}")
             return "У нас уже было несколько разговоров."
     
+    def _build_context(self, conn, query_embedding: Optional[List[float]]) -> str:
+        with conn.cursor() as cursor:
+            # Получаем общее количество сообщений
+            cursor.execute(
+                "SELECT COUNT(*) FROM vector_memories WHERE user_id = %s",
+                (self.user_id,)
+            )
+            total_count = cursor.fetchone()[0]
+            
+            print(f"🧠 VectorMemory: Запрос контекста. Всего в БД: {total_count}")
+            
+            if total_count == 0:
+                return "Это наше первое общение."
+            
+            # Семантический поиск если есть запрос
+            if query_embedding:
+                self.db_pool.execute_prepared(
+                    cursor, 'vm_context', self._CONTEXT_STATEMENT, ('varchar', 'vector'),
+                    (self.user_id, self._to_vector(query_embedding)),
+                    local_settings=self._ann_settings(5)
+                )
+                relevant_memories = cursor.fetchall()
+            else:
+                # Берем самые важные воспоминания
+                cursor.execute("""
+                    SELECT content, importance_score, topics, emotions
+                    FROM vector_memories
+                    WHERE user_id = %s
+                    ORDER BY importance_score DESC
+                    LIMIT 5
+                """, (self.user_id,))
+                relevant_memories = cursor.fetchall()
+            
+            if not relevant_memories:
+                return f"У нас уже было {total_count} важных разговоров."
+            
+            # Формируем умный контекст
+            context_parts = [f"Мы общаемся уже {total_count} важных сообщений."]
+            
+            for memory in relevant_memories:
+                if memory[1] > 0.5:  # importance_score
+                    content_preview = memory[0][:100] + "..." if len(memory[0]) > 100 else memory[0]  # content
+                    context_parts.append(f"Помню: {content_preview}")
+            
+            print(f"🧠 Сформированный контекст: {' | '.join(context_parts)}")
+            return " | ".join(context_parts)
+    
     def _search_memories(self, query: str, context: MemoryContext, limit: int = 5) -> List[Dict[str, Any]]:
         """Семантический поиск в векторной БД"""
         try:
@@ -316,50 +472,57 @@ class VectorMemory(MemoryAdapter):
             
             query_embedding = self._generate_embedding(query)
             
-            conn = self._get_db_conn()
-            if not conn:
-                return []
-                
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                # Преобразуем эмбеддинг в формат для PostgreSQL
-                query_embedding_str = f"[{','.join(map(str, query_embedding))}]"
-                
-                # Семантический поиск + релевантность по важности
-                cursor.execute("""
-                    SELECT 
-                        content, role, timestamp, day_number, importance_score,
-                        topics, emotions, metadata,
-                        (embedding <=> %s::vector) as similarity_score
-                    FROM vector_memories 
-                    WHERE user_id = %s
-                    ORDER BY (embedding <=> %s::vector) + (1 - importance_score)
-                    LIMIT %s
-                """, (query_embedding_str, self.user_id, query_embedding_str, limit))
-                
-                results = cursor.fetchall()
-                memories = []
-                for row in results:
-                    memory = {
-                        'content': row['content'],
-                        'role': row['role'],
-                        'timestamp': row['timestamp'],
-                        'day_number': row['day_number'],
-                        'importance_score': row['importance_score'],
-                        'topics': row['topics'] or [],
-                        'emotions': row['emotions'] or [],
-                        'metadata': row['metadata'] or {},
-                        'similarity_score': row['similarity_score']
-                    }
-                    memories.append(memory)
-                
-                return memories
+            with self._connection() as conn:
+                if not conn:
+                    return []
+                
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                    # Семантический поиск + релевантность по важности
+                    candidates = limit * max(settings.VECTOR_CANDIDATE_MULTIPLIER, 1)
+                    self.db_pool.execute_prepared(
+                        cursor, 'vm_search', self._SEARCH_STATEMENT, ('varchar', 'vector', 'int', 'int'),
+                        (self.user_id, self._to_vector(query_embedding), limit, candidates),
+                        local_settings=self._ann_settings(candidates)
+                    )
+                    results = cursor.fetchall()
+            
+            memories = []
+            for row in results:
+                memory = {
+                    'content': row['content'],
+                    'role': row['role'],
+                    'timestamp': row['timestamp'],
+                    'day_number': row['day_number'],
+                    'importance_score': row['importance_score'],
+                    'topics': row['topics'] or [],
+                    'emotions': row['emotions'] or [],
+                    'metadata': row['metadata'] or {},
+                    'similarity_score': row['similarity_score']
+                }
+                memories.append(memory)
+            
+            return memories
                 
         except Exception as e:
             print(f"❌ Ошибка поиска: {e}")
             return []
     
     def _is_important_message(self, message: Message, context: MemoryContext) -> bool:
+        if self._meets_importance_threshold(message):
+            try:
+                # Пробуем сгенерировать эмбеддинг для проверки
+                test_embedding = self._generate_embedding("test")
+                print("✅ Эмбеддинги доступны, сообщение можно сохранить")
+                return True
+            except Exception as e:
+                print(f"❌ Эмбеддинги недоступны: {e}")
+                print("⚠️ Сообщение не может быть сохранено без OpenAI API")
+                return False
         
+        return False
+    
+    def _meets_importance_threshold(self, message: Message) -> bool:
+        """Проходит ли сообщение порог важности (без обращения к OpenAI)"""
         content = message.content.lower()
         
         # Категории важности
@@ -370,8 +533,11 @@ class VectorMemory(MemoryAdapter):
         if len(message.content) > 50:
             importance_score += 1
         
+        markers = lexicon_service.match(LEXICON_NAMESPACE, message.content)
+        
         # Проверяем наличие местоимений первого лица (указывает на личную информацию)
-        if any(pronoun in content for pronoun in ['я ', 'мне ', 'мой ', 'моя ', 'мои ', 'меня ']):
+        is_first_person = 'first_person' in markers
+        if is_first_person:
             importance_score += 1
             
         # Проверяем вопросительные предложения (часто важные)
@@ -381,7 +547,6 @@ class VectorMemory(MemoryAdapter):
         # Дополнительные факторы
         is_detailed = len(message.content) > 50  # Уменьшили с 80 до 50
         has_questions = '?' in message.content
-        is_first_person = any(pronoun in content for pronoun in ['я ', 'мне ', 'мой ', 'моя ', 'мои ', 'меня '])
         
         final_score = importance_score
         if is_detailed: final_score += 0.5
@@ -391,18 +556,7 @@ class VectorMemory(MemoryAdapter):
         print(f"🧠 Анализ важности: '{content[:30]}...' = {final_score:.1f} баллов")
         
         # СНИЖАЕМ ПОРОГ ВАЖНОСТИ с 0.8 до 0.5!
-        if final_score >= 0.5:  # БЫЛО 0.8, СТАЛО 0.5!
-            try:
-                # Пробуем сгенерировать эмбеддинг для проверки
-                test_embedding = self._generate_embedding("test")
-                print("✅ Эмбеддинги доступны, сообщение можно сохранить")
-                return True
-            except Exception as e:
-                print(f"❌ Эмбеддинги недоступны: {e}")
-                print("⚠️ Сообщение не может быть сохранено без OpenAI API")
-                return False
-        
-        return False
+        return final_score >= 0.5  # БЫЛО 0.8, СТАЛО 0.5!
     
     def _calculate_importance(self, message: Message, context: MemoryContext) -> float:
         """Рассчитать важность сообщения (0.0 - 1.0)"""
@@ -413,7 +567,7 @@ class VectorMemory(MemoryAdapter):
         # ИСПРАВЛЕНО: Убираем все хардкод маркеры, используем универсальные правила
         
         # Персональная информация - проверяем местоимения первого лица
-        if any(pronoun in content for pronoun in ['я ', 'мне ', 'мой ', 'моя ', 'мои ', 'меня ']):
+        if 'first_person' in lexicon_service.match(LEXICON_NAMESPACE, message.content):
             score += 0.4
         
         # Эмоциональное содержание - проверяем восклицательные знаки и длину
@@ -462,12 +616,14 @@ class VectorMemory(MemoryAdapter):
         # Определяем эмоции по универсальным признакам
         emotions = []
         
+        markers = lexicon_service.match(LEXICON_NAMESPACE, content)
+        
         # Позитивные эмоции - восклицательные знаки, смайлики
-        if '!' in content or ':)' in content or '😊' in content:
+        if '!' in content or 'positive' in markers:
             emotions.append('позитив')
         
         # Негативные эмоции - грустные смайлики
-        if ':(' in content or '😢' in content:
+        if 'negative' in markers:
             emotions.append('негатив')
         
         # Вопросительные - неуверенность
@@ -482,75 +638,75 @@ class VectorMemory(MemoryAdapter):
             if not self._ensure_tables():
                 return {}
             
-            conn = self._get_db_conn()
-            if not conn:
-                return {}
+            with self._connection() as conn:
+                if not conn:
+                    return {}
                 
-            with conn.cursor() as cursor:
-                # Базовая статистика
-                cursor.execute(
-                    "SELECT COUNT(*) FROM vector_memories WHERE user_id = %s",
-                    (self.user_id,)
-                )
-                total_count = cursor.fetchone()[0]
+                with conn.cursor() as cursor:
+                    # Базовая статистика
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM vector_memories WHERE user_id = %s",
+                        (self.user_id,)
+                    )
+                    total_count = cursor.fetchone()[0]
                 
-                if total_count == 0:
-                    return {}
+                    if total_count == 0:
+                        return {}
                 
-                # Анализ тем
-                cursor.execute("""
-                    SELECT topics FROM vector_memories 
-                    WHERE user_id = %s AND topics IS NOT NULL
-                """, (self.user_id,))
-                topics_result = cursor.fetchall()
+                    # Анализ тем
+                    cursor.execute("""
+                        SELECT topics FROM vector_memories 
+                        WHERE user_id = %s AND topics IS NOT NULL
+                    """, (self.user_id,))
+                    topics_result = cursor.fetchall()
                 
-                all_topics = []
-                for row in topics_result:
-                    if row['topics']:
-                        all_topics.extend(row['topics'])
+                    all_topics = []
+                    for row in topics_result:
+                        if row['topics']:
+                            all_topics.extend(row['topics'])
                 
-                topic_counts = {}
-                for topic in all_topics:
-                    topic_counts[topic] = topic_counts.get(topic, 0) + 1
+                    topic_counts = {}
+                    for topic in all_topics:
+                        topic_counts[topic] = topic_counts.get(topic, 0) + 1
                 
-                # Эмоциональный профиль
-                cursor.execute("""
-                    SELECT emotions FROM vector_memories 
-                    WHERE user_id = %s AND emotions IS NOT NULL
-                """, (self.user_id,))
-                emotions_result = cursor.fetchall()
+                    # Эмоциональный профиль
+                    cursor.execute("""
+                        SELECT emotions FROM vector_memories 
+                        WHERE user_id = %s AND emotions IS NOT NULL
+                    """, (self.user_id,))
+                    emotions_result = cursor.fetchall()
                 
-                all_emotions = []
-                for row in emotions_result:
-                    if row[0]:  # emotions
-                        all_emotions.extend(row[0])
+                    all_emotions = []
+                    for row in emotions_result:
+                        if row[0]:  # emotions
+                            all_emotions.extend(row[0])
                 
-                emotion_counts = {}
-                for emotion in all_emotions:
-                    emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+                    emotion_counts = {}
+                    for emotion in all_emotions:
+                        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
                 
-                # Персональная информация
-                cursor.execute("""
-                    SELECT content FROM vector_memories 
-                    WHERE user_id = %s AND importance_score > 0.7
-                    ORDER BY importance_score DESC
-                    LIMIT 10
-                """, (self.user_id,))
-                personal_memories = cursor.fetchall()
-                
-                profile = {
-                    'user_id': self.user_id,
-                    'total_messages': total_count,
-                    'favorite_topics': sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:5],
-                    'emotional_profile': emotion_counts,
-                    'personal_info': {
-                        'has_name': any('я ' in m['content'].lower() for m in personal_memories),
-                        'has_profession': any('работ' in m['content'].lower() for m in personal_memories),
-                        'details_shared': len(personal_memories)
+                    # Персональная информация
+                    cursor.execute("""
+                        SELECT content FROM vector_memories 
+                        WHERE user_id = %s AND importance_score > 0.7
+                        ORDER BY importance_score DESC
+                        LIMIT 10
+                    """, (self.user_id,))
+                    personal_memories = cursor.fetchall()
+                
+                    profile = {
+                        'user_id': self.user_id,
+                        'total_messages': total_count,
+                        'favorite_topics': sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:5],
+                        'emotional_profile': emotion_counts,
+                        'personal_info': {
+                            'has_name': any('я ' in m['content'].lower() for m in personal_memories),
+                            'has_profession': any('работ' in m['content'].lower() for m in personal_memories),
+                            'details_shared': len(personal_memories)
+                        }
                     }
-                }
                 
-                return profile
+                    return profile
                 
         except Exception as e:
             print(f"❌ Ошибка получения профиля: {e}")
@@ -571,55 +727,55 @@ class VectorMemory(MemoryAdapter):
             if not self._ensure_tables():
                 return f"Разговор из {len(messages)} сообщений."
             
-            conn = self._get_db_conn()
-            if not conn:
-                return f"Разговор из {len(messages)} сообщений."
+            with self._connection() as conn:
+                if not conn:
+                    return f"Разговор из {len(messages)} сообщений."
                 
-            with conn.cursor() as cursor:
-                # Получаем важные воспоминания пользователя
-                cursor.execute("""
-                    SELECT content, topics, emotions
-                    FROM vector_memories 
-                    WHERE user_id = %s AND importance_score > 0.6
-                    ORDER BY importance_score DESC
-                    LIMIT 5
-                """, (self.user_id,))
-                important_memories = cursor.fetchall()
+                with conn.cursor() as cursor:
+                    # Получаем важные воспоминания пользователя
+                    cursor.execute("""
+                        SELECT content, topics, emotions
+                        FROM vector_memories 
+                        WHERE user_id = %s AND importance_score > 0.6
+                        ORDER BY importance_score DESC
+                        LIMIT 5
+                    """, (self.user_id,))
+                    important_memories = cursor.fetchall()
                 
-                if not important_memories:
-                    return f"Разговор из {len(messages)} сообщений."
+                    if not important_memories:
+                        return f"Разговор из {len(messages)} сообщений."
                 
-                # Анализируем темы и эмоции
-                all_topics = []
-                all_emotions = []
+                    # Анализируем темы и эмоции
+                    all_topics = []
+                    all_emotions = []
                 
-                for memory in important_memories:
-                    if memory['topics']:
-                        all_topics.extend(memory['topics'])
-                    if memory['emotions']:
-                        all_emotions.extend(memory['emotions'])
+                    for memory in important_memories:
+                        if memory['topics']:
+                            all_topics.extend(memory['topics'])
+                        if memory['emotions']:
+                            all_emotions.extend(memory['emotions'])
                 
-                # Подсчитываем частоту
-                topic_counts = {}
-                for topic in all_topics:
-                    topic_counts[topic] = topic_counts.get(topic, 0) + 1
+                    # Подсчитываем частоту
+                    topic_counts = {}
+                    for topic in all_topics:
+                        topic_counts[topic] = topic_counts.get(topic, 0) + 1
                 
-                emotion_counts = {}
-                for emotion in all_emotions:
-                    emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+                    emotion_counts = {}
+                    for emotion in all_emotions:
+                        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
                 
-                # Формируем суммаризацию
-                summary_parts = [f"Разговор из {len(messages)} сообщений"]
+                    # Формируем суммаризацию
+                    summary_parts = [f"Разговор из {len(messages)} сообщений"]
                 
-                if topic_counts:
-                    top_topics = sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-                    summary_parts.append(f"Основные темы: {', '.join([topic for topic, _ in top_topics])}")
+                    if topic_counts:
+                        top_topics = sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+                        summary_parts.append(f"Основные темы: {', '.join([topic for topic, _ in top_topics])}")
                 
-                if emotion_counts:
-                    top_emotions = sorted(emotion_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-                    summary_parts.append(f"Преобладающие эмоции: {', '.join([emotion for emotion, _ in top_emotions])}")
+                    if emotion_counts:
+                        top_emotions = sorted(emotion_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+                        summary_parts.append(f"Преобладающие эмоции: {', '.join([emotion for emotion, _ in top_emotions])}")
                 
-                return ". ".join(summary_parts)
+                    return ". ".join(summary_parts)
                 
         except Exception as e:
             print(f"❌ Ошибка суммаризации: {e}")
@@ -631,22 +787,21 @@ class VectorMemory(MemoryAdapter):
             if not self._ensure_tables():
                 return
                 
-            conn = self._get_db_conn()
-            if not conn:
-                return
+            with self._connection() as conn:
+                if not conn:
+                    return
                 
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "DELETE FROM vector_memories WHERE user_id = %s",
-                    (self.user_id,)
-                )
-                conn.commit()
-                print(f"🧠 VectorMemory: Память пользователя {self.user_id} очищена")
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM vector_memories WHERE user_id = %s",
+                        (self.user_id,)
+                    )
+                    conn.commit()
+                    print(f"🧠 VectorMemory: Память пользователя {self.user_id} очищена")
                 
         except Exception as e:
             print(f"❌ Ошибка очистки памяти: {e}")
     
     def close(self):
-        """Закрыть соединения с БД"""
-        if hasattr(self, '_db_conn') and self._db_conn and not self._db_conn.closed:
-            self._db_conn.close() 
\ No newline at end of file
+        """Соединения возвращаются в общий пул после каждой операции - закрывать нечего"""
+        pass
@@ -6,112 +6,85 @@ import logging
 from typing import Dict, Optional, List
 from pathlib import Path
 
+from .prompt_assets import PromptAssetStore, prompt_assets
+
 logger = logging.getLogger(__name__)
 
 class AgataPromptLoader:
     """Загрузчик промптов Агаты из файловой структуры"""
     
-    def __init__(self, base_path: str = "agata_prompt_data"):
+    BIO_FILES = (
+        "agata_bio_01_childhood.txt",
+        "agata_bio_02_study_and_first_job.txt", 
+        "agata_bio_03_warsaw_and_present.txt",
+        "agata_bio_04_personality_and_character.txt",
+        "agata_bio_05_dreams_and_future.txt"
+    )
+    
+    STYLE_FILES = (
+        "style_core.txt",
+        "style_empathy.txt", 
+        "style_etiquette.txt",
+        "style_humor.txt"
+    )
+    
+    def __init__(self, base_path: str = "agata_prompt_data", assets: Optional[PromptAssetStore] = None):
         self.base_path = Path(base_path)
-        self.persona_cache = {}
-        self.style_cache = {}
-        self.stage_cache = {}
+        # Общее с PromptLoader хранилище: файлы читаются один раз и перечитываются при изменении
+        self.assets = assets or prompt_assets
+        self.assets.watch([self.base_path / "persona", self.base_path / "stages", self.base_path / "style"])
         
     def load_persona_bio(self) -> str:
         """Загружает полную биографию Агаты из всех файлов persona/"""
-        if 'full_bio' in self.persona_cache:
-            return self.persona_cache['full_bio']
-            
         persona_dir = self.base_path / "persona"
-        if not persona_dir.exists():
-            logger.error(f"Директория persona не найдена: {persona_dir}")
-            return self._get_fallback_bio()
-            
-        bio_parts = []
+        paths = [persona_dir / filename for filename in self.BIO_FILES]
         
-        # Загружаем файлы биографии в правильном порядке
-        bio_files = [
-            "agata_bio_01_childhood.txt",
-            "agata_bio_02_study_and_first_job.txt", 
-            "agata_bio_03_warsaw_and_present.txt",
-            "agata_bio_04_personality_and_character.txt",
-            "agata_bio_05_dreams_and_future.txt"
-        ]
+        full_bio = self.assets.derived('agata_persona_bio', paths, lambda: self._build_persona_bio(paths))
+        return full_bio if full_bio is not None else self._get_fallback_bio()
+    
+    def _build_persona_bio(self, paths: List[Path]) -> Optional[str]:
+        bio_parts = []
         
-        for filename in bio_files:
-            file_path = persona_dir / filename
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        if content:
-                            bio_parts.append(content)
-                            logger.info(f"Загружен файл биографии: {filename}")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки {filename}: {e}")
+        # Файлы биографии в правильном порядке
+        for file_path in paths:
+            content = self.assets.read(file_path)
+            if content:
+                bio_parts.append(content)
+                logger.info(f"Загружен файл биографии: {file_path.name}")
         
         if not bio_parts:
             logger.warning("Не удалось загрузить файлы биографии, используем fallback")
-            return self._get_fallback_bio()
+            return None
             
         full_bio = "\n\n".join(bio_parts)
-        self.persona_cache['full_bio'] = full_bio
-        
         logger.info(f"Загружена полная биография Агаты: {len(full_bio)} символов")
         return full_bio
     
     def load_style_guidelines(self) -> Dict[str, str]:
         """Загружает руководства по стилю общения"""
-        if 'style_guidelines' in self.style_cache:
-            return self.style_cache['style_guidelines']
-            
         style_dir = self.base_path / "style"
+        paths = [style_dir / filename for filename in self.STYLE_FILES]
+        return self.assets.derived('agata_style_guidelines', paths, lambda: self._build_style_guidelines(paths))
+    
+    def _build_style_guidelines(self, paths: List[Path]) -> Dict[str, str]:
         guidelines = {}
-        
-        style_files = [
-            "style_core.txt",
-            "style_empathy.txt", 
-            "style_etiquette.txt",
-            "style_humor.txt"
-        ]
-        
-        for filename in style_files:
-            file_path = style_dir / filename
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        key = filename.replace('style_', '').replace('.txt', '')
-                        guidelines[key] = content
-                        logger.info(f"Загружен стиль: {key}")
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки {filename}: {e}")
-        
-        self.style_cache['style_guidelines'] = guidelines
+        for file_path in paths:
+            content = self.assets.read(file_path)
+            if content is not None:
+                key = file_path.name.replace('style_', '').replace('.txt', '')
+                guidelines[key] = content
+                logger.info(f"Загружен стиль: {key}")
         return guidelines
     
     def load_stage_prompt(self, stage_number: int) -> str:
         """Загружает промпт для определенного этапа общения"""
-        cache_key = f'stage_{stage_number}'
-        if cache_key in self.stage_cache:
-            return self.stage_cache[cache_key]
-            
-        stage_dir = self.base_path / "stages"
-        stage_file = stage_dir / f"stage_{stage_number}.txt"
+        stage_file = self.base_path / "stages" / f"stage_{stage_number}.txt"
+        content = self.assets.read(stage_file)
         
-        if not stage_file.exists():
+        if content is None:
             logger.warning(f"Файл этапа не найден: {stage_file}")
             return self._get_fallback_stage_prompt(stage_number)
-            
-        try:
-            with open(stage_file, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                self.stage_cache[cache_key] = content
-                logger.info(f"Загружен промпт для этапа {stage_number}")
-                return content
-        except Exception as e:
-            logger.error(f"Ошибка загрузки stage_{stage_number}.txt: {e}")
-            return self._get_fallback_stage_prompt(stage_number)
+        return content
     
     def create_system_prompt(self, stage_number: int = 1, day_number: int = 1) -> str:
         """Создает системный промпт, объединяя биографию, стиль и этап"""
@@ -171,10 +144,8 @@ class AgataPromptLoader:
         return stage_prompts.get(stage_number, "Поддерживай естественное общение.")
     
     def clear_cache(self):
-        """Очищает кеш промптов"""
-        self.persona_cache.clear()
-        self.style_cache.clear() 
-        self.stage_cache.clear()
+        """Очищает кеш промптов (файлы перечитаются при следующем обращении)"""
+        self.assets.invalidate()
         logger.info("Кеш промптов очищен")
 
 # Глобальный экземпляр загрузчика
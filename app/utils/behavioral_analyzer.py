@@ -4,7 +4,82 @@ Behavioral Analyzer - модуль анализа поведения польз
 import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+
+from app.utils.lexicon_matcher import lexicon_service
+
+LEXICON_NAMESPACE = 'behavioral_analyzer'
+
+# Веса маркеров эмоций при подсчете баллов
+_EMOTION_MARKER_WEIGHTS = {'keywords': 2, 'emojis': 3, 'punctuation': 1}
+
+# Окно последних сообщений для стабильности и стиля коммуникации
+_RECENT_WINDOW = 5
+
+STRATEGIES = ('caring', 'playful', 'mysterious', 'reserved', 'intellectual', 'supportive')
+
+# Веса выбора стратегии (_choose_strategy и пакетный анализ считают по ним же).
+# Эмоции: (эмоции, веса, порог интенсивности, доп. веса выше порога);
+# доминирующая эмоция вне групп считается нейтральной
+_EMOTION_STRATEGY_WEIGHTS = (
+    (('negative', 'anxious', 'tired'), {'caring': 3.0, 'supportive': 2.5}, 0.7, {'caring': 1.0}),
+    (('positive', 'excited'), {'playful': 2.5, 'caring': 1.5}, 0.6, {'playful': 1.0}),
+    (('confused',), {'supportive': 2.0, 'intellectual': 1.5, 'caring': 1.0}, None, {}),
+    (('angry',), {'reserved': 2.0, 'supportive': 1.5}, None, {}),
+)
+_NEUTRAL_STRATEGY_WEIGHTS = {'mysterious': 1.5, 'playful': 1.0, 'caring': 1.0}
+
+_NEED_STRATEGY_WEIGHTS = {
+    'emotional_support': {'caring': 2.0, 'supportive': 1.5},
+    'intellectual_stimulation': {'intellectual': 2.5, 'mysterious': 1.5},
+    'playful_interaction': {'playful': 2.5},
+    'deep_connection': {'caring': 1.5, 'mysterious': 1.0},
+    'guidance': {'supportive': 2.0, 'intellectual': 1.0},
+    'validation': {'caring': 1.5, 'supportive': 1.0},
+}
+
+_STYLE_STRATEGY_WEIGHTS = {
+    'emotional': {'caring': 1.5, 'supportive': 1.0},
+    'inquisitive': {'intellectual': 1.5, 'mysterious': 1.0},
+    'narrative': {'caring': 1.0, 'intellectual': 1.0},
+    'expressive': {'playful': 1.5},
+    'concise': {'reserved': 1.0},
+}
+
+_STAGE_STRATEGY_WEIGHTS = {
+    'introduction': {'mysterious': 1.0, 'playful': 0.5},
+    'building_trust': {'caring': 1.5, 'supportive': 1.0},
+    'close_friend': {'caring': 1.5, 'supportive': 1.0},
+    'confidant': {'caring': 2.0, 'intellectual': 1.0},
+}
+
+# Высокий уровень персонализации
+_PERSONALIZATION_THRESHOLD = 0.7
+_PERSONALIZATION_STRATEGY_WEIGHTS = {'caring': 1.0}
+
+
+def _add_weights(scores: Dict[str, float], weights: Dict[str, float]) -> None:
+    for strategy, weight in weights.items():
+        scores[strategy] += weight
+
+
+class _UserBehaviorState:
+    """Накопленное состояние анализа одного пользователя (инкрементальный режим)"""
+    
+    __slots__ = ('hits', 'recent_hits', 'recent_structural', 'recent_lengths',
+                 'processed_count', 'last_fingerprint')
+    
+    def __init__(self):
+        # Баллы категорий лексиконов с затуханием
+        self.hits: Dict[str, float] = {}
+        # Последние сообщения: их категории, структурные паттерны и длины
+        self.recent_hits = deque(maxlen=_RECENT_WINDOW)
+        self.recent_structural = deque(maxlen=_RECENT_WINDOW)
+        self.recent_lengths = deque(maxlen=_RECENT_WINDOW)
+        # Позиция последнего учтенного сообщения пользователя в истории
+        self.processed_count = 0
+        self.last_fingerprint: Optional[Tuple[Any, Any]] = None
+
 
 class BehavioralAnalyzer:
     """
@@ -16,7 +91,21 @@ class BehavioralAnalyzer:
     3. Подготовка динамических правил поведения для PromptComposer
     """
     
-    def __init__(self):
+    def __init__(self, incremental: bool = True, decay: float = 0.7,
+                 rebuild_history: int = 20, max_tracked_users: int = 10000):
+        """
+        Args:
+            incremental: Вести накопленное состояние по пользователям (нужен user_id)
+            decay: Множитель затухания накопленных баллов на каждое новое сообщение
+            rebuild_history: Сколько последних сообщений учитывать при пересборке состояния
+            max_tracked_users: Максимум пользователей в памяти (LRU)
+        """
+        self.incremental = incremental
+        self.decay = decay
+        self.rebuild_history = rebuild_history
+        self.max_tracked_users = max_tracked_users
+        self._user_states: 'OrderedDict[str, _UserBehaviorState]' = OrderedDict()
+        
         # Эмоциональные паттерны для анализа состояний пользователя
         self.emotion_patterns = {
             'positive': {
@@ -75,22 +164,85 @@ class BehavioralAnalyzer:
             'philosophical': ['смысл', 'жизнь', 'душа', 'мысли', 'размышления', 'философия']
         }
         
+        # Индикаторы потребностей
+        self.need_indicators = {
+            'emotional_support': ['поддержи', 'помоги', 'трудно', 'сложно', 'грустно', 'одиноко'],
+            'intellectual_stimulation': ['интересно', 'думаю', 'мнение', 'философия', 'смысл'],
+            'playful_interaction': ['весело', 'смешно', 'шутка', 'игра', 'развлечение'],
+            'deep_connection': ['близость', 'доверие', 'секрет', 'личное', 'сокровенное'],
+            'guidance': ['совет', 'что делать', 'как быть', 'направление', 'решение'],
+            'validation': ['правильно', 'нормально', 'понимаешь', 'согласна', 'поддерживаешь']
+        }
+        
+        # Индикаторы предпочтительного уровня интимности (проверяются по порядку)
+        self.intimacy_indicators = {
+            'high': ['секрет', 'личное', 'сокровенное', 'доверие', 'близко'],
+            'medium': ['друг', 'понимание', 'поддержка', 'общение'],
+            'low': ['помощь', 'совет', 'информация', 'вопрос']
+        }
+        
+        # Словарные паттерны коммуникации (считаются через общий автомат)
+        self.communication_lexicons = {
+            'storytelling': ['сначала', 'потом', 'затем', 'в итоге', 'история'],  # Рассказывание историй
+            'seeking_advice': ['что делать', 'как быть', 'посоветуй', 'помоги'],  # Просьба совета
+            'sharing_emotions': ['чувствую', 'ощущаю', 'переживаю', 'настроение']  # Делится эмоциями
+        }
+        
         # Паттерны коммуникации
         self.communication_patterns = {
             'question_heavy': r'\?.*\?|\? .+\?',  # Много вопросов
             'exclamation_heavy': r'!.*!|! .+!',  # Много восклицаний
             'long_sentences': r'.{100,}',  # Длинные предложения
             'short_bursts': r'^.{1,20}$',  # Короткие сообщения
-            'storytelling': r'(сначала|потом|затем|в итоге|история)',  # Рассказывание историй
-            'seeking_advice': r'(что делать|как быть|посоветуй|помоги)',  # Просьба совета
-            'sharing_emotions': r'(чувствую|ощущаю|переживаю|настроение)'  # Делится эмоциями
         }
+        self.communication_patterns.update({
+            name: '(' + '|'.join(map(re.escape, words)) + ')'
+            for name, words in self.communication_lexicons.items()
+        })
+        
+        # Структурные паттерны остаются регулярными выражениями, компилируются один раз
+        self._structural_patterns = {
+            name: re.compile(pattern, re.IGNORECASE)
+            for name, pattern in self.communication_patterns.items()
+            if name not in self.communication_lexicons
+        }
+        
+        # Все словари анализатора - в общем автомате сервиса лексиконов
+        lexicon_service.register(LEXICON_NAMESPACE, self._build_lexicons())
+    
+    def _build_lexicons(self) -> Dict[str, Dict[str, float]]:
+        """Категории всех словарей анализатора для общего автомата"""
+        lexicons: Dict[str, Dict[str, float]] = {}
+        
+        for emotion, patterns in self.emotion_patterns.items():
+            scored = lexicons.setdefault(f'emotion:{emotion}', {})
+            for marker_type, weight in _EMOTION_MARKER_WEIGHTS.items():
+                for marker in patterns[marker_type]:
+                    scored[marker] = scored.get(marker, 0) + weight
+            # Только ключевые слова - для оценки стабильности по сообщениям
+            lexicons[f'emotion_keyword:{emotion}'] = dict.fromkeys(patterns['keywords'], 1)
+        
+        for topic, keywords in self.topic_patterns.items():
+            lexicons[f'topic:{topic}'] = dict.fromkeys(keywords, 1)
+        for need, indicators in self.need_indicators.items():
+            lexicons[f'need:{need}'] = dict.fromkeys(indicators, 1)
+        for level, indicators in self.intimacy_indicators.items():
+            lexicons[f'intimacy:{level}'] = dict.fromkeys(indicators, 1)
+        for name, words in self.communication_lexicons.items():
+            lexicons[f'communication:{name}'] = dict.fromkeys(words, 1)
+        
+        return lexicons
     
     def analyze_user_behavior(self, messages: List[Dict], user_profile: Dict = None,
-                                  conversation_context: Dict = None) -> Dict[str, Any]:
+                                  conversation_context: Dict = None,
+                                  user_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Полный анализ поведения пользователя
         
+        С user_id (и incremental=True) анализ инкрементальный: накопленное
+        состояние пользователя обновляется только новыми сообщениями. Если
+        историю не удается сопоставить с состоянием, оно пересобирается.
+        
         Returns:
             {
                 'dominant_emotion': str,
@@ -112,24 +264,141 @@ class BehavioralAnalyzer:
         if not user_messages:
             return self._get_default_analysis()
         
+        if self.incremental and user_id is not None:
+            return self._analyze_incremental(user_id, user_messages, user_profile, conversation_context)
+        
         # Анализируем последние сообщения (более свежие важнее)
         recent_messages = user_messages[-5:]  # Последние 5 сообщений
-        all_content = ' '.join([msg.get('content', '') for msg in recent_messages])
+        
+        # Один проход автомата по каждому сообщению: эмоции, темы, потребности
+        message_hits = [lexicon_service.match(LEXICON_NAMESPACE, msg.get('content', ''))
+                         for msg in recent_messages]
+        hits = Counter()
+        for message_hit in message_hits:
+            hits.update(message_hit)
         
         # 1. Анализ эмоций
-        emotion_analysis = self._analyze_emotions(all_content, recent_messages)
+        emotion_analysis = self._analyze_emotions(hits, message_hits)
         
         # 2. Анализ тем
-        topic_analysis = self._analyze_topics(all_content)
+        topic_analysis = self._analyze_topics(hits)
         
         # 3. Анализ стиля коммуникации  
-        communication_analysis = self._analyze_communication_style(recent_messages)
+        communication_analysis = self._analyze_communication_style(recent_messages, hits)
         
         # 4. Анализ потребностей в отношениях
         relationship_analysis = self._analyze_relationship_needs(
-            all_content, user_profile, conversation_context
+            hits, user_profile, conversation_context
+        )
+        
+        return self._compose_analysis(emotion_analysis, topic_analysis, communication_analysis,
+                                      relationship_analysis, user_profile, conversation_context)
+    
+    def _analyze_incremental(self, user_id: str, user_messages: List[Dict],
+                             user_profile: Dict = None, conversation_context: Dict = None) -> Dict[str, Any]:
+        """Анализ по накопленному состоянию: обрабатываются только новые сообщения"""
+        state = self._user_states.get(user_id)
+        new_messages = self._new_messages(state, user_messages) if state else None
+        
+        if new_messages is None:
+            # Нет состояния или история не сопоставляется - пересобираем
+            state = _UserBehaviorState()
+            new_messages = user_messages[-self.rebuild_history:]
+            self._user_states[user_id] = state
+            while len(self._user_states) > self.max_tracked_users:
+                self._user_states.popitem(last=False)
+        self._user_states.move_to_end(user_id)
+        
+        for message in new_messages:
+            self._update_state(state, message)
+        state.processed_count = len(user_messages)
+        
+        # Дальше - только агрегаты состояния, без повторного разбора текста
+        hits = state.hits
+        emotion_analysis = self._analyze_emotions(hits, list(state.recent_hits))
+        topic_analysis = self._analyze_topics(hits)
+        structural = Counter()
+        for counts in state.recent_structural:
+            structural.update(counts)
+        communication_analysis = self._communication_style_from_counts(
+            structural, hits, list(state.recent_lengths)
+        )
+        relationship_analysis = self._analyze_relationship_needs(
+            hits, user_profile, conversation_context
         )
         
+        return self._compose_analysis(emotion_analysis, topic_analysis, communication_analysis,
+                                      relationship_analysis, user_profile, conversation_context)
+    
+    @staticmethod
+    def _fingerprint(message: Dict) -> Tuple[Any, Any]:
+        turn_id = message.get('turn_id')
+        if turn_id is not None:
+            return 'turn_id', turn_id
+        return message.get('content', ''), message.get('timestamp')
+    
+    def _new_messages(self, state: _UserBehaviorState, user_messages: List[Dict]) -> Optional[List[Dict]]:
+        """Сообщения после последнего учтенного; None если позицию найти не удалось"""
+        if state.last_fingerprint is None:
+            return None
+        
+        if len(user_messages) == 1:
+            # Передан только текущий ход (process_turn): он дописывается к состоянию,
+            # даже если текст совпал с прошлым ("ок", "ок"). Пропускается лишь
+            # повторная обработка того же хода с тем же turn_id
+            message = user_messages[0]
+            if message.get('turn_id') is not None and self._fingerprint(message) == state.last_fingerprint:
+                return []
+            return user_messages
+        
+        # Обычный случай: история только дописывается
+        count = state.processed_count
+        if 0 < count <= len(user_messages) and self._fingerprint(user_messages[count - 1]) == state.last_fingerprint:
+            return user_messages[count:]
+        
+        # История обрезается окном - ищем последнее учтенное сообщение с конца
+        for index in range(len(user_messages) - 1, -1, -1):
+            if self._fingerprint(user_messages[index]) == state.last_fingerprint:
+                return user_messages[index + 1:]
+        return None
+    
+    def _update_state(self, state: _UserBehaviorState, message: Dict) -> None:
+        """Учитывает одно новое сообщение: затухание накопленного + его маркеры"""
+        content = message.get('content', '')
+        message_hits = lexicon_service.match(LEXICON_NAMESPACE, content)
+        
+        decayed = {}
+        for category, score in state.hits.items():
+            score *= self.decay
+            # Совсем слабые следы не храним
+            if score >= 0.05:
+                decayed[category] = score
+        for category, score in message_hits.items():
+            decayed[category] = decayed.get(category, 0.0) + score
+        
+        state.hits = decayed
+        state.recent_hits.append(message_hits)
+        state.recent_structural.append(self._structural_counts(content))
+        state.recent_lengths.append(len(content))
+        state.last_fingerprint = self._fingerprint(message)
+    
+    def reset_user_state(self, user_id: str) -> None:
+        """Сбрасывает накопленное состояние пользователя"""
+        self._user_states.pop(user_id, None)
+
+    def analyze_batch(self, conversations: List[List[Dict]],
+                      conversation_contexts: Optional[List[Optional[Dict]]] = None):
+        """
+        Пакетный анализ многих диалогов (офлайн-аналитика, нужен numpy).
+        Возвращает BehaviorBatchResult; to_analyses() дает результаты
+        в формате analyze_user_behavior.
+        """
+        from app.utils.behavioral_batch import analyze_behavior_batch
+        return analyze_behavior_batch(self, conversations, conversation_contexts)
+
+    def _compose_analysis(self, emotion_analysis: Dict, topic_analysis: Dict,
+                          communication_analysis: Dict, relationship_analysis: Dict,
+                          user_profile: Dict = None, conversation_context: Dict = None) -> Dict[str, Any]:
         # 5. Выбор стратегии на основе всех анализов
         strategy_choice = self._choose_strategy(
             emotion_analysis, topic_analysis, communication_analysis,
@@ -152,28 +421,13 @@ class BehavioralAnalyzer:
             'context_factors': strategy_choice['context_factors']
         }
     
-    def _analyze_emotions(self, content: str, messages: List[Dict]) -> Dict[str, Any]:
+    def _analyze_emotions(self, hits: Dict[str, float], message_hits: List[Dict[str, float]]) -> Dict[str, Any]:
         """Анализ эмоционального состояния"""
-        content_lower = content.lower()
-        emotion_scores = {}
-        
-        # Подсчет эмоциональных маркеров
-        for emotion, patterns in self.emotion_patterns.items():
-            score = 0
-            
-            # Ключевые слова
-            for keyword in patterns['keywords']:
-                score += content_lower.count(keyword) * 2
-            
-            # Эмодзи
-            for emoji in patterns['emojis']:
-                score += content.count(emoji) * 3
-            
-            # Пунктуация
-            for punct in patterns['punctuation']:
-                score += content.count(punct) * 1
-            
-            emotion_scores[emotion] = score
+        # Баллы эмоциональных маркеров (ключевые слова x2, эмодзи x3, пунктуация x1)
+        emotion_scores = {
+            emotion: round(hits.get(f'emotion:{emotion}', 0))
+            for emotion in self.emotion_patterns
+        }
         
         # Определяем доминирующую эмоцию
         if not any(emotion_scores.values()):
@@ -185,7 +439,7 @@ class BehavioralAnalyzer:
             intensity = min(max_score / 10.0, 1.0)  # Нормализуем к 0-1
         
         # Анализ эмоциональной стабильности (изменения эмоций между сообщениями)
-        stability = self._calculate_emotional_stability(messages)
+        stability = self._calculate_emotional_stability(message_hits)
         
         return {
             'dominant_emotion': dominant_emotion,
@@ -194,13 +448,12 @@ class BehavioralAnalyzer:
             'emotion_scores': emotion_scores
         }
     
-    def _analyze_topics(self, content: str) -> Dict[str, Any]:
+    def _analyze_topics(self, hits: Dict[str, float]) -> Dict[str, Any]:
         """Анализ тем разговора"""
-        content_lower = content.lower()
         topic_scores = {}
         
-        for topic, keywords in self.topic_patterns.items():
-            score = sum(content_lower.count(keyword) for keyword in keywords)
+        for topic in self.topic_patterns:
+            score = round(hits.get(f'topic:{topic}', 0))
             if score > 0:
                 topic_scores[topic] = score
         
@@ -218,25 +471,39 @@ class BehavioralAnalyzer:
             'focus_level': focus_level
         }
     
-    def _analyze_communication_style(self, messages: List[Dict]) -> Dict[str, Any]:
+    def _analyze_communication_style(self, messages: List[Dict], hits: Dict[str, float]) -> Dict[str, Any]:
         """Анализ стиля коммуникации"""
         if not messages:
             return {'style': 'balanced', 'engagement': 'moderate'}
         
         all_content = ' '.join([msg.get('content', '') for msg in messages])
         
-        # Анализ паттернов
+        return self._communication_style_from_counts(
+            self._structural_counts(all_content), hits,
+            [len(msg.get('content', '')) for msg in messages]
+        )
+    
+    def _structural_counts(self, text: str) -> Dict[str, int]:
+        """Совпадения структурных паттернов коммуникации (регулярные выражения)"""
+        return {name: len(pattern.findall(text)) for name, pattern in self._structural_patterns.items()}
+    
+    def _communication_style_from_counts(self, structural: Dict[str, int], hits: Dict[str, float],
+                                         message_lengths: List[int]) -> Dict[str, Any]:
+        """Стиль коммуникации по готовым счетчикам паттернов и длинам сообщений"""
+        # Анализ паттернов: структурные - регулярками, словарные - из общего прохода
         pattern_matches = {}
-        for pattern_name, pattern in self.communication_patterns.items():
-            matches = len(re.findall(pattern, all_content, re.IGNORECASE))
+        for pattern_name in self.communication_patterns:
+            if pattern_name in self._structural_patterns:
+                matches = structural.get(pattern_name, 0)
+            else:
+                matches = round(hits.get(f'communication:{pattern_name}', 0))
             pattern_matches[pattern_name] = matches
         
         # Анализ длины сообщений
-        message_lengths = [len(msg.get('content', '')) for msg in messages]
         avg_length = sum(message_lengths) / len(message_lengths)
         
         # Анализ частоты сообщений (engagement)
-        engagement_level = 'high' if len(messages) > 3 else 'moderate' if len(messages) > 1 else 'low'
+        engagement_level = 'high' if len(message_lengths) > 3 else 'moderate' if len(message_lengths) > 1 else 'low'
         
         # Определение стиля
         style = 'balanced'
@@ -260,39 +527,21 @@ class BehavioralAnalyzer:
             'pattern_matches': pattern_matches
         }
     
-    def _analyze_relationship_needs(self, content: str, user_profile: Dict = None,
+    def _analyze_relationship_needs(self, hits: Dict[str, float], user_profile: Dict = None,
                                          conversation_context: Dict = None) -> Dict[str, Any]:
         """Анализ потребностей в отношениях"""
-        content_lower = content.lower()
-        
-        # Индикаторы потребностей
-        need_indicators = {
-            'emotional_support': ['поддержи', 'помоги', 'трудно', 'сложно', 'грустно', 'одиноко'],
-            'intellectual_stimulation': ['интересно', 'думаю', 'мнение', 'философия', 'смысл'],
-            'playful_interaction': ['весело', 'смешно', 'шутка', 'игра', 'развлечение'],
-            'deep_connection': ['близость', 'доверие', 'секрет', 'личное', 'сокровенное'],
-            'guidance': ['совет', 'что делать', 'как быть', 'направление', 'решение'],
-            'validation': ['правильно', 'нормально', 'понимаешь', 'согласна', 'поддерживаешь']
+        need_scores = {
+            need: round(hits.get(f'need:{need}', 0))
+            for need in self.need_indicators
         }
         
-        need_scores = {}
-        for need, indicators in need_indicators.items():
-            score = sum(content_lower.count(indicator) for indicator in indicators)
-            need_scores[need] = score
-        
         # Определяем основные потребности
         primary_needs = [need for need, score in need_scores.items() if score > 0]
         
         # Определяем предпочтительный уровень интимности
-        intimacy_indicators = {
-            'high': ['секрет', 'личное', 'сокровенное', 'доверие', 'близко'],
-            'medium': ['друг', 'понимание', 'поддержка', 'общение'],
-            'low': ['помощь', 'совет', 'информация', 'вопрос']
-        }
-        
         intimacy_level = 'medium'  # по умолчанию
-        for level, indicators in intimacy_indicators.items():
-            if any(indicator in content_lower for indicator in indicators):
+        for level in self.intimacy_indicators:
+            if f'intimacy:{level}' in hits:
                 intimacy_level = level
                 break
         
@@ -315,15 +564,7 @@ class BehavioralAnalyzer:
                                user_profile: Dict = None, conversation_context: Dict = None) -> Dict[str, Any]:
         """Выбор оптимальной поведенческой стратегии"""
         
-        # Доступные стратегии с весами
-        strategy_scores = {
-            'caring': 0.0,
-            'playful': 0.0,
-            'mysterious': 0.0,
-            'reserved': 0.0,
-            'intellectual': 0.0,
-            'supportive': 0.0
-        }
+        strategy_scores = dict.fromkeys(STRATEGIES, 0.0)
         
         dominant_emotion = emotion_analysis['dominant_emotion']
         emotional_intensity = emotion_analysis['intensity']
@@ -331,85 +572,30 @@ class BehavioralAnalyzer:
         communication_style = communication_analysis['style']
         
         # Эмоционально-ориентированный выбор
-        if dominant_emotion in ['negative', 'anxious', 'tired']:
-            strategy_scores['caring'] += 3.0
-            strategy_scores['supportive'] += 2.5
-            if emotional_intensity > 0.7:
-                strategy_scores['caring'] += 1.0
-        
-        elif dominant_emotion in ['positive', 'excited']:
-            strategy_scores['playful'] += 2.5
-            strategy_scores['caring'] += 1.5
-            if emotional_intensity > 0.6:
-                strategy_scores['playful'] += 1.0
-        
-        elif dominant_emotion == 'confused':
-            strategy_scores['supportive'] += 2.0
-            strategy_scores['intellectual'] += 1.5
-            strategy_scores['caring'] += 1.0
-        
-        elif dominant_emotion == 'angry':
-            strategy_scores['reserved'] += 2.0
-            strategy_scores['supportive'] += 1.5
-        
+        for emotions, weights, threshold, intense_weights in _EMOTION_STRATEGY_WEIGHTS:
+            if dominant_emotion in emotions:
+                _add_weights(strategy_scores, weights)
+                if threshold is not None and emotional_intensity > threshold:
+                    _add_weights(strategy_scores, intense_weights)
+                break
         else:  # neutral
-            strategy_scores['mysterious'] += 1.5
-            strategy_scores['playful'] += 1.0
-            strategy_scores['caring'] += 1.0
+            _add_weights(strategy_scores, _NEUTRAL_STRATEGY_WEIGHTS)
         
         # Потребности-ориентированный выбор
         for need in primary_needs:
-            if need == 'emotional_support':
-                strategy_scores['caring'] += 2.0
-                strategy_scores['supportive'] += 1.5
-            elif need == 'intellectual_stimulation':
-                strategy_scores['intellectual'] += 2.5
-                strategy_scores['mysterious'] += 1.5
-            elif need == 'playful_interaction':
-                strategy_scores['playful'] += 2.5
-            elif need == 'deep_connection':
-                strategy_scores['caring'] += 1.5
-                strategy_scores['mysterious'] += 1.0
-            elif need == 'guidance':
-                strategy_scores['supportive'] += 2.0
-                strategy_scores['intellectual'] += 1.0
-            elif need == 'validation':
-                strategy_scores['caring'] += 1.5
-                strategy_scores['supportive'] += 1.0
+            _add_weights(strategy_scores, _NEED_STRATEGY_WEIGHTS.get(need, {}))
         
         # Стиль коммуникации
-        if communication_style == 'emotional':
-            strategy_scores['caring'] += 1.5
-            strategy_scores['supportive'] += 1.0
-        elif communication_style == 'inquisitive':
-            strategy_scores['intellectual'] += 1.5
-            strategy_scores['mysterious'] += 1.0
-        elif communication_style == 'narrative':
-            strategy_scores['caring'] += 1.0
-            strategy_scores['intellectual'] += 1.0
-        elif communication_style == 'expressive':
-            strategy_scores['playful'] += 1.5
-        elif communication_style == 'concise':
-            strategy_scores['reserved'] += 1.0
+        _add_weights(strategy_scores, _STYLE_STRATEGY_WEIGHTS.get(communication_style, {}))
         
         # Контекст отношений
         if conversation_context:
             relationship_stage = conversation_context.get('relationship_stage', 'introduction')
             personalization_level = conversation_context.get('personalization_level', 0.0)
             
-            if relationship_stage == 'introduction':
-                strategy_scores['mysterious'] += 1.0
-                strategy_scores['playful'] += 0.5
-            elif relationship_stage in ['building_trust', 'close_friend']:
-                strategy_scores['caring'] += 1.5
-                strategy_scores['supportive'] += 1.0
-            elif relationship_stage == 'confidant':
-                strategy_scores['caring'] += 2.0
-                strategy_scores['intellectual'] += 1.0
-            
-            # Высокий уровень персонализации
-            if personalization_level > 0.7:
-                strategy_scores['caring'] += 1.0
+            _add_weights(strategy_scores, _STAGE_STRATEGY_WEIGHTS.get(relationship_stage, {}))
+            if personalization_level > _PERSONALIZATION_THRESHOLD:
+                _add_weights(strategy_scores, _PERSONALIZATION_STRATEGY_WEIGHTS)
         
         # Выбираем лучшую стратегию
         best_strategy = max(strategy_scores, key=strategy_scores.get)
@@ -529,21 +715,17 @@ class BehavioralAnalyzer:
         
         return adjustments
     
-    def _calculate_emotional_stability(self, messages: List[Dict]) -> float:
+    def _calculate_emotional_stability(self, message_hits: List[Dict[str, float]]) -> float:
         """Вычисляет эмоциональную стабильность пользователя"""
-        if len(messages) < 2:
+        if len(message_hits) < 2:
             return 0.8  # Нейтральная стабильность
         
         emotions = []
-        for msg in messages[-5:]:  # Последние 5 сообщений
-            content = msg.get('content', '').lower()
+        for hits in message_hits[-5:]:  # Последние 5 сообщений
             msg_emotion = 'neutral'
             
-            for emotion, patterns in self.emotion_patterns.items():
-                score = 0
-                for keyword in patterns['keywords']:
-                    score += content.count(keyword)
-                if score > 0:
+            for emotion in self.emotion_patterns:
+                if f'emotion_keyword:{emotion}' in hits:
                     msg_emotion = emotion
                     break
             
@@ -0,0 +1,315 @@
+"""
+Пакетный анализ поведения для офлайн-аналитики (NumPy)
+
+Повторяет BehavioralAnalyzer.analyze_user_behavior для большого числа
+диалогов сразу: каждое уникальное сообщение разбирается автоматом
+лексиконов один раз, окна последних сообщений суммируются индексированием
+матрицы признаков, а выбор стратегии (_choose_strategy) считается по
+столбцам. Предназначен для пересчета исторических диалогов при настройке
+стратегий; в онлайн-пайплайне используется обычный анализатор.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from app.utils.behavioral_analyzer import (
+    STRATEGIES, _EMOTION_STRATEGY_WEIGHTS, _NEUTRAL_STRATEGY_WEIGHTS, _NEED_STRATEGY_WEIGHTS,
+    _STYLE_STRATEGY_WEIGHTS, _STAGE_STRATEGY_WEIGHTS, _PERSONALIZATION_THRESHOLD,
+    _PERSONALIZATION_STRATEGY_WEIGHTS,
+)
+from app.utils.lexicon_matcher import LexiconMatcher
+
+COMMUNICATION_STYLES = ('balanced', 'inquisitive', 'narrative', 'emotional',
+                        'advice_seeking', 'concise', 'expressive')
+
+INTIMACY_LEVELS = ('high', 'medium', 'low')
+
+RELATIONSHIP_STAGES = ('introduction', 'getting_acquainted', 'building_trust', 'close_friend', 'confidant')
+
+def turn_windows(messages: Sequence[Dict], window: int = 5) -> Iterator[List[Dict]]:
+    """
+    Окна последних сообщений пользователя на каждом его ходе диалога -
+    то, что видел бы analyze_user_behavior в момент этого хода
+    """
+    user_messages = [msg for msg in messages if msg.get('role') == 'user']
+    for end in range(1, len(user_messages) + 1):
+        yield user_messages[max(0, end - window):end]
+
+
+@dataclass
+class BehaviorBatchResult:
+    """Матрицы признаков и выбранные стратегии для пачки диалогов (строка = диалог)"""
+    emotions: Tuple[str, ...]
+    topics: Tuple[str, ...]
+    needs: Tuple[str, ...]
+    patterns: Tuple[str, ...]
+
+    has_messages: 'np.ndarray'          # (n,) bool - есть сообщения пользователя
+    emotion_scores: 'np.ndarray'        # (n, emotions)
+    dominant_emotion: List[str]
+    emotional_intensity: 'np.ndarray'
+    emotional_stability: 'np.ndarray'
+    topic_scores: 'np.ndarray'          # (n, topics)
+    primary_topics: List[List[str]]
+    topic_focus: List[str]
+    pattern_matches: 'np.ndarray'       # (n, patterns)
+    average_length: 'np.ndarray'
+    communication_style: List[str]
+    engagement_level: List[str]
+    need_scores: 'np.ndarray'           # (n, needs)
+    relationship_needs: List[List[str]]
+    intimacy_preference: List[str]
+    relationship_stage: List[str]
+    strategy_scores: 'np.ndarray'       # (n, STRATEGIES)
+    recommended_strategy: List[str]
+    strategy_confidence: 'np.ndarray'
+
+    def __len__(self) -> int:
+        return len(self.has_messages)
+
+    def to_analyses(self, analyzer) -> List[Dict[str, Any]]:
+        """Результаты в формате analyze_user_behavior (для сверки и выгрузки)"""
+        analyses = []
+        for row in range(len(self)):
+            if not self.has_messages[row]:
+                analyses.append(analyzer._get_default_analysis())
+                continue
+
+            emotion_analysis = {'dominant_emotion': self.dominant_emotion[row],
+                                'intensity': float(self.emotional_intensity[row])}
+            relationship_analysis = {'intimacy_level': self.intimacy_preference[row]}
+            communication_analysis = {'style': self.communication_style[row]}
+            needs = self.relationship_needs[row]
+
+            analyses.append({
+                'dominant_emotion': self.dominant_emotion[row],
+                'emotional_intensity': float(self.emotional_intensity[row]),
+                'emotional_stability': float(self.emotional_stability[row]),
+                'primary_topics': self.primary_topics[row],
+                'topic_focus': self.topic_focus[row],
+                'communication_style': self.communication_style[row],
+                'engagement_level': self.engagement_level[row],
+                'relationship_needs': needs,
+                'intimacy_preference': self.intimacy_preference[row],
+                'recommended_strategy': self.recommended_strategy[row],
+                'strategy_confidence': float(self.strategy_confidence[row]),
+                'behavioral_adjustments': analyzer._create_behavioral_adjustments(
+                    self.recommended_strategy[row], emotion_analysis,
+                    relationship_analysis, communication_analysis
+                ),
+                'context_factors': {
+                    'emotional_state': self.dominant_emotion[row],
+                    'relationship_stage': self.relationship_stage[row],
+                    'primary_need': needs[0] if needs else 'general_interaction',
+                    'communication_preference': self.communication_style[row]
+                }
+            })
+        return analyses
+
+
+def _weights_vector(weights: Dict[str, float]) -> 'np.ndarray':
+    """Веса стратегий в порядке STRATEGIES"""
+    return np.array([weights.get(strategy, 0.0) for strategy in STRATEGIES])
+
+
+def _weights_matrix(names: Sequence[str], weights: Dict[str, Dict[str, float]]) -> 'np.ndarray':
+    """Строки весов стратегий для names (нулевые для отсутствующих в weights)"""
+    return np.array([_weights_vector(weights.get(name, {})) for name in names]).reshape(-1, len(STRATEGIES))
+
+
+def _top_names(scores: 'np.ndarray', names: Sequence[str], limit: int) -> List[List[str]]:
+    """Имена столбцов с ненулевым баллом по убыванию (при равенстве - в порядке объявления)"""
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :limit]
+    positive = np.take_along_axis(scores, order, axis=1) > 0
+    return [[names[column] for column, keep in zip(row_order, row_keep) if keep]
+            for row_order, row_keep in zip(order.tolist(), positive.tolist())]
+
+
+def analyze_behavior_batch(analyzer,
+                           conversations: Iterable[Sequence[Dict]],
+                           conversation_contexts: Optional[Sequence[Optional[Dict]]] = None,
+                           window: int = 5) -> BehaviorBatchResult:
+    """
+    Анализ пачки диалогов; каждый диалог - список сообщений, как для
+    analyze_user_behavior. Результат совпадает с полным (неинкрементальным)
+    анализом каждого диалога по отдельности.
+    """
+    if not NUMPY_AVAILABLE:
+        raise ImportError("numpy is required for batch behaviour analysis")
+
+    emotions = tuple(analyzer.emotion_patterns)
+    topics = tuple(analyzer.topic_patterns)
+    needs = tuple(analyzer.need_indicators)
+    patterns = tuple(analyzer.communication_patterns)
+    structural = analyzer._structural_patterns
+
+    lexicons = analyzer._build_lexicons()
+    categories = list(lexicons)
+    column = {category: index for index, category in enumerate(categories)}
+    matcher = LexiconMatcher(lexicons)
+
+    # 1. Уникальные сообщения -> строки матрицы признаков (один проход автомата на текст)
+    text_rows: Dict[str, int] = {}
+    rows: List[Dict[int, float]] = []
+    windows: List[List[int]] = []
+    joined_texts: List[str] = []
+
+    for messages in conversations:
+        user_messages = [msg for msg in messages if msg.get('role') == 'user'][-window:]
+        indices = []
+        for message in user_messages:
+            content = message.get('content', '')
+            row = text_rows.get(content)
+            if row is None:
+                row = text_rows[content] = len(rows)
+                rows.append({column[category]: score for category, score in matcher.scan(content).scores.items()})
+            indices.append(row)
+        windows.append(indices)
+        joined_texts.append(' '.join(message.get('content', '') for message in user_messages))
+
+    n = len(windows)
+    pad = len(rows)
+    features = np.zeros((len(rows) + 1, len(categories)))
+    lengths = np.zeros(len(rows) + 1)
+    for row, scores in enumerate(rows):
+        for col, score in scores.items():
+            features[row, col] = score
+    for content, row in text_rows.items():
+        lengths[row] = len(content)
+
+    # Окна выровнены вправо, пустые позиции указывают на нулевую строку pad
+    window_index = np.full((n, window), pad, dtype=np.int64)
+    for row, indices in enumerate(windows):
+        if indices:
+            window_index[row, window - len(indices):] = indices
+    valid = window_index != pad
+    counts = valid.sum(axis=1)
+    has_messages = counts > 0
+
+    summed = features[window_index].sum(axis=1)
+
+    def block(prefix: str, names: Sequence[str], source: 'np.ndarray' = summed) -> 'np.ndarray':
+        # Баллы округляются так же, как в анализаторе (round)
+        return np.rint(source[:, [column[f'{prefix}:{name}'] for name in names]])
+
+    # 2. Эмоции: доминирующая (первый максимум), интенсивность, стабильность
+    emotion_scores = block('emotion', emotions)
+    max_emotion = emotion_scores.max(axis=1)
+    emotion_names = np.array(emotions + ('neutral',), dtype=object)
+    dominant_index = np.where(max_emotion > 0, emotion_scores.argmax(axis=1), len(emotions))
+    dominant_emotion = emotion_names[dominant_index].tolist()
+    intensity = np.where(max_emotion > 0, np.minimum(max_emotion / 10.0, 1.0), 0.3)
+
+    keyword_hits = block('emotion_keyword', emotions, features) > 0
+    message_emotion = np.where(keyword_hits.any(axis=1), keyword_hits.argmax(axis=1), len(emotions))
+    window_emotion = message_emotion[window_index]
+    changes = ((window_emotion[:, 1:] != window_emotion[:, :-1]) & valid[:, :-1]).sum(axis=1)
+    max_changes = np.maximum(counts - 1, 1)
+    stability = np.where(counts < 2, 0.8, np.clip(1.0 - changes / max_changes, 0.0, 1.0))
+
+    # 3. Темы
+    topic_scores = block('topic', topics)
+    primary_topics = _top_names(topic_scores, topics, 3)
+    topic_total = topic_scores.sum(axis=1)
+    topic_focus = ['focused' if len(primary) <= 2 and total > 3 else 'diverse'
+                   for primary, total in zip(primary_topics, topic_total.tolist())]
+
+    # 4. Стиль коммуникации: словарные паттерны из матрицы, структурные - регулярками по окну
+    pattern_matches = np.zeros((n, len(patterns)))
+    for index, name in enumerate(patterns):
+        if name in structural:
+            pattern_matches[:, index] = [len(structural[name].findall(text)) for text in joined_texts]
+        else:
+            pattern_matches[:, index] = np.rint(summed[:, column[f'communication:{name}']])
+    matches = {name: pattern_matches[:, index] for index, name in enumerate(patterns)}
+
+    average_length = np.where(has_messages, lengths[window_index].sum(axis=1) / np.maximum(counts, 1), 0.0)
+    style_index = np.select(
+        [matches['question_heavy'] > 2,
+         (matches['storytelling'] > 0) & (average_length > 100),
+         matches['sharing_emotions'] > 1,
+         matches['seeking_advice'] > 0,
+         average_length < 30,
+         matches['exclamation_heavy'] > 2],
+        [1, 2, 3, 4, 5, 6],
+        default=0
+    )
+    style_names = np.array(COMMUNICATION_STYLES, dtype=object)
+    communication_style = style_names[style_index].tolist()
+    engagement_level = np.select([counts > 3, counts > 1], ['high', 'moderate'], default='low').tolist()
+
+    # 5. Потребности (до трех первых в порядке объявления) и уровень интимности
+    need_scores = block('need', needs)
+    need_matched = need_scores > 0
+    active_needs = need_matched & (np.cumsum(need_matched, axis=1) <= 3)
+    relationship_needs = [[needs[col] for col in np.flatnonzero(row)] for row in active_needs]
+
+    intimacy_hits = block('intimacy', INTIMACY_LEVELS) > 0
+    intimacy_index = np.where(intimacy_hits.any(axis=1), intimacy_hits.argmax(axis=1), 1)
+
+    contexts = list(conversation_contexts) if conversation_contexts is not None else [None] * n
+    stages = [(context.get('relationship_stage', 'introduction') if context else None) for context in contexts]
+    personalization = np.array([float(context.get('personalization_level', 0.0)) if context else 0.0
+                                for context in contexts])
+    stage_names = np.array(stages, dtype=object)
+    intimacy_index = np.where(np.isin(stage_names, ['close_friend', 'confidant']), 0, intimacy_index)
+    intimacy_index = np.where(np.isin(stage_names, ['introduction', 'getting_acquainted']), 2, intimacy_index)
+    intimacy_preference = np.array(INTIMACY_LEVELS, dtype=object)[intimacy_index].tolist()
+
+    # 6. Баллы стратегий по столбцам (те же таблицы весов, что в _choose_strategy)
+    strategy = np.zeros((n, len(STRATEGIES)))
+    dominant = np.array(dominant_emotion, dtype=object)
+
+    grouped = np.zeros(n, dtype=bool)
+    for emotions_group, weights, threshold, intense_weights in _EMOTION_STRATEGY_WEIGHTS:
+        in_group = np.isin(dominant, emotions_group)
+        grouped |= in_group
+        strategy += np.outer(in_group, _weights_vector(weights))
+        if threshold is not None:
+            strategy += np.outer(in_group & (intensity > threshold), _weights_vector(intense_weights))
+    strategy += np.outer(~grouped, _weights_vector(_NEUTRAL_STRATEGY_WEIGHTS))
+
+    strategy += active_needs @ _weights_matrix(needs, _NEED_STRATEGY_WEIGHTS)
+    strategy += _weights_matrix(COMMUNICATION_STYLES, _STYLE_STRATEGY_WEIGHTS)[style_index]
+
+    stage_weights = _weights_matrix(RELATIONSHIP_STAGES, _STAGE_STRATEGY_WEIGHTS)
+    for stage_index, stage in enumerate(RELATIONSHIP_STAGES):
+        strategy += np.outer(stage_names == stage, stage_weights[stage_index])
+    strategy += np.outer(personalization > _PERSONALIZATION_THRESHOLD,
+                         _weights_vector(_PERSONALIZATION_STRATEGY_WEIGHTS))
+
+    best = strategy.argmax(axis=1)
+    best_score = strategy[np.arange(n), best]
+    confidence = np.minimum(best_score / np.maximum(strategy.sum(axis=1), 1.0), 1.0)
+    recommended = np.array(STRATEGIES, dtype=object)[best].tolist()
+
+    return BehaviorBatchResult(
+        emotions=emotions,
+        topics=topics,
+        needs=needs,
+        patterns=patterns,
+        has_messages=has_messages,
+        emotion_scores=emotion_scores,
+        dominant_emotion=dominant_emotion,
+        emotional_intensity=intensity,
+        emotional_stability=stability,
+        topic_scores=topic_scores,
+        primary_topics=primary_topics,
+        topic_focus=topic_focus,
+        pattern_matches=pattern_matches,
+        average_length=average_length,
+        communication_style=communication_style,
+        engagement_level=engagement_level,
+        need_scores=need_scores,
+        relationship_needs=relationship_needs,
+        intimacy_preference=intimacy_preference,
+        relationship_stage=[stage or 'introduction' for stage in stages],
+        strategy_scores=strategy,
+        recommended_strategy=recommended,
+        strategy_confidence=confidence,
+    )
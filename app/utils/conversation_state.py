@@ -0,0 +1,253 @@
+"""
+Компактное состояние диалога пользователя: счетчики и короткие истории тем
+
+QuestionController и MessageController хранят здесь ритм вопросов и
+последние темы вместо собственных словарей на каждого пользователя.
+Локальный backend держит состояние в процессе и вытесняет простаивающих
+пользователей. Redis backend общий для всех воркеров (счетчики - HINCRBY,
+истории - атомарный Lua) и переживает рестарт: на пользователя один hash,
+срок жизни которого продлевается при каждой записи.
+"""
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Redis опционален - без него состояние живет в пределах процесса
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _LocalUserState:
+    """Состояние пользователя в процессе: целые счетчики и короткие списки"""
+
+    __slots__ = ('counters', 'lists', 'touched')
+
+    def __init__(self, now: float):
+        self.counters: Dict[str, int] = {}
+        self.lists: Dict[str, List[str]] = {}
+        self.touched = now
+
+
+class LocalConversationStateBackend:
+    """
+    In-process хранилище состояния диалогов.
+
+    Пользователи упорядочены по последнему обращению; простаивающие дольше
+    idle_ttl и лишние сверх max_users вытесняются с начала очереди за
+    амортизированное O(1).
+    """
+
+    def __init__(self, max_users: int = 10000, idle_ttl: float = 3600.0):
+        self._users: "OrderedDict[str, _LocalUserState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_users = max_users
+        self._idle_ttl = idle_ttl
+
+    def _entry(self, user_id: str) -> _LocalUserState:
+        now = time.monotonic()
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = _LocalUserState(now)
+        else:
+            entry.touched = now
+            self._users.move_to_end(user_id)
+        self._evict_idle(now)
+        return entry
+
+    def _evict_idle(self, now: float) -> None:
+        while self._users:
+            oldest_id, oldest = next(iter(self._users.items()))
+            if now - oldest.touched < self._idle_ttl and len(self._users) <= self._max_users:
+                break
+            del self._users[oldest_id]
+
+    def incr(self, user_id: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            counters = self._entry(user_id).counters
+            counters[field] = counters.get(field, 0) + amount
+            return counters[field]
+
+    def set_counter(self, user_id: str, field: str, value: int) -> None:
+        with self._lock:
+            self._entry(user_id).counters[field] = value
+
+    def counter(self, user_id: str, field: str) -> int:
+        with self._lock:
+            entry = self._users.get(user_id)
+            return entry.counters.get(field, 0) if entry is not None else 0
+
+    def recent(self, user_id: str, field: str) -> List[str]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            return list(entry.lists.get(field, ())) if entry is not None else []
+
+    def push(self, user_id: str, field: str, item: str, limit: int, unique: bool = False) -> List[str]:
+        with self._lock:
+            lists = self._entry(user_id).lists
+            items = lists.setdefault(field, [])
+            if not (unique and item in items):
+                items.append(item)
+                del items[:-limit]
+            return list(items)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+
+class RedisConversationStateBackend:
+    """Общее для всех воркеров состояние диалогов в Redis (hash на пользователя)"""
+
+    # Добавление в короткий список одним атомарным шагом (JSON-массив в поле hash)
+    _PUSH_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+local items = {}
+if raw then items = cjson.decode(raw) end
+local item = ARGV[2]
+local present = false
+if ARGV[4] == '1' then
+    for _, value in ipairs(items) do
+        if value == item then present = true break end
+    end
+end
+if not present then
+    table.insert(items, item)
+    while #items > tonumber(ARGV[3]) do table.remove(items, 1) end
+end
+local encoded = cjson.encode(items)
+redis.call('HSET', KEYS[1], ARGV[1], encoded)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return encoded
+"""
+
+    def __init__(self, redis_url: str, key_prefix: str = 'conversation_state:',
+                 ttl_seconds: int = 30 * 86400, socket_timeout: float = 0.5):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is required for the redis conversation state backend")
+
+        self._client = redis.Redis.from_url(redis_url, socket_timeout=socket_timeout,
+                                            socket_connect_timeout=socket_timeout,
+                                            decode_responses=True)
+        self._push_script = self._client.register_script(self._PUSH_SCRIPT)
+        self._key_prefix = key_prefix
+        self._ttl = ttl_seconds
+
+    def _key(self, user_id: str) -> str:
+        return f"{self._key_prefix}{user_id}"
+
+    def incr(self, user_id: str, field: str, amount: int = 1) -> int:
+        key = self._key(user_id)
+        pipe = self._client.pipeline()
+        pipe.hincrby(key, field, amount)
+        pipe.expire(key, self._ttl)
+        return int(pipe.execute()[0])
+
+    def set_counter(self, user_id: str, field: str, value: int) -> None:
+        key = self._key(user_id)
+        pipe = self._client.pipeline()
+        pipe.hset(key, field, value)
+        pipe.expire(key, self._ttl)
+        pipe.execute()
+
+    def counter(self, user_id: str, field: str) -> int:
+        value = self._client.hget(self._key(user_id), field)
+        return int(value) if value is not None else 0
+
+    def recent(self, user_id: str, field: str) -> List[str]:
+        return self._decode_list(self._client.hget(self._key(user_id), field))
+
+    def push(self, user_id: str, field: str, item: str, limit: int, unique: bool = False) -> List[str]:
+        encoded = self._push_script(keys=[self._key(user_id)],
+                                    args=[field, item, limit, '1' if unique else '0', self._ttl])
+        return self._decode_list(encoded)
+
+    @staticmethod
+    def _decode_list(raw: Optional[str]) -> List[str]:
+        if not raw:
+            return []
+        # cjson кодирует пустую таблицу как {}
+        items = json.loads(raw)
+        return items if isinstance(items, list) else []
+
+    def __len__(self) -> int:
+        return 0  # Ключи истекают в Redis сами
+
+
+class ConversationStateStore:
+    """
+    Состояние диалогов поверх backend'а. При ошибке общего backend'а
+    retry_after секунд работает на локальном, не дожидаясь таймаутов.
+    """
+
+    def __init__(self, backend=None, retry_after: float = 30.0):
+        self.backend = backend if backend is not None else LocalConversationStateBackend()
+        self._fallback = (self.backend if isinstance(self.backend, LocalConversationStateBackend)
+                          else LocalConversationStateBackend())
+        self.retry_after = retry_after
+        self._retry_at = 0.0
+
+    def _call(self, method: str, *args):
+        backend = self.backend
+        if backend is not self._fallback and time.monotonic() >= self._retry_at:
+            try:
+                return getattr(backend, method)(*args)
+            except Exception as e:
+                logger.warning(f"Conversation state backend error, using local fallback: {e}")
+                self._retry_at = time.monotonic() + self.retry_after
+        return getattr(self._fallback, method)(*args)
+
+    def incr(self, user_id: str, field: str, amount: int = 1) -> int:
+        """Атомарно увеличивает счетчик и возвращает новое значение"""
+        return self._call('incr', str(user_id), field, amount)
+
+    def set_counter(self, user_id: str, field: str, value: int) -> None:
+        self._call('set_counter', str(user_id), field, value)
+
+    def counter(self, user_id: str, field: str) -> int:
+        return self._call('counter', str(user_id), field)
+
+    def recent(self, user_id: str, field: str) -> List[str]:
+        """Короткая история (темы, вопросы) в порядке добавления"""
+        return self._call('recent', str(user_id), field)
+
+    def push(self, user_id: str, field: str, item: str, limit: int, unique: bool = False) -> List[str]:
+        """
+        Добавляет элемент в историю из не более чем limit последних
+        (unique - не добавлять уже присутствующий). Возвращает историю.
+        """
+        return self._call('push', str(user_id), field, item, limit, unique)
+
+
+def create_conversation_state_backend(backend_type: str = 'local', redis_url: Optional[str] = None,
+                                      key_prefix: str = 'conversation_state:', ttl_seconds: int = 30 * 86400,
+                                      max_users: int = 10000, idle_ttl: float = 3600.0):
+    """Создает backend по имени из конфигурации (local | redis)"""
+    if backend_type == 'redis':
+        if redis_url and REDIS_AVAILABLE:
+            try:
+                return RedisConversationStateBackend(redis_url, key_prefix=key_prefix, ttl_seconds=ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Failed to initialize redis conversation state backend: {e}")
+        logger.warning("Redis conversation state backend unavailable, falling back to local backend")
+
+    return LocalConversationStateBackend(max_users=max_users, idle_ttl=idle_ttl)
+
+
+# Глобальное хранилище состояния диалогов
+conversation_state = ConversationStateStore(create_conversation_state_backend(
+    settings.CONVERSATION_STATE_BACKEND,
+    settings.REDIS_URL,
+    ttl_seconds=settings.CONVERSATION_STATE_TTL_DAYS * 86400,
+    max_users=settings.CONVERSATION_STATE_MAX_USERS,
+    idle_ttl=settings.CONVERSATION_STATE_IDLE_SECONDS
+))
@@ -0,0 +1,345 @@
+"""
+Многошаблонный поиск по словарям (лексиконам) за один проход по тексту
+
+Лексиконы - категории со списками шаблонов и весами. Из всех шаблонов один
+раз строится автомат Ахо-Корасик, после чего текст просматривается за один
+проход: время линейно по длине текста и не зависит от размера словарей.
+Вхождения каждого шаблона считаются без перекрытий, как str.count.
+
+LexiconService - общий на процесс автомат: модули памяти и утилиты
+регистрируют свои лексиконы под собственным пространством имен (лексиконы
+из конфигурации - под пространством, производным от содержимого), и одно
+сообщение просматривается один раз для всех.
+"""
+import json
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# Категория -> шаблоны (список - вес 1.0) или {шаблон: вес}
+Lexicons = Mapping[str, Union[Mapping[str, float], Iterable[str]]]
+
+
+class LexiconScan:
+    """Результат просмотра текста: вхождения шаблонов и баллы категорий"""
+
+    __slots__ = ('_matcher', 'counts', 'scores')
+
+    def __init__(self, matcher: 'LexiconMatcher', counts: Dict[int, int]):
+        self._matcher = matcher
+        self.counts = counts
+        self.scores: Dict[str, float] = {}
+        for pattern_id, count in counts.items():
+            for category, weight in matcher._outputs[pattern_id]:
+                self.scores[category] = self.scores.get(category, 0.0) + count * weight
+
+    def score(self, category: str) -> float:
+        return self.scores.get(category, 0.0)
+
+    def matched(self, category: str) -> bool:
+        return category in self.scores
+
+    def patterns(self, category: str) -> List[str]:
+        """Найденные шаблоны категории в порядке их объявления"""
+        return [self._matcher.patterns[pattern_id]
+                for pattern_id in sorted(self.counts)
+                if any(cat == category for cat, _ in self._matcher._outputs[pattern_id])]
+
+    def count(self, pattern: str) -> int:
+        pattern_id = self._matcher._pattern_ids.get(pattern)
+        return self.counts.get(pattern_id, 0) if pattern_id is not None else 0
+
+    def __add__(self, other: 'LexiconScan') -> 'LexiconScan':
+        counts = dict(self.counts)
+        for pattern_id, count in other.counts.items():
+            counts[pattern_id] = counts.get(pattern_id, 0) + count
+        return LexiconScan(self._matcher, counts)
+
+    def __radd__(self, other):
+        # Поддержка sum(scans)
+        return self if other == 0 else NotImplemented
+
+
+class LexiconMatcher:
+    """
+    Автомат Ахо-Корасик над шаблонами всех категорий.
+
+    Один шаблон может входить в несколько категорий с разными весами.
+    При lowercase=True шаблоны и текст приводятся к нижнему регистру.
+    """
+
+    def __init__(self, lexicons: Lexicons, lowercase: bool = True):
+        self.lowercase = lowercase
+        self.categories: Tuple[str, ...] = tuple(lexicons)
+        self.patterns: List[str] = []
+        self._pattern_ids: Dict[str, int] = {}
+        self._outputs: List[List[Tuple[str, float]]] = []
+
+        for category, entries in lexicons.items():
+            weighted = entries.items() if isinstance(entries, Mapping) else ((p, 1.0) for p in entries)
+            for pattern, weight in weighted:
+                if not isinstance(pattern, str):
+                    continue
+                if lowercase:
+                    pattern = pattern.lower()
+                if not pattern:
+                    continue
+                pattern_id = self._pattern_ids.get(pattern)
+                if pattern_id is None:
+                    pattern_id = self._pattern_ids[pattern] = len(self.patterns)
+                    self.patterns.append(pattern)
+                    self._outputs.append([])
+                self._outputs[pattern_id].append((category, float(weight)))
+
+        self._lengths = [len(pattern) for pattern in self.patterns]
+        self._build()
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = goto[state][char] = len(goto)
+                    goto.append({})
+                    terminal.append([])
+                state = next_state
+            terminal[state].append(pattern_id)
+
+        fail = [0] * len(goto)
+        output: List[Tuple[int, ...]] = [()] * len(goto)
+        queue = deque()
+        for state in goto[0].values():
+            queue.append(state)
+            output[state] = tuple(terminal[state])
+
+        # Обход в ширину: ссылка неудачи и выходы наследуются от более коротких суффиксов
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] = tuple(terminal[next_state]) + output[fail[next_state]]
+                queue.append(next_state)
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def scan(self, text: str) -> LexiconScan:
+        """Один проход по тексту: вхождения всех шаблонов всех категорий"""
+        if self.lowercase:
+            text = text.lower()
+
+        goto, fail, output, lengths = self._goto, self._fail, self._output, self._lengths
+        counts: Dict[int, int] = {}
+        last_end: Dict[int, int] = {}
+        state = 0
+
+        for position, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for pattern_id in output[state]:
+                # Вхождения одного шаблона не перекрываются (семантика str.count)
+                if position - lengths[pattern_id] >= last_end.get(pattern_id, 0):
+                    counts[pattern_id] = counts.get(pattern_id, 0) + 1
+                    last_end[pattern_id] = position
+
+        return LexiconScan(self, counts)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Баллы всех категорий (0.0 для категорий без вхождений)"""
+        scan = self.scan(text)
+        return {category: scan.score(category) for category in self.categories}
+
+
+def memory_config_lexicons(config: Mapping[str, Any]) -> Dict[str, Iterable[str]]:
+    """
+    Лексиконы из секций конфигурации памяти: emotion_markers -> emotion:<name>,
+    topic_keywords -> topic:<name>, importance_markers -> importance:<name>
+    """
+    lexicons: Dict[str, Iterable[str]] = {}
+    for emotion, markers in (config.get('emotion_markers') or {}).items():
+        lexicons[f'emotion:{emotion}'] = markers or ()
+    for topic, keywords in (config.get('topic_keywords') or {}).items():
+        lexicons[f'topic:{topic}'] = keywords or ()
+    importance_markers = (config.get('importance_calculation') or {}).get('importance_markers') or {}
+    for category, data in importance_markers.items():
+        lexicons[f'importance:{category}'] = (data or {}).get('markers') or ()
+    return lexicons
+
+
+def _normalize_lexicons(lexicons: Lexicons) -> Dict[str, Dict[str, float]]:
+    normalized = {}
+    for category, entries in lexicons.items():
+        weighted = entries.items() if isinstance(entries, Mapping) else ((p, 1.0) for p in entries)
+        normalized[category] = {pattern: float(weight) for pattern, weight in weighted}
+    return normalized
+
+
+class LexiconService:
+    """
+    Общий автомат по лексиконам всех зарегистрированных модулей.
+
+    register() дешев при повторных вызовах с тем же источником (снимок
+    конфигурации сравнивается по идентичности), а при изменении содержимого
+    автомат пересобирается - так подхватывается hot-reload конфигурации.
+    Результаты просмотра кешируются по тексту, поэтому модули, разбирающие
+    одно и то же сообщение, делят один проход.
+    """
+
+    _MAX_KNOWN_SOURCES = 64
+    # Сколько разных вариантов лексиконов одного префикса держать в автомате
+    _MAX_CONTENT_NAMESPACES = 16
+
+    def __init__(self, scan_cache_size: int = 256):
+        self.scan_cache_size = scan_cache_size
+        self._lock = threading.RLock()
+        self._namespaces: Dict[str, Dict[str, Dict[str, float]]] = {}
+        # Источники, чье содержимое уже зарегистрировано (ссылки держим, чтобы id не переиспользовался)
+        self._known_sources: Dict[str, Dict[int, Any]] = {}
+        # Префикс -> пространства имен по содержимому (в порядке использования)
+        self._content_namespaces: Dict[str, 'OrderedDict[str, None]'] = {}
+        # (префикс, id(source)) -> (source, пространство имен) для register_content
+        self._content_sources: Dict[Tuple[str, int], Tuple[Any, str]] = {}
+        self._matcher: Optional[LexiconMatcher] = None
+        self._scan_cache: 'OrderedDict[str, LexiconScan]' = OrderedDict()
+
+    def register(self, namespace: str,
+                 lexicons: Union[Lexicons, Callable[[], Lexicons]],
+                 source: Any = None) -> None:
+        """
+        Регистрирует (или обновляет) лексиконы пространства имен.
+        source - объект, по идентичности которого повторная регистрация
+        пропускается без сравнения содержимого (по умолчанию сами lexicons);
+        lexicons может быть функцией - она вызывается только для нового source.
+        """
+        source = lexicons if source is None else source
+        known = self._known_sources.get(namespace)
+        if known is not None and id(source) in known:
+            return
+
+        normalized = _normalize_lexicons(lexicons() if callable(lexicons) else lexicons)
+        with self._lock:
+            if self._namespaces.get(namespace) != normalized:
+                self._namespaces[namespace] = normalized
+                self._known_sources[namespace] = {}
+                self._matcher = None
+                self._scan_cache.clear()
+
+            known = self._known_sources.setdefault(namespace, {})
+            if len(known) >= self._MAX_KNOWN_SOURCES:
+                known.clear()
+            known[id(source)] = source
+
+    def register_content(self, prefix: str,
+                         lexicons: Union[Lexicons, Callable[[], Lexicons]],
+                         source: Any = None) -> str:
+        """
+        Регистрирует лексиконы под пространством имен prefix:<хеш содержимого>
+        и возвращает его. Экземпляры с одинаковыми лексиконами (конфигурацией)
+        делят одно пространство, с разными - не перетирают друг друга, и автомат
+        пересобирается только при появлении нового содержимого. source - как
+        в register(): повторный вызов с ним же не вычисляет лексиконы.
+        """
+        source = lexicons if source is None else source
+        with self._lock:
+            cached = self._content_sources.get((prefix, id(source)))
+            if cached is not None and cached[0] is source and cached[1] in self._namespaces:
+                self._content_namespaces[prefix].move_to_end(cached[1])
+                return cached[1]
+        
+        normalized = _normalize_lexicons(lexicons() if callable(lexicons) else lexicons)
+        digest = hashlib.sha1(
+            json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+        namespace = f'{prefix}:{digest}'
+        
+        with self._lock:
+            variants = self._content_namespaces.setdefault(prefix, OrderedDict())
+            if namespace not in self._namespaces:
+                self._namespaces[namespace] = normalized
+                # Устаревшие варианты (старые версии конфигурации) уходят из автомата
+                while len(variants) >= self._MAX_CONTENT_NAMESPACES:
+                    stale, _ = variants.popitem(last=False)
+                    self._namespaces.pop(stale, None)
+                self._matcher = None
+                self._scan_cache.clear()
+            variants[namespace] = None
+            variants.move_to_end(namespace)
+            
+            if len(self._content_sources) >= self._MAX_KNOWN_SOURCES:
+                self._content_sources.clear()
+            self._content_sources[(prefix, id(source))] = (source, namespace)
+        return namespace
+    
+    def _get_matcher(self) -> LexiconMatcher:
+        with self._lock:
+            if self._matcher is None:
+                self._matcher = LexiconMatcher({
+                    f'{namespace}/{category}': entries
+                    for namespace, categories in self._namespaces.items()
+                    for category, entries in categories.items()
+                })
+            return self._matcher
+
+    def scan(self, text: str) -> LexiconScan:
+        """Один проход по тексту для всех зарегистрированных лексиконов (с кешем)"""
+        matcher = self._get_matcher()
+        with self._lock:
+            cached = self._scan_cache.get(text)
+            if cached is not None and cached._matcher is matcher:
+                self._scan_cache.move_to_end(text)
+                return cached
+
+        scan = matcher.scan(text)
+
+        with self._lock:
+            if self._matcher is matcher:
+                self._scan_cache[text] = scan
+                self._scan_cache.move_to_end(text)
+                while len(self._scan_cache) > self.scan_cache_size:
+                    self._scan_cache.popitem(last=False)
+        return scan
+
+    def match(self, namespace: str, text: str) -> Dict[str, float]:
+        """
+        Категории пространства имен, найденные в тексте, с баллами
+        (в порядке объявления категорий).
+        """
+        scores = self.scan(text).scores
+        prefix = f'{namespace}/'
+        return {
+            category: scores[prefix + category]
+            for category in self._namespaces.get(namespace, ())
+            if prefix + category in scores
+        }
+
+    def matched_patterns(self, namespace: str, text: str) -> Dict[str, List[str]]:
+        """
+        Найденные в тексте шаблоны по категориям пространства имен (каждый
+        шаблон один раз, независимо от числа вхождений)
+        """
+        scan = self.scan(text)
+        prefix = f'{namespace}/'
+        return {
+            category: scan.patterns(prefix + category)
+            for category in self._namespaces.get(namespace, ())
+            if prefix + category in scan.scores
+        }
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._scan_cache.clear()
+
+
+# Глобальный экземпляр сервиса лексиконов
+lexicon_service = LexiconService()
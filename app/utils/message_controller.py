@@ -3,9 +3,26 @@ Message Controller - управление структурой и частото
 """
 import re
 import random
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from .conversation_state import ConversationStateStore, LocalConversationStateBackend, conversation_state
+
+# Паттерны разбиения компилируются один раз на модуль
+_SPLIT_PATTERNS = (
+    re.compile(r'[.!?]+\s+'),  # По окончанию предложений
+    re.compile(r',\s+(?=\w+)'),  # По запятым перед значимыми словами
+    re.compile(r'\s+(?=но|однако|при этом|кроме того|кстати)'),  # По союзам
+    re.compile(r'\s+(?=\d+\.)'),  # Перед нумерованными списками
+)
+
+_SENTENCE_SPLIT = re.compile(r'[.!?]+')
+
+# Поля состояния пользователя в хранилище диалогов
+QUESTION_COUNTER_FIELD = 'message_questions'
+TOPICS_FIELD = 'message_topics'
+LAST_QUESTIONS_FIELD = 'message_last_questions'
+
 class MessageController:
     """
     Контроллер для управления:
@@ -15,20 +32,23 @@ class MessageController:
     - Эмоциональной окраской
     """
     
-    def __init__(self, max_message_length: int = 150, question_frequency: int = 3):
+    def __init__(self, max_message_length: int = 150, question_frequency: int = 3,
+                 user_id: Optional[str] = None, state: Optional[ConversationStateStore] = None):
         self.max_message_length = max_message_length
         self.question_frequency = question_frequency  # Каждые N сообщений
-        self.question_counter = 0
-        self.conversation_topics = []  # История тем разговора
-        self.last_questions = []  # Последние заданные вопросы
-        
-        # Паттерны для разбиения текста
-        self.split_patterns = [
-            r'[.!?]+\s+',  # По окончанию предложений
-            r',\s+(?=\w+)',  # По запятым перед значимыми словами
-            r'\s+(?=но|однако|при этом|кроме того|кстати)',  # По союзам
-            r'\s+(?=\d+\.)',  # Перед нумерованными списками
-        ]
+        
+        # Счетчик вопросов, темы и последние вопросы пользователя живут в
+        # хранилище диалогов, так что контроллер можно создавать на каждый ход.
+        # Без user_id у экземпляра собственное локальное состояние
+        if user_id is None:
+            self.user_id = 'default'
+            self.state = state if state is not None else ConversationStateStore(LocalConversationStateBackend())
+        else:
+            self.user_id = user_id
+            self.state = state if state is not None else conversation_state
+        
+        # Паттерны для разбиения текста (в порядке приоритета)
+        self.split_patterns = _SPLIT_PATTERNS
         
         # Эмоциональные маркеры для пауз
         self.pause_triggers = {
@@ -38,6 +58,21 @@ class MessageController:
             'вопрос': ['?', 'интересно', 'а что если', 'может быть']
         }
     
+    @property
+    def question_counter(self) -> int:
+        """Сообщений с последнего вопроса"""
+        return self.state.counter(self.user_id, QUESTION_COUNTER_FIELD) % self.question_frequency
+    
+    @property
+    def conversation_topics(self) -> List[str]:
+        """История тем разговора (не более 10 последних)"""
+        return self.state.recent(self.user_id, TOPICS_FIELD)
+    
+    @property
+    def last_questions(self) -> List[str]:
+        """Последние заданные вопросы (не более 5)"""
+        return self.state.recent(self.user_id, LAST_QUESTIONS_FIELD)
+    
     def process_message(self, content: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         Основная функция обработки сообщения
@@ -49,15 +84,10 @@ class MessageController:
             'delays_ms': List[int]  # Задержки между частями в мс
         }
         """
-        # Извлекаем темы из текущего сообщения
+        # Извлекаем темы из текущего сообщения (храним не более 10 последних)
         current_topics = self._extract_conversation_topics(content)
         for topic in current_topics:
-            if topic not in self.conversation_topics:
-                self.conversation_topics.append(topic)
-        
-        # Сохраняем только последние 10 тем
-        if len(self.conversation_topics) > 10:
-            self.conversation_topics = self.conversation_topics[-10:]
+            self.state.push(self.user_id, TOPICS_FIELD, topic, 10, unique=True)
         
         # Проверяем есть ли уже вопросы в оригинальном контенте
         has_existing_question = '?' in content
@@ -123,22 +153,24 @@ class MessageController:
 
     def _should_add_question(self, context: Dict[str, Any]) -> bool:
         """Определить, нужно ли добавить вопрос с учетом частоты"""
-        self.question_counter += 1
+        # Атомарный счетчик сообщений: ритм общий для всех воркеров
+        messages = self.state.incr(self.user_id, QUESTION_COUNTER_FIELD)
+        counter = messages % self.question_frequency
         
-        print(f"🔍 MessageController: Счетчик вопросов: {self.question_counter}/{self.question_frequency}")
+        print(f"🔍 MessageController: Счетчик вопросов: {counter or self.question_frequency}/{self.question_frequency}")
         
         # СТРОГОЕ ПРАВИЛО: только каждые N сообщений
-        if self.question_counter >= self.question_frequency:
-            self.question_counter = 0
+        if counter == 0:
             print(f"🔍 MessageController: ВРЕМЯ для вопроса (сброс счетчика)")
             return True
         
-        print(f"🔍 MessageController: НЕ время для вопроса (счетчик: {self.question_counter})")
+        print(f"🔍 MessageController: НЕ время для вопроса (счетчик: {counter})")
         return False
 
     def _generate_contextual_question(self, context: Dict[str, Any]) -> str:
         """Сгенерировать вопрос на основе тем предыдущих разговоров"""
-        recent_topics = self.conversation_topics[-3:] if self.conversation_topics else []
+        recent_topics = self.conversation_topics[-3:]
+        last_questions = self.last_questions
         user_mood = context.get('recent_mood', 'neutral')
         
         # Избегаем повторения последних вопросов
@@ -151,7 +183,7 @@ class MessageController:
                 "Есть ли интересные проекты сейчас?",
                 "Как складываются отношения с коллегами?"
             ]
-            available_questions.extend([q for q in questions if q not in self.last_questions])
+            available_questions.extend([q for q in questions if q not in last_questions])
         
         if 'семья' in recent_topics:
             questions = [
@@ -159,7 +191,7 @@ class MessageController:
                 "Что нового в семье?",
                 "Как проводите время вместе?"
             ]
-            available_questions.extend([q for q in questions if q not in self.last_questions])
+            available_questions.extend([q for q in questions if q not in last_questions])
         
         if 'хобби' in recent_topics:
             questions = [
@@ -167,7 +199,7 @@ class MessageController:
                 "Есть ли новые увлечения?",
                 "Удается ли находить время для хобби?"
             ]
-            available_questions.extend([q for q in questions if q not in self.last_questions])
+            available_questions.extend([q for q in questions if q not in last_questions])
         
         # Общие вопросы если нет специфических тем
         if not available_questions:
@@ -178,16 +210,14 @@ class MessageController:
                 "Как настроение сегодня?",
                 "Что тебя больше всего интересует в последнее время?"
             ]
-            available_questions.extend([q for q in general_questions if q not in self.last_questions])
+            available_questions.extend([q for q in general_questions if q not in last_questions])
         
         # Выбираем случайный вопрос
         if available_questions:
             selected_question = random.choice(available_questions)
             
             # Сохраняем вопрос в историю (не более 5 последних)
-            self.last_questions.append(selected_question)
-            if len(self.last_questions) > 5:
-                self.last_questions.pop(0)
+            self.state.push(self.user_id, LAST_QUESTIONS_FIELD, selected_question, 5)
             
             return selected_question
         
@@ -353,9 +383,8 @@ class MessageController:
     def _split_into_sentences(self, text: str) -> List[str]:
         """Разбить текст на предложения"""
         try:
-            import re
             # Разбиваем по точкам, восклицательным и вопросительным знакам
-            sentences = re.split(r'[.!?]+', text)
+            sentences = _SENTENCE_SPLIT.split(text)
             
             result = []
             for sentence in sentences:
@@ -400,15 +429,14 @@ class MessageController:
         search_window = min(max_length, len(text))
         search_start = max(0, search_window - 50)  # Ищем в последних 50 символах
         
-        search_text = text[search_start:search_window]
-        
-        # Пытаемся найти разбиение по паттернам
+        # Пытаемся найти разбиение по паттернам (поиск в окне без копирования строки)
         for pattern in self.split_patterns:
-            matches = list(re.finditer(pattern, search_text))
-            if matches:
+            last_end = 0
+            for match in pattern.finditer(text, search_start, search_window):
+                last_end = match.end()
+            if last_end:
                 # Берем последнее совпадение
-                last_match = matches[-1]
-                return search_start + last_match.end()
+                return last_end
         
         # Если паттерны не найдены, ищем пробел
         last_space = text.rfind(' ', search_start, search_window)
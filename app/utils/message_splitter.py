@@ -1,13 +1,155 @@
 """
 Система разбиения и рандомизации сообщений Агаты
+
+Паттерны скомпилированы один раз на модуль, текст размечается на
+предложения за один проход. MessageStream разбивает ответ по мере
+поступления токенов (feed), отдавая готовые части до конца генерации.
 """
 import re
 import random
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Граница абзаца или конец предложения (знак остается в предложении)
+_BOUNDARY = re.compile(r'\n\n+|(?<=[.!?…])\s+')
+
+# Места принудительного разбиения: запятые, союзы "и/но/а/или", двоеточие, точка с запятой.
+# Просмотр вперед дает все (в т.ч. перекрывающиеся) точки за один проход
+_BREAK_POINTS = re.compile(r'(?=(,\s+|\s+(?:и|но|а|или)\s+|[:;]\s+))')
+
+
+class _SentenceGrouper:
+    """Собирает предложения в части не длиннее max_length; абзацы не смешиваются"""
+    
+    __slots__ = ('max_length', 'sentences', 'length')
+    
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        self.sentences: List[str] = []
+        self.length = 0
+    
+    def add(self, sentence: str, paragraph_end: bool = False) -> List[str]:
+        """Добавляет предложение, возвращает завершенные части"""
+        parts = []
+        if self.length + len(sentence) > self.max_length and self.sentences:
+            parts.extend(self.flush())
+        
+        self.sentences.append(sentence)
+        self.length += len(sentence)
+        
+        if paragraph_end:
+            parts.extend(self.flush())
+        return parts
+    
+    def flush(self) -> List[str]:
+        if not self.sentences:
+            return []
+        part = ' '.join(self.sentences)
+        self.sentences = []
+        self.length = 0
+        return [part]
+
+
+class MessageStream:
+    """
+    Потоковое разбиение ответа на части.
+    
+    feed(chunk) возвращает части, готовые к отправке, close() - оставшиеся.
+    Части собираются по тем же правилам, что в split_message; предложение
+    считается законченным, когда после его знака пришел пробел. Частей не
+    больше max_parts: после max_parts - 1 готовых весь остаток уходит
+    последней частью при close().
+    """
+    
+    def __init__(self, splitter: 'MessageSplitter', max_parts: int = 3):
+        self._splitter = splitter
+        self.max_parts = max_parts
+        self._grouper = _SentenceGrouper(splitter.max_length)
+        self._buffer = ''       # текст после последней границы
+        self._scan_pos = 0      # откуда продолжать поиск границ в буфере
+        self._tail: List[str] = []
+        self._emitted = 0
+        self._closed = False
+    
+    @property
+    def _limited(self) -> bool:
+        return self._emitted >= self.max_parts - 1
+    
+    def feed(self, chunk: str) -> List[str]:
+        """Добавляет фрагмент ответа, возвращает завершенные части"""
+        if self._closed or not chunk:
+            return []
+        
+        self._buffer += chunk
+        if self._limited:
+            return []
+        return self._consume(final=False)
+    
+    def close(self) -> List[str]:
+        """Завершает поток и возвращает оставшиеся части"""
+        if self._closed:
+            return []
+        self._closed = True
+        
+        parts = [] if self._limited else self._consume(final=True)
+        if not self._limited:
+            last = self._buffer.strip()
+            self._buffer = ''
+            parts += self._emit(self._grouper.add(last, True) if last else self._grouper.flush())
+        self._tail.extend(self._grouper.flush())
+        
+        # Непрочитанный буфер размечается так же, как уже разобранный текст
+        sentences = [sentence for sentence, _ in self._splitter._iter_sentences(self._buffer)]
+        self._buffer = ''
+        rest = ' '.join(part for part in self._tail + sentences if part)
+        if rest:
+            parts.append(rest)
+        return parts
+    
+    def _consume(self, final: bool) -> List[str]:
+        buffer = self._buffer
+        start = 0
+        resume: Optional[int] = None
+        ready: List[str] = []
+        
+        for match in _BOUNDARY.finditer(buffer, self._scan_pos):
+            if not final and match.end() == len(buffer):
+                # Пробельная граница может продолжиться в следующем фрагменте
+                resume = match.start()
+                break
+            sentence = buffer[start:match.start()].strip()
+            start = match.end()
+            if sentence:
+                ready.extend(self._grouper.add(sentence, '\n\n' in match.group()))
+        
+        if resume is None:
+            # Последний символ может оказаться началом границы абзаца
+            resume = max(start, len(buffer) - 1)
+        self._buffer = buffer[start:]
+        self._scan_pos = resume - start
+        return self._emit(ready)
+    
+    def _emit(self, ready: List[str]) -> List[str]:
+        parts = []
+        for index, part in enumerate(ready):
+            pieces = (self._splitter._force_split_long_part(part)
+                      if len(part) > self._splitter.max_length else [part])
+            for piece_index, piece in enumerate(pieces):
+                if self._limited:
+                    # Лимит частей: остаток (включая начатую группу) - в последнюю часть
+                    self._tail.extend(pieces[piece_index:] + ready[index + 1:] + self._grouper.flush())
+                    return parts
+                if piece:
+                    parts.append(piece)
+                    self._emitted += 1
+        if self._limited:
+            # Лимит достигнут последней частью: начатая группа тоже уходит в остаток
+            self._tail.extend(self._grouper.flush())
+        return parts
+
+
 class MessageSplitter:
     """Система разбиения сообщений на логические части"""
     
@@ -84,47 +226,34 @@ class MessageSplitter:
         
         return final_parts
     
+    def stream(self, max_parts: int = 3) -> MessageStream:
+        """Потоковое разбиение: части отдаются по мере поступления текста"""
+        return MessageStream(self, max_parts)
+    
+    def _iter_sentences(self, text: str) -> Iterator[Tuple[str, bool]]:
+        """
+        Один проход по тексту: (предложение, закончился ли на нем абзац).
+        Знак конца предложения остается в предложении.
+        """
+        start = 0
+        for match in _BOUNDARY.finditer(text):
+            sentence = text[start:match.start()].strip()
+            if sentence:
+                yield sentence, '\n\n' in match.group()
+            start = match.end()
+        
+        sentence = text[start:].strip()
+        if sentence:
+            yield sentence, True
+    
     def _split_by_sentences(self, text: str) -> List[str]:
         """Разбивает текст по предложениям"""
-        
-        # Паттерны для разбиения
-        sentence_endings = r'[.!?…]\s+'
-        logical_breaks = r'\n\n+'
-        
-        # Сначала разбиваем по абзацам
-        paragraphs = re.split(logical_breaks, text)
-        
         parts = []
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if not paragraph:
-                continue
-                
-            # Разбиваем абзац по предложениям
-            sentences = re.split(sentence_endings, paragraph)
-            sentences = [s.strip() for s in sentences if s.strip()]
-            
-            if len(sentences) == 1:
-                parts.append(sentences[0])
-            else:
-                # Группируем предложения
-                current_part = []
-                current_length = 0
-                
-                for sentence in sentences:
-                    sentence_length = len(sentence)
-                    
-                    if current_length + sentence_length > self.max_length and current_part:
-                        # Завершаем текущую часть
-                        parts.append(' '.join(current_part))
-                        current_part = [sentence]
-                        current_length = sentence_length
-                    else:
-                        current_part.append(sentence)
-                        current_length += sentence_length
-                
-                if current_part:
-                    parts.append(' '.join(current_part))
+        grouper = _SentenceGrouper(self.max_length)
+        
+        for sentence, paragraph_end in self._iter_sentences(text):
+            parts.extend(grouper.add(sentence, paragraph_end))
+        parts.extend(grouper.flush())
         
         return parts
     
@@ -162,25 +291,19 @@ class MessageSplitter:
     def _force_split_long_part(self, text: str) -> List[str]:
         """Принудительно разбивает слишком длинную часть"""
         
-        # Ищем места для разбиения (запятые, союзы)
-        break_points = []
-        
-        # Паттерны для поиска мест разбиения
-        patterns = [
-            r',\s+',      # запятые
-            r'\s+и\s+',   # союз "и"
-            r'\s+но\s+',  # союз "но"
-            r'\s+а\s+',   # союз "а"
-            r'\s+или\s+', # союз "или"
-            r':\s+',      # двоеточие
-            r';\s+',      # точка с запятой
-        ]
+        # Ищем место для разбиения (запятые, союзы), ближайшее к середине
+        text_mid = len(text) // 2
+        best_point = None
         
-        for pattern in patterns:
-            for match in re.finditer(pattern, text):
-                break_points.append(match.end())
+        for match in _BREAK_POINTS.finditer(text):
+            point = match.end(1)
+            if best_point is None or abs(point - text_mid) < abs(best_point - text_mid):
+                best_point = point
+            elif point > text_mid:
+                # Дальше точки только удаляются от середины
+                break
         
-        if not break_points:
+        if best_point is None:
             # Если нет хороших мест для разбиения, разбиваем по словам
             words = text.split()
             mid_point = len(words) // 2
@@ -189,10 +312,6 @@ class MessageSplitter:
                 ' '.join(words[mid_point:])
             ]
         
-        # Выбираем лучшую точку разбиения (ближе к середине)
-        text_mid = len(text) // 2
-        best_point = min(break_points, key=lambda x: abs(x - text_mid))
-        
         return [
             text[:best_point].strip(),
             text[best_point:].strip()
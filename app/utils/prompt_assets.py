@@ -0,0 +1,238 @@
+"""
+Общее хранилище файлов промптов (persona/stages/style) с hot-reload
+
+Файл читается один раз и отдается по ссылке, пока не изменится. Изменения
+ловит ConfigFileWatcher (inotify, при недоступности - опрос mtime): он
+сбрасывает только измененные файлы. Для каталогов без наблюдателя mtime и
+размер проверяются не чаще check_interval. Производные значения (склеенная
+биография, стиль без заголовков) кешируются по версиям исходных файлов и
+пересобираются только после изменения одного из них.
+"""
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Sequence, Set, Tuple, TypeVar
+
+from ..config.file_watcher import ConfigFileWatcher
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+PathLike = Any  # str | os.PathLike
+
+
+class _Asset:
+    """Закешированный файл: содержимое (None - файла нет) и его сигнатура"""
+
+    __slots__ = ('content', 'signature', 'checked_at', 'version')
+
+    def __init__(self, content: Optional[str], signature: Optional[Tuple[int, int]],
+                 checked_at: float, version: int):
+        self.content = content
+        self.signature = signature
+        self.checked_at = checked_at
+        self.version = version
+
+
+class PromptAssetStore:
+    """Файлы промптов в памяти процесса с перечитыванием только измененных"""
+
+    # Сколько ждать установки наблюдения за каталогами
+    _WATCH_READY_TIMEOUT = 2.0
+
+    def __init__(self, check_interval: float = 2.0, watch_enabled: bool = True):
+        self.check_interval = check_interval
+        self.watch_enabled = watch_enabled
+
+        self._lock = threading.RLock()
+        self._assets: Dict[str, _Asset] = {}
+        self._derived: Dict[Hashable, Tuple[Tuple[int, ...], Any]] = {}
+        self._abs_keys: Dict[str, str] = {}
+        self._version = 0
+
+        self._watched_dirs: Set[str] = set()
+        self._watcher: Optional[ConfigFileWatcher] = None
+        self._watcher_thread: Optional[threading.Thread] = None
+
+        self._stats = {'loads': 0, 'hits': 0, 'reloads': 0}
+
+    def _key(self, path: PathLike) -> str:
+        path = os.fspath(path)
+        key = self._abs_keys.get(path)
+        if key is None:
+            key = os.path.abspath(path)
+            # Относительные пути зависят от cwd - запоминаем только абсолютные
+            if os.path.isabs(path):
+                self._abs_keys[path] = key
+        return key
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, path: str, signature: Optional[Tuple[int, int]]) -> _Asset:
+        content = None
+        if signature is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+            except OSError as e:
+                logger.warning(f"Prompt asset {path} unreadable: {e}")
+                signature = None
+
+        self._version += 1
+        self._stats['loads'] += 1
+        return _Asset(content, signature, time.monotonic(), self._version)
+
+    def _asset(self, path: PathLike) -> _Asset:
+        return self._asset_by_key(self._key(path))
+
+    def _asset_by_key(self, key: str) -> _Asset:
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is not None:
+                # Каталог под наблюдателем: запись сбрасывается по событию, stat не нужен
+                if os.path.dirname(key) in self._watched_dirs:
+                    self._stats['hits'] += 1
+                    return asset
+                now = time.monotonic()
+                if now - asset.checked_at < self.check_interval:
+                    self._stats['hits'] += 1
+                    return asset
+
+            signature = self._signature(key)
+            if asset is not None and asset.signature == signature:
+                asset.checked_at = time.monotonic()
+                self._stats['hits'] += 1
+                return asset
+
+            if asset is not None:
+                self._stats['reloads'] += 1
+                logger.info(f"Prompt asset changed, reloading: {key}")
+            asset = self._assets[key] = self._load(key, signature)
+            return asset
+
+    def read(self, path: PathLike) -> Optional[str]:
+        """Содержимое файла без крайних пробелов или None, если файла нет"""
+        return self._asset(path).content
+
+    def derived(self, key: Hashable, paths: Sequence[PathLike], build: Callable[[], T]) -> T:
+        """
+        Значение, построенное из файлов paths; build вызывается заново
+        только если изменился хотя бы один из них.
+        """
+        keys = tuple(self._key(path) for path in paths)
+        cache_key = (key, keys)
+        with self._lock:
+            versions = tuple(self._asset_by_key(path_key).version for path_key in keys)
+            cached = self._derived.get(cache_key)
+            if cached is not None and cached[0] == versions:
+                return cached[1]
+
+            value = build()
+            # build мог перечитать файлы - запоминаем версии, из которых он строил
+            versions = tuple(self._asset_by_key(path_key).version for path_key in keys)
+            self._derived[cache_key] = (versions, value)
+            return value
+
+    def invalidate(self, paths: Optional[Iterable[PathLike]] = None) -> None:
+        """Сбрасывает файлы (по умолчанию все) - при следующем чтении они перечитаются"""
+        with self._lock:
+            if paths is None:
+                self._assets.clear()
+                self._derived.clear()
+                return
+            for path in paths:
+                self._assets.pop(self._key(path), None)
+
+    def watch(self, directories: Iterable[PathLike]) -> bool:
+        """
+        Подписывает каталоги на наблюдатель изменений (несуществующие
+        пропускаются). Возвращает True, если наблюдатель работает.
+        """
+        if not self.watch_enabled:
+            return False
+
+        existing = {self._key(d) for d in directories if os.path.isdir(d)}
+        with self._lock:
+            if existing <= self._watched_dirs and self._watcher is not None:
+                return True
+
+            self._stop_watcher()
+            directories = sorted(self._watched_dirs | existing)
+            if not directories:
+                return False
+
+            self._watcher = ConfigFileWatcher(
+                [Path(d) for d in directories],
+                on_change=self._on_files_changed
+            )
+            self._watcher_thread = threading.Thread(
+                target=self._watch_loop, args=(self._watcher,),
+                name="PromptAssetWatcher", daemon=True
+            )
+            self._watcher_thread.start()
+            # До установки наблюдения события теряются - ждем его, прежде чем доверять кешу
+            if not self._watcher.ready.wait(self._WATCH_READY_TIMEOUT):
+                logger.warning("Prompt asset watcher is not ready, falling back to mtime checks")
+                self._stop_watcher()
+                self._watched_dirs = set()
+                return False
+            # Кеш наблюдаемых каталогов мог устареть: новые - без проверки, прежние -
+            # пока старый наблюдатель был остановлен, а новый еще не установлен
+            watched = set(directories)
+            self._assets = {key: asset for key, asset in self._assets.items()
+                            if os.path.dirname(key) not in watched}
+            self._watched_dirs = watched
+            return True
+
+    def _watch_loop(self, watcher: ConfigFileWatcher) -> None:
+        try:
+            watcher.run()
+        except Exception as e:
+            logger.error(f"Prompt asset watcher error: {e}")
+        finally:
+            watcher.close()
+            with self._lock:
+                if self._watcher is watcher:
+                    # Без наблюдателя возвращаемся к проверке mtime
+                    self._watcher = None
+                    self._watched_dirs = set()
+
+    def _on_files_changed(self, paths: Set[Path]) -> None:
+        self.invalidate(paths)
+
+    def _stop_watcher(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._watcher = None
+        self._watcher_thread = None
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stop_watcher()
+            self._watched_dirs = set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'files': len(self._assets),
+                'derived': len(self._derived),
+                'watched_dirs': sorted(self._watched_dirs),
+            }
+
+
+# Глобальный экземпляр хранилища промптов
+prompt_assets = PromptAssetStore(
+    check_interval=settings.PROMPT_ASSETS_CHECK_INTERVAL,
+    watch_enabled=settings.PROMPT_ASSETS_WATCH
+)
@@ -0,0 +1,257 @@
+"""
+Сборка промпта в пределах бюджета токенов
+
+Каждая секция промпта (факты памяти, семантический контекст, биография,
+стиль) измеряется в токенах кешированным токенизатором. Сначала секция
+обрезается до своего лимита, затем, если сумма превышает общий бюджет,
+режутся секции с наименьшим приоритетом - до их минимума или целиком.
+Обрезка идет по строкам, и только длинная строка режется по токенам.
+Разбивка бюджета по секциям возвращается вместе с текстом и копится в
+статистике сборщика.
+"""
+import math
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Без tiktoken: оценка по символам (кириллица в cl100k - около 3 символов на токен)
+_CHARS_PER_TOKEN = 3.0
+_FALLBACK_ENCODING = 'cl100k_base'
+
+
+class TokenCounter:
+    """
+    Подсчет токенов для модели: кодировка создается один раз,
+    счетчики для повторяющихся текстов (биография, стиль) кешируются
+    """
+
+    def __init__(self, model: str, cache_size: int = 2048):
+        self.model = model
+        self._encoding = self._load_encoding(model)
+        self.name = self._encoding.name if self._encoding is not None else 'chars_estimate'
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @staticmethod
+    def _load_encoding(model: str):
+        if not TIKTOKEN_AVAILABLE:
+            logger.info("tiktoken не установлен, токены оцениваются по длине текста")
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(_FALLBACK_ENCODING)
+        except Exception as e:
+            # Нет доступа к файлам кодировки - работаем по оценке
+            logger.warning(f"Не удалось загрузить кодировку tiktoken для {model}: {e}")
+            return None
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is None:
+            return math.ceil(len(text) / _CHARS_PER_TOKEN)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int, keep_tail: bool = False) -> str:
+        """
+        Обрезает текст до max_tokens: целыми строками, а если не помещается
+        и одна строка - по токенам. keep_tail - сохранять конец текста
+        (последние реплики диалога), иначе начало.
+        """
+        if max_tokens <= 0:
+            return ''
+        if self.count(text) <= max_tokens:
+            return text
+
+        lines = text.split('\n')
+        if keep_tail:
+            lines.reverse()
+
+        kept: List[str] = []
+        used = 0
+        for line in lines:
+            # +1 за перевод строки (в cl100k обычно отдельный или склеенный токен)
+            line_tokens = self.count(line) + (1 if kept else 0)
+            if used + line_tokens > max_tokens:
+                if not kept:
+                    kept.append(self._cut_line(line, max_tokens, keep_tail))
+                break
+            kept.append(line)
+            used += line_tokens
+
+        if keep_tail:
+            kept.reverse()
+        return '\n'.join(kept)
+
+    def _cut_line(self, line: str, max_tokens: int, keep_tail: bool) -> str:
+        if self._encoding is None:
+            limit = int(max_tokens * _CHARS_PER_TOKEN)
+            return line[-limit:] if keep_tail else line[:limit]
+
+        tokens = self._encoding.encode(line, disallowed_special=())
+        tokens = tokens[-max_tokens:] if keep_tail else tokens[:max_tokens]
+        # Срез мог разрезать многобайтовый символ - отбрасываем его остаток
+        return self._encoding.decode(tokens).strip('�')
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model: str) -> TokenCounter:
+    """Общий счетчик токенов для модели (кодировка загружается один раз на процесс)"""
+    return TokenCounter(model)
+
+
+@dataclass
+class PromptSection:
+    """
+    Секция промпта с приоритетом (больше - режется позже) и лимитами в токенах.
+    header - заголовок секции: не режется и выводится только вместе с непустым
+    текстом; его токены входят в лимиты секции.
+    """
+    name: str
+    text: str
+    priority: int = 0
+    max_tokens: Optional[int] = None
+    min_tokens: int = 0
+    keep_tail: bool = False
+    header: str = ''
+
+
+@dataclass
+class AssembledPrompt:
+    """Секции после применения бюджета и разбивка токенов по ним"""
+    sections: Dict[str, str]
+    report: Dict[str, Any]
+    separator: str = "\n\n"
+
+    @property
+    def text(self) -> str:
+        return self.separator.join(text for text in self.sections.values() if text)
+
+
+@dataclass
+class _SectionState:
+    section: PromptSection
+    text: str
+    header_tokens: int
+    original_tokens: int = 0
+    tokens: int = 0
+    trimmed: bool = False
+
+    @property
+    def output(self) -> str:
+        if not self.text or not self.section.header:
+            return self.text
+        return f"{self.section.header}\n{self.text}"
+
+
+class PromptAssembler:
+    """Применяет бюджет токенов к секциям промпта"""
+
+    def __init__(self, total_tokens: int, counter: Optional[TokenCounter] = None,
+                 separator: str = "\n\n", reserved_tokens: int = 0):
+        self.total_tokens = total_tokens
+        self.counter = counter or get_token_counter('gpt-4')
+        self.separator = separator
+        # Токены вне секций (статичный текст шаблона, служебная разметка)
+        self.reserved_tokens = reserved_tokens
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            'assembled': 0,
+            'over_budget': 0,
+            'total_tokens_sum': 0,
+            'max_total_tokens': 0,
+            'trimmed_sections': {}
+        }
+
+    def _section_tokens(self, state: _SectionState) -> int:
+        return self.counter.count(state.text) + state.header_tokens if state.text else 0
+
+    def _trim(self, state: _SectionState, max_tokens: int) -> None:
+        # Заголовок не режется: текст получает то, что осталось после него
+        state.text = self.counter.truncate(state.text, max_tokens - state.header_tokens,
+                                           state.section.keep_tail)
+        state.tokens = self._section_tokens(state)
+        state.trimmed = True
+
+    def assemble(self, sections: Sequence[PromptSection], reserved_tokens: Optional[int] = None) -> AssembledPrompt:
+        """Обрезает секции по их лимитам и общему бюджету"""
+        reserved = self.reserved_tokens if reserved_tokens is None else reserved_tokens
+        separator_tokens = self.counter.count(self.separator)
+
+        states = []
+        for section in sections:
+            # +1 за перевод строки после заголовка
+            header_tokens = self.counter.count(section.header) + 1 if section.header else 0
+            state = _SectionState(section, section.text, header_tokens)
+            state.original_tokens = state.tokens = self._section_tokens(state)
+            if section.max_tokens is not None and state.tokens > section.max_tokens:
+                self._trim(state, section.max_tokens)
+            states.append(state)
+
+        def total() -> int:
+            filled = sum(1 for state in states if state.text)
+            return reserved + sum(state.tokens for state in states) + separator_tokens * max(filled - 1, 0)
+
+        current = total()
+        if current > self.total_tokens:
+            # Сначала младшие по приоритету, при равенстве - более поздние секции
+            order = sorted(range(len(states)), key=lambda i: (states[i].section.priority, -i))
+            for index in order:
+                state = states[index]
+                excess = current - self.total_tokens
+                if excess <= 0:
+                    break
+                if state.tokens <= state.section.min_tokens:
+                    continue
+                self._trim(state, max(state.section.min_tokens, state.tokens - excess))
+                current = total()
+
+        report = {
+            'budget': self.total_tokens,
+            'total_tokens': current,
+            'reserved_tokens': reserved,
+            'over_budget': current > self.total_tokens,
+            'tokenizer': self.counter.name,
+            'sections': {
+                state.section.name: {
+                    'tokens': state.tokens,
+                    'original_tokens': state.original_tokens,
+                    'trimmed': state.trimmed
+                }
+                for state in states
+            }
+        }
+        self._record(report)
+        return AssembledPrompt({state.section.name: state.output for state in states}, report, self.separator)
+
+    def _record(self, report: Dict[str, Any]) -> None:
+        with self._lock:
+            stats = self._stats
+            stats['assembled'] += 1
+            stats['over_budget'] += int(report['over_budget'])
+            stats['total_tokens_sum'] += report['total_tokens']
+            stats['max_total_tokens'] = max(stats['max_total_tokens'], report['total_tokens'])
+            for name, section in report['sections'].items():
+                if section['trimmed']:
+                    stats['trimmed_sections'][name] = stats['trimmed_sections'].get(name, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, trimmed_sections=dict(self._stats['trimmed_sections']))
+        tokens_sum = stats.pop('total_tokens_sum')
+        stats['avg_total_tokens'] = round(tokens_sum / stats['assembled'], 1) if stats['assembled'] else 0.0
+        stats['budget'] = self.total_tokens
+        stats['tokenizer'] = self.counter.name
+        return stats
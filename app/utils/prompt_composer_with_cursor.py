@@ -4,10 +4,16 @@ PromptComposer с поддержкой курсора
 """
 import os
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+from .prompt_budget import PromptAssembler, PromptSection, get_token_counter
+
+SUMMARY_HEADER = "[КРАТКОСРОЧНАЯ ПАМЯТЬ]"
+DIALOGUE_HEADER = "[ТЕКУЩИЙ ДИАЛОГ]"
+ASSISTANT_MARKER = "[ASSISTANT]:"
+
 class PromptComposerWithCursor:
     """
     Компоновщик промптов с поддержкой курсора диалога
@@ -25,6 +31,12 @@ class PromptComposerWithCursor:
         self._base_prompts_cache = {}
         self._daily_prompts_cache = {}
         
+        # Бюджет в токенах вместо обрезки по символам
+        self.budget = PromptAssembler(
+            int(self.config.get('max_prompt_tokens', 2700)),
+            get_token_counter(self.config.get('token_model', os.getenv('LLM_MODEL', 'gpt-4')))
+        )
+        
         self.logger.info("PromptComposerWithCursor initialized")
     
     def _load_config(self) -> Dict[str, Any]:
@@ -39,7 +51,7 @@ class PromptComposerWithCursor:
                     'base_prompts_dir': os.getenv('BASE_PROMPTS_DIR', './app/config/prompts'),
                     'daily_prompts_dir': os.getenv('DAILY_PROMPTS_DIR', './app/config/prompts'),
                     'cursor_marker': os.getenv('CURSOR_MARKER', '>> '),
-                    'max_prompt_length': int(os.getenv('MAX_PROMPT_LENGTH', '8000')),
+                    'max_prompt_tokens': int(os.getenv('MAX_PROMPT_TOKENS', '2700')),
                     'behavior_templates': {
                         'care': 'Будь заботливой и внимательной.',
                         'playful': 'Будь игривой и веселой.',
@@ -79,7 +91,7 @@ class PromptComposerWithCursor:
             system_text = base_prompt + "\n\n" + daily_prompt
             
             # 2. Добавляем краткосрочную память (buffer + summary)
-            memory_text = self._build_memory_section(short_memory)
+            summary_text, dialogue_text = self._build_memory_sections(short_memory)
             
             # 3. Добавляем поведение
             behavior_text = self._build_behavior_section(behavior_tag)
@@ -87,24 +99,28 @@ class PromptComposerWithCursor:
             # 4. Добавляем контекст пользователя
             user_context = self._build_user_context(user_id, short_memory)
             
-            # 5. Финальный промпт
-            prompt_parts = [
-                system_text,
-                behavior_text,
-                user_context,
-                memory_text,
-                "[ASSISTANT]:"
-            ]
-            
-            final_prompt = "\n\n".join(filter(None, prompt_parts))
-            
-            # Проверяем длину
-            max_length = self.config.get('max_prompt_length', 8000)
-            if len(final_prompt) > max_length:
-                final_prompt = self._truncate_prompt(final_prompt, max_length)
-                self.logger.warning(f"Prompt truncated to {max_length} characters")
+            # 5. Финальный промпт в пределах бюджета токенов: сначала режутся
+            # резюме, затем диалог (остаются последние реплики), затем контекст
+            # пользователя. Заголовки секций и маркер ответа не режутся
+            marker_tokens = self.budget.counter.count(ASSISTANT_MARKER) + \
+                self.budget.counter.count(self.budget.separator)
+            assembled = self.budget.assemble([
+                PromptSection('system', system_text, priority=3),
+                PromptSection('behavior', behavior_text, priority=3),
+                PromptSection('user_context', user_context, priority=2),
+                PromptSection('memory_summary', summary_text, priority=0, keep_tail=True,
+                              header=SUMMARY_HEADER),
+                PromptSection('dialogue', dialogue_text, priority=1, keep_tail=True,
+                              header=DIALOGUE_HEADER)
+            ], reserved_tokens=marker_tokens)
+            
+            if assembled.report['over_budget'] or any(
+                    section['trimmed'] for section in assembled.report['sections'].values()):
+                self.logger.warning(
+                    f"Prompt trimmed to {assembled.report['total_tokens']}/{self.budget.total_tokens} tokens"
+                )
             
-            return final_prompt
+            return assembled.separator.join(part for part in (assembled.text, ASSISTANT_MARKER) if part)
             
         except Exception as e:
             self.logger.error(f"Failed to build prompt: {e}")
@@ -156,34 +172,33 @@ class PromptComposerWithCursor:
             self.logger.error(f"Failed to load daily prompt {prompt_name}: {e}")
             return f"# Ошибка загрузки дневного промпта: {e}"
     
-    def _build_memory_section(self, short_memory: Dict[str, Any]) -> str:
-        """Строит секцию памяти с поддержкой курсора"""
+    def _build_memory_sections(self, short_memory: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Строит секции памяти с поддержкой курсора: (резюме, текущий диалог).
+        Заголовки секций добавляет сборщик промпта - при обрезке они остаются.
+        """
         try:
-            memory_parts = []
+            summary_lines = []
+            dialogue_lines = []
             cursor_marker = self.config.get('cursor_marker', '>> ')
             
             # Добавляем summary memory
-            summary_memory = short_memory.get('summary_memory', [])
-            if summary_memory:
-                memory_parts.append("[КРАТКОСРОЧНАЯ ПАМЯТЬ]")
-                for summary in summary_memory:
-                    summary_text = summary.get('summary_text', '')
-                    topics = summary.get('topics', [])
-                    emotions = summary.get('emotions', [])
-                    
-                    summary_line = f"SUMMARY: {summary_text}"
-                    if topics:
-                        summary_line += f" (темы: {', '.join(topics)})"
-                    if emotions:
-                        summary_line += f" [эмоции: {', '.join(emotions)}]"
-                    
-                    memory_parts.append(summary_line)
+            for summary in short_memory.get('summary_memory', []):
+                summary_text = summary.get('summary_text', '')
+                topics = summary.get('topics', [])
+                emotions = summary.get('emotions', [])
+                
+                summary_line = f"SUMMARY: {summary_text}"
+                if topics:
+                    summary_line += f" (темы: {', '.join(topics)})"
+                if emotions:
+                    summary_line += f" [эмоции: {', '.join(emotions)}]"
+                
+                summary_lines.append(summary_line)
             
             # Добавляем текущий буфер с курсором
             buffer = short_memory.get('buffer', [])
             if buffer:
-                memory_parts.append("\n[ТЕКУЩИЙ ДИАЛОГ]")
-                
                 config = short_memory.get('config', {})
                 cursor_position = config.get('cursor_position', -1)
                 
@@ -209,13 +224,13 @@ class PromptComposerWithCursor:
                     if tags:
                         msg_line += f" ({', '.join(tags)})"
                     
-                    memory_parts.append(msg_line)
+                    dialogue_lines.append(msg_line)
             
-            return "\n".join(memory_parts) if memory_parts else ""
+            return "\n".join(summary_lines), "\n".join(dialogue_lines)
             
         except Exception as e:
             self.logger.error(f"Failed to build memory section: {e}")
-            return f"# Ошибка создания секции памяти: {e}"
+            return f"# Ошибка создания секции памяти: {e}", ""
     
     def _build_behavior_section(self, behavior_tag: str) -> str:
         """Строит секцию поведения"""
@@ -264,52 +279,6 @@ class PromptComposerWithCursor:
             self.logger.error(f"Failed to build user context: {e}")
             return f"[КОНТЕКСТ] Ошибка: {e}"
     
-    def _truncate_prompt(self, prompt: str, max_length: int) -> str:
-        """Обрезает промпт до максимальной длины"""
-        if len(prompt) <= max_length:
-            return prompt
-        
-        # Сохраняем важные части
-        lines = prompt.split('\n')
-        
-        # Ищем секции
-        system_end = -1
-        memory_start = -1
-        
-        for i, line in enumerate(lines):
-            if '[КРАТКОСРОЧНАЯ ПАМЯТЬ]' in line or '[ТЕКУЩИЙ ДИАЛОГ]' in line:
-                memory_start = i
-                break
-            if '[СТРАТЕГИЯ ПОВЕДЕНИЯ]' in line:
-                system_end = i
-        
-        # Обрезаем память если нужно
-        if memory_start > 0:
-            system_part = '\n'.join(lines[:system_end + 1])
-            memory_part = '\n'.join(lines[memory_start:])
-            
-            available_length = max_length - len(system_part) - 100  # Резерв
-            
-            if len(memory_part) > available_length:
-                # Обрезаем память, оставляя последние сообщения
-                memory_lines = memory_part.split('\n')
-                truncated_memory = []
-                current_length = 0
-                
-                # Добавляем с конца
-                for line in reversed(memory_lines):
-                    if current_length + len(line) + 1 > available_length:
-                        break
-                    truncated_memory.insert(0, line)
-                    current_length += len(line) + 1
-                
-                memory_part = '\n'.join(truncated_memory)
-            
-            return system_part + '\n\n' + memory_part
-        
-        # Простое обрезание
-        return prompt[:max_length - 100] + "\n\n[АССИСТЕНТ ОБРЕЗАН]"
-    
     def clear_cache(self):
         """Очищает кеш промптов"""
         self._base_prompts_cache.clear()
@@ -322,5 +291,6 @@ class PromptComposerWithCursor:
             'base_prompts_cached': len(self._base_prompts_cache),
             'daily_prompts_cached': len(self._daily_prompts_cache),
             'config_loaded': bool(self.config),
+            'token_budget': self.budget.get_stats(),
             'available_behaviors': list(self.config.get('behavior_templates', {}).keys())
         }
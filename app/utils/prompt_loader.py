@@ -2,12 +2,130 @@
 Prompt Loader - загружает промпты для разных сценариев
 """
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from ..config.settings import settings
+from .lexicon_matcher import lexicon_service
+from .prompt_assets import prompt_assets
+from .prompt_template import CompiledPromptTemplate
+
+TOPIC_NAMESPACE = 'prompt_loader_topic'
+CONTEXT_NAMESPACE = 'prompt_loader_context'
+
+# Темы вопроса для выбора модуля биографии (балл - число разных найденных слов)
+TOPIC_KEYWORDS = {
+    'family': ['родители', 'родитель', 'мама', 'папа', 'семья', 'семьи'],
+    'childhood': ['детство', 'детстве', 'киев', 'киеве', 'школа', 'школе', 'шахматы'],
+    'education': ['учеба', 'учебе', 'университет', 'университете', 'образование', 'студент'],
+    'career': ['работа', 'работе', 'карьера', 'карьере', 'маркетинг', 'трейдинг', 'компания'],
+    'relocation': ['варшава', 'варшаве', 'переезд', 'переезде', 'польша', 'польше', '2018'],
+    'hobbies': ['хобби', 'увлечения', 'спорт', 'спорте', 'путешествия', 'кулинария'],
+    'dreams': ['мечты', 'мечте', 'планы', 'планах', 'цели', 'целях', 'будущее', 'будущем']
+}
+
+# Контексты сообщения для выбора стиля (порядок - приоритет, побеждает первый найденный)
+CONTEXT_KEYWORDS = {
+    'humor': ['смешн', 'шутк', 'юмор', 'ахаха', 'лол', '😄', '😆', '😂', 'смех'],
+    'childhood': ['детств', 'киев', 'родител', 'мама', 'папа', 'семья', 'дом', 'воспоминани'],
+    'career': ['работ', 'маркетинг', 'трейдинг', 'варшава', 'карьер', 'бизнес', 'професси', 'специальност'],
+    'personal': ['отношени', 'любов', 'парен', 'друг', 'личн'],
+    'dreams': ['мечт', 'будущ', 'план', 'цель', 'мечта'],
+    'hobbies': ['хобби', 'увлечени', 'интерес', 'спорт', 'книг']
+}
+
+lexicon_service.register(TOPIC_NAMESPACE, TOPIC_KEYWORDS)
+lexicon_service.register(CONTEXT_NAMESPACE, CONTEXT_KEYWORDS)
+
+# Файл стиля для каждого контекста
+CONTEXT_STYLE_FILES = {
+    'humor': '05_humor_rules..txt',  # Юмор
+    'childhood': '01_behavior_core.txt',  # Детство - базовое поведение
+    'career': '01_behavior_core.txt',  # Работа - базовое поведение (теперь исправлено)
+    'personal': '02_reactions_examples.txt',  # Личное - примеры реакций
+    'dreams': 'dialog_goal.txt',  # Мечты - цели диалога
+    'hobbies': '02_reactions_examples.txt',  # Хобби - примеры реакций
+    'general': '01_behavior_core.txt'  # Общий - базовое поведение
+}
+
+# Маппинг тем к секциям биографии
+TOPIC_BIOGRAPHY_SECTIONS = {
+    'family': [0, 1, 2, 3],  # Детство + родители
+    'childhood': [0, 1, 2, 3, 4, 5],  # Детство + семья + воспоминания
+    'education': [6, 7, 8],  # Учеба + университет
+    'career': [6, 8, 9, 14, 16, 24],  # Учеба + работа + карьера + текущая жизнь + цели
+    'relocation': [11, 12, 13],  # Варшава + переезд
+    'hobbies': [0, 20],  # Детство + хобби
+    'dreams': [22, 23, 24, 25],  # Мечты и планы
+    'general': [0, 16]  # Базовая информация + текущая жизнь
+}
+
+# Динамический промпт: все, кроме {user_question}, зависит только от (контекст, тема)
+DYNAMIC_PROMPT_TEMPLATE = CompiledPromptTemplate("""ТЫ - АГАТА КУЗЬМЕНКО
+
+СТИЛЬ ОБЩЕНИЯ ПО КОНТЕКСТУ ({context_title}):
+{style_prompt}
+
+БАЗОВЫЕ ПРАВИЛА:
+{base_style}
+
+ТВОЯ БИОГРАФИЯ (ОБЯЗАТЕЛЬНО ИСПОЛЬЗУЙ ЭТУ ИНФОРМАЦИЮ):
+{relevant_biography}
+
+КЛЮЧЕВЫЕ ФАКТЫ О СЕБЕ:
+- 27 лет, родилась 17 марта 1998 в Киеве
+- Мама: Ольга Викторовна, учительница литературы
+- Папа: Андрей Сергеевич, инженер на заводе
+- Образование: Киевский экономический университет, специальность "Менеджмент", затем переключилась на маркетинг
+- Карьера: Младший маркетолог → Руководитель отдела маркетинговых коммуникаций в Move Closer
+- Сейчас: Развиваю карьеру в маркетинге, занимаюсь трейдингом, планирую свое агентство
+- Живу в Варшаве с 2018 года
+
+ВАЖНО:
+- Отвечай в выбранном стиле: {context}
+- ИСПОЛЬЗУЙ ТОЛЬКО ИНФОРМАЦИЮ ИЗ БИОГРАФИИ ВЫШЕ
+- Ты МАРКЕТОЛОГ, а не программист или айтишник!
+- Отвечай КОНКРЕТНО на вопрос пользователя: {user_question}
+- Используй факты о маркетинге, работе, образовании
+- Будь прямой и по существу""")
+
+
+def _strip_header(content: str) -> List[str]:
+    """Строки файла стиля без заголовка вида === ОСНОВНОЕ ПОВЕДЕНИЕ ==="""
+    lines = content.split('\n')
+    if lines and lines[0].startswith('==='):
+        lines = lines[1:]
+    return lines
+
 
 class PromptLoader:
     """Загружает промпты для разных сценариев общения"""
 
+    PERSONA_FILES = (
+        "agata_bio_01_childhood.txt",
+        "agata_bio_02_study_and_first_job.txt",
+        "agata_bio_03_warsaw_and_present.txt",
+        "agata_bio_04_personality_and_character.txt",
+        "agata_bio_05_dreams_and_future.txt"
+    )
+
+    FULL_STYLE_FILES = (
+        "01_behavior_core.txt",
+        "02_reactions_examples.txt",
+        "03_dialogue_rules.txt",
+        "04_name_and_addressing.txt",
+        "05_humor_rules..txt",
+        "06_restrictions_1.txt",
+        "07_restrictions_2.txt",
+        "08_typos.txt",
+        "09_objections.txt",
+        "dialog_goal.txt"
+    )
+
+    # Самые важные файлы стиля для естественного общения
+    HUMAN_STYLE_FILES = (
+        "01_behavior_core.txt",  # Основное поведение - КЛЮЧЕВОЕ!
+        "02_reactions_examples.txt",  # Примеры реакций - НУЖНЫ!
+    )
+
     def __init__(self):
         self.prompts_dir = os.path.join(settings.BASE_DIR, "config", "prompts")
         self.base_prompt_path = os.path.join(self.prompts_dir, "base_prompt.txt")
@@ -15,17 +133,22 @@ class PromptLoader:
         self.persona_dir = os.path.join(settings.BASE_DIR, "agata_prompt_data", "persona")
         self.stages_dir = os.path.join(settings.BASE_DIR, "agata_prompt_data", "stages")
         self.style_dir = os.path.join(settings.BASE_DIR, "agata_prompt_data", "style")
+        self.full_style_dir = os.path.join(settings.BASE_DIR, "agata_prompt_data 2", "style")
 
-        
-        self._persona_cache = {}
-        self._stages_cache = {}
-        self._style_cache = {}
+        # Файлы читаются через общее хранилище: один раз, с hot-reload при изменении
+        self.assets = prompt_assets
+        self.assets.watch([self.prompts_dir, self.persona_dir, self.stages_dir,
+                           self.style_dir, self.full_style_dir])
+
+        # Файлы, из которых собирается динамический промпт, по контексту
+        self._dynamic_prompt_paths: Dict[str, List[str]] = {}
 
         # Полностью готовый базовый промпт (загружается один раз)
         self._base_prompt_cache = None
 
         # Загружаем все промпты при инициализации
         self._load_all_prompts()
+        self.precompute_dynamic_prompts()
         
     def _load_all_prompts(self):
         """Загрузить и закэшировать все промпты при инициализации"""
@@ -76,11 +199,10 @@ class PromptLoader:
             else:
                 prompt_file = "day_30.txt"
             
-            prompt_path = os.path.join(self.prompts_dir, prompt_file)
+            content = self.assets.read(os.path.join(self.prompts_dir, prompt_file))
             
-            if os.path.exists(prompt_path):
-                with open(prompt_path, 'r', encoding='utf-8') as f:
-                    return f.read().strip()
+            if content is not None:
+                return content
             else:
                 return self._get_default_day_prompt(day_number)
                 
@@ -133,93 +255,68 @@ class PromptLoader:
 
     def get_stage_prompt(self, stage_number: int) -> str:
         """Получить промпт для этапа общения из кэша"""
-        if stage_number not in self._stages_cache:
-            try:
-                stage_file = os.path.join(self.stages_dir, f"stage_{stage_number}.txt")
-                if os.path.exists(stage_file):
-                    with open(stage_file, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        self._stages_cache[stage_number] = content
-                        print(f"✅ Stage {stage_number} prompt loaded ({len(content)} chars)")
-                else:
-                    self._stages_cache[stage_number] = self._get_default_stage_prompt(stage_number)
-                    print(f"⚠️ Stage {stage_number} using default prompt")
-            except Exception as e:
-                print(f"Warning: Could not load stage {stage_number} prompt: {e}")
-                self._stages_cache[stage_number] = self._get_default_stage_prompt(stage_number)
-
-        return self._stages_cache[stage_number]
+        stage_file = os.path.join(self.stages_dir, f"stage_{stage_number}.txt")
+        return self.assets.derived(
+            ('stage', stage_number), [stage_file],
+            lambda: self._build_stage_prompt(stage_number, stage_file)
+        )
 
-    def _load_persona(self) -> str:
-        """Загрузить биографию Agata"""
+    def _build_stage_prompt(self, stage_number: int, stage_file: str) -> str:
         try:
-            persona_files = [
-                "agata_bio_01_childhood.txt",
-                "agata_bio_02_study_and_first_job.txt",
-                "agata_bio_03_warsaw_and_present.txt",
-                "agata_bio_04_personality_and_character.txt",
-                "agata_bio_05_dreams_and_future.txt"
-            ]
-
-            persona_parts = []
-            for filename in persona_files:
-                if filename not in self._persona_cache:
-                    filepath = os.path.join(self.persona_dir, filename)
-                    if os.path.exists(filepath):
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            self._persona_cache[filename] = f.read().strip()
-                    else:
-                        self._persona_cache[filename] = f"Файл {filename} не найден"
+            content = self.assets.read(stage_file)
+            if content is not None:
+                print(f"✅ Stage {stage_number} prompt loaded ({len(content)} chars)")
+                return content
+            print(f"⚠️ Stage {stage_number} using default prompt")
+        except Exception as e:
+            print(f"Warning: Could not load stage {stage_number} prompt: {e}")
+        return self._get_default_stage_prompt(stage_number)
 
-                persona_parts.append(self._persona_cache[filename])
+    def _persona_paths(self) -> List[str]:
+        return [os.path.join(self.persona_dir, filename) for filename in self.PERSONA_FILES]
 
-            return "\n\n".join(persona_parts)
+    def _load_persona(self) -> str:
+        """Загрузить биографию Agata"""
+        try:
+            return self.assets.derived('persona', self._persona_paths(), self._build_persona)
 
         except Exception as e:
             print(f"Warning: Could not load persona: {e}")
             return "Ты - Агата Кузьменко, 27 лет из Киева, сейчас живешь в Варшаве."
 
-    def _load_full_style(self) -> str:
-        """Загрузить ПОЛНЫЙ стиль общения из всех файлов"""
-        try:
-            # Используем правильный путь к полной папке стиля
-            full_style_dir = os.path.join(settings.BASE_DIR, "agata_prompt_data 2", "style")
-
-            style_files = [
-                "01_behavior_core.txt",
-                "02_reactions_examples.txt",
-                "03_dialogue_rules.txt",
-                "04_name_and_addressing.txt",
-                "05_humor_rules..txt",
-                "06_restrictions_1.txt",
-                "07_restrictions_2.txt",
-                "08_typos.txt",
-                "09_objections.txt",
-                "dialog_goal.txt"
-            ]
+    def _build_persona(self) -> str:
+        persona_parts = []
+        for filename, filepath in zip(self.PERSONA_FILES, self._persona_paths()):
+            content = self.assets.read(filepath)
+            persona_parts.append(content if content is not None else f"Файл {filename} не найден")
 
-            style_parts = []
-            for filename in style_files:
-                cache_key = f"full_{filename}"
-                if cache_key not in self._style_cache:
-                    filepath = os.path.join(full_style_dir, filename)
-                    if os.path.exists(filepath):
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            content = f.read().strip()
-                            self._style_cache[cache_key] = content
-                            print(f"✅ Загружен стиль: {filename} ({len(content)} символов)")
+        return "\n\n".join(persona_parts)
 
-                if cache_key in self._style_cache:
-                    style_parts.append(self._style_cache[cache_key])
+    def _full_style_path(self, filename: str) -> str:
+        return os.path.join(self.full_style_dir, filename)
 
-            full_style = "\n\n".join(style_parts)
-            print(f"🎨 ПОЛНЫЙ СТИЛЬ ЗАГРУЖЕН: {len(full_style)} символов")
-            return full_style
+    def _load_full_style(self) -> str:
+        """Загрузить ПОЛНЫЙ стиль общения из всех файлов"""
+        try:
+            paths = [self._full_style_path(filename) for filename in self.FULL_STYLE_FILES]
+            return self.assets.derived('full_style', paths, lambda: self._build_full_style(paths))
 
         except Exception as e:
             print(f"Warning: Could not load full style: {e}")
             return "Общайся естественно, живо и дружелюбно."
 
+    def _build_full_style(self, paths: List[str]) -> str:
+        style_parts = []
+        for filename, filepath in zip(self.FULL_STYLE_FILES, paths):
+            content = self.assets.read(filepath)
+            if content is not None:
+                style_parts.append(content)
+                print(f"✅ Загружен стиль: {filename} ({len(content)} символов)")
+
+        full_style = "\n\n".join(style_parts)
+        print(f"🎨 ПОЛНЫЙ СТИЛЬ ЗАГРУЖЕН: {len(full_style)} символов")
+        return full_style
+
     def _load_style_core(self) -> str:
         """Загрузить основные правила стиля общения (для обратной совместимости)"""
         try:
@@ -229,113 +326,52 @@ class PromptLoader:
                 "style_humor.txt",
                 "style_empathy.txt"
             ]
-
-            style_parts = []
-            for filename in style_files:
-                if filename not in self._style_cache:
-                    filepath = os.path.join(self.style_dir, filename)
-                    if os.path.exists(filepath):
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            content = f.read().strip()
-                            # Убираем заголовки типа === ОСНОВНОЕ ПОВЕДЕНИЕ ===
-                            lines = content.split('\n')
-                            if lines and lines[0].startswith('==='):
-                                lines = lines[1:]
-                            self._style_cache[filename] = '\n'.join(lines).strip()
-
-                if filename in self._style_cache:
-                    style_parts.append(self._style_cache[filename])
-
-            return "\n\n".join(style_parts)
+            paths = [os.path.join(self.style_dir, filename) for filename in style_files]
+            return self.assets.derived('style_core', paths, lambda: self._join_styles(paths))
 
         except Exception as e:
             print(f"Warning: Could not load style: {e}")
             return "Общайся естественно, живо и дружелюбно."
 
+    def _join_styles(self, paths: List[str], max_lines: Optional[int] = None) -> str:
+        """Склеивает файлы стиля без заголовков (max_lines - первые строки каждого)"""
+        style_parts = []
+        for filepath in paths:
+            content = self.assets.read(filepath)
+            if content is not None:
+                lines = _strip_header(content)
+                style_parts.append('\n'.join(lines[:max_lines]).strip())
+
+        return "\n\n".join(style_parts)
+
     def _analyze_question(self, question: str) -> str:
         """Анализировать вопрос и определить релевантную тему"""
-        question_lower = question.lower()
-
-        # Ключевые слова для каждой темы
-        topic_keywords = {
-            'family': ['родители', 'родитель', 'мама', 'папа', 'семья', 'семьи'],
-            'childhood': ['детство', 'детстве', 'киев', 'киеве', 'школа', 'школе', 'шахматы'],
-            'education': ['учеба', 'учебе', 'университет', 'университете', 'образование', 'студент'],
-            'career': ['работа', 'работе', 'карьера', 'карьере', 'маркетинг', 'трейдинг', 'компания'],
-            'relocation': ['варшава', 'варшаве', 'переезд', 'переезде', 'польша', 'польше', '2018'],
-            'hobbies': ['хобби', 'увлечения', 'спорт', 'спорте', 'путешествия', 'кулинария'],
-            'dreams': ['мечты', 'мечте', 'планы', 'планах', 'цели', 'целях', 'будущее', 'будущем']
-        }
-
-        # Подсчитываем совпадения для каждой темы
-        scores = {}
-        for topic, keywords in topic_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in question_lower)
-            if score > 0:
-                scores[topic] = score
+        # Балл темы - число разных ключевых слов темы, найденных в вопросе
+        matched = lexicon_service.matched_patterns(TOPIC_NAMESPACE, question)
 
         # Возвращаем тему с максимальным количеством совпадений
-        if scores:
-            return max(scores, key=scores.get)
+        if matched:
+            return max(matched, key=lambda topic: len(matched[topic]))
         return 'general'  # Если ничего не найдено
 
     def _analyze_message_context(self, message: str) -> str:
         """Анализировать сообщение и определить контекст для выбора стиля"""
-        message_lower = message.lower()
-
-        # Юмор и шутки
-        if any(word in message_lower for word in ['смешн', 'шутк', 'юмор', 'ахаха', 'лол', '😄', '😆', '😂', 'смех']):
-            return 'humor'
-
-        # Детство и семья
-        if any(word in message_lower for word in ['детств', 'киев', 'родител', 'мама', 'папа', 'семья', 'дом', 'воспоминани']):
-            return 'childhood'
-
-        # Работа и карьера
-        if any(word in message_lower for word in ['работ', 'маркетинг', 'трейдинг', 'варшава', 'карьер', 'бизнес', 'професси', 'специальност']):
-            return 'career'
-
-        # Личная жизнь и отношения
-        if any(word in message_lower for word in ['отношени', 'любов', 'парен', 'друг', 'личн']):
-            return 'personal'
-
-        # Будущее и мечты
-        if any(word in message_lower for word in ['мечт', 'будущ', 'план', 'цель', 'мечта']):
-            return 'dreams'
-
-        # Хобби и увлечения
-        if any(word in message_lower for word in ['хобби', 'увлечени', 'интерес', 'спорт', 'книг']):
-            return 'hobbies'
+        # Контексты возвращаются в порядке объявления - первый и есть приоритетный
+        hits = lexicon_service.match(CONTEXT_NAMESPACE, message)
 
         # По умолчанию - общий стиль
-        return 'general'
+        return next(iter(hits), 'general')
 
     def _get_style_prompt_by_context(self, context: str) -> str:
         """Получить промпт стиля по контексту сообщения"""
         try:
-            style_files = {
-                'humor': '05_humor_rules..txt',  # Юмор
-                'childhood': '01_behavior_core.txt',  # Детство - базовое поведение
-                'career': '01_behavior_core.txt',  # Работа - базовое поведение (теперь исправлено)
-                'personal': '02_reactions_examples.txt',  # Личное - примеры реакций
-                'dreams': 'dialog_goal.txt',  # Мечты - цели диалога
-                'hobbies': '02_reactions_examples.txt',  # Хобби - примеры реакций
-                'general': '01_behavior_core.txt'  # Общий - базовое поведение
-            }
-
-            filename = style_files.get(context, '01_behavior_core.txt')
-            filepath = os.path.join(settings.BASE_DIR, "agata_prompt_data 2", "style", filename)
-
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    # Убираем заголовки
-                    lines = content.split('\n')
-                    if lines and lines[0].startswith('==='):
-                        lines = lines[1:]
-                    style_content = '\n'.join(lines).strip()
-                    print(f"📝 Выбран стиль для контекста '{context}': {filename}")
-                    return style_content
+            filepath = self._context_style_path(context)
+            style_content = self.assets.derived(
+                'context_style', [filepath],
+                lambda: self._join_styles([filepath]) if self.assets.read(filepath) is not None else None
+            )
+            if style_content is not None:
+                return style_content
 
         except Exception as e:
             print(f"Warning: Could not load style for context {context}: {e}")
@@ -354,25 +390,14 @@ class PromptLoader:
     def _get_relevant_biography_module(self, topic: str) -> str:
         """Получить релевантный модуль биографии для темы"""
         try:
-            persona_content = self._load_persona()
-
-            # Разделяем биографию на секции
-            sections = persona_content.split('\n\n')
-
-            # Маппинг тем к секциям биографии
-            topic_mapping = {
-                'family': [0, 1, 2, 3],  # Детство + родители
-                'childhood': [0, 1, 2, 3, 4, 5],  # Детство + семья + воспоминания
-                'education': [6, 7, 8],  # Учеба + университет
-                'career': [6, 8, 9, 14, 16, 24],  # Учеба + работа + карьера + текущая жизнь + цели
-                'relocation': [11, 12, 13],  # Варшава + переезд
-                'hobbies': [0, 20],  # Детство + хобби
-                'dreams': [22, 23, 24, 25],  # Мечты и планы
-                'general': [0, 16]  # Базовая информация + текущая жизнь
-            }
+            # Секции биографии (разбиваются заново только после изменения файлов)
+            sections = self.assets.derived(
+                'persona_sections', self._persona_paths(),
+                lambda: tuple(self._load_persona().split('\n\n'))
+            )
 
             # Получаем индексы релевантных секций
-            relevant_indices = topic_mapping.get(topic, [0, 1, 5])
+            relevant_indices = TOPIC_BIOGRAPHY_SECTIONS.get(topic, [0, 1, 5])
 
             # Собираем релевантные секции
             relevant_sections = []
@@ -386,53 +411,58 @@ class PromptLoader:
             print(f"Warning: Could not get biography module: {e}")
             return "Я Агата Кузьменко, 27 лет, живу в Варшаве, работаю маркетологом."
 
+    def _context_style_path(self, context: str) -> str:
+        return self._full_style_path(CONTEXT_STYLE_FILES.get(context, '01_behavior_core.txt'))
+
+    def _human_style_paths(self) -> List[str]:
+        return [self._full_style_path(filename) for filename in self.HUMAN_STYLE_FILES]
+
+    def _get_dynamic_prompt_variant(self, context: str, topic: str) -> Tuple[str, CompiledPromptTemplate]:
+        """
+        Готовый промпт для пары (контекст, тема): текст до вопроса пользователя
+        и хвост со слотом {user_question}. Пересобирается только после
+        изменения файлов стиля или биографии.
+        """
+        paths = self._dynamic_prompt_paths.get(context)
+        if paths is None:
+            paths = self._dynamic_prompt_paths[context] = (
+                [self._context_style_path(context)] + self._human_style_paths() + self._persona_paths()
+            )
+        return self.assets.derived(
+            ('dynamic_prompt', context, topic), paths,
+            lambda: self._build_dynamic_prompt_variant(context, topic)
+        )
+
+    def _build_dynamic_prompt_variant(self, context: str, topic: str) -> Tuple[str, CompiledPromptTemplate]:
+        values = {
+            'context': context,
+            'context_title': context.upper(),
+            'style_prompt': self._get_style_prompt_by_context(context),
+            'base_style': self._get_full_human_style(),
+            'relevant_biography': self._get_relevant_biography_module(topic)
+        }
+        prefix, suffix = DYNAMIC_PROMPT_TEMPLATE.split(values)
+        return prefix.render(**values), suffix
+
+    def precompute_dynamic_prompts(self) -> int:
+        """Собрать промпты для всех пар (контекст, тема) заранее"""
+        variants = 0
+        for context in CONTEXT_STYLE_FILES:
+            for topic in TOPIC_BIOGRAPHY_SECTIONS:
+                self._get_dynamic_prompt_variant(context, topic)
+                variants += 1
+        return variants
+
     def create_dynamic_prompt(self, user_question: str) -> str:
         """Создать динамический промпт на основе КОНТЕКСТА сообщения"""
-        # Анализируем контекст сообщения и выбираем подходящий стиль
+        # Контекст сообщения выбирает стиль, тема вопроса - модуль биографии
         context = self._analyze_message_context(user_question)
-        print(f"🎯 Контекст сообщения: {context}")
-
-        # Получаем релевантный промпт стиля по контексту
-        style_prompt = self._get_style_prompt_by_context(context)
-
-        # Получаем релевантный модуль биографии (используем старую систему тем)
         topic = self._analyze_question(user_question)
-        relevant_biography = self._get_relevant_biography_module(topic)
-
-        # Получаем ПОЛНЫЙ базовый стиль общения
-        base_style = self._get_full_human_style()
+        print(f"🎯 Контекст сообщения: {context}, тема: {topic}")
 
-        # Создаем динамический промпт с выбранным стилем
-        dynamic_prompt = f"""ТЫ - АГАТА КУЗЬМЕНКО
-
-СТИЛЬ ОБЩЕНИЯ ПО КОНТЕКСТУ ({context.upper()}):
-{style_prompt}
-
-БАЗОВЫЕ ПРАВИЛА:
-{base_style}
-
-ТВОЯ БИОГРАФИЯ (ОБЯЗАТЕЛЬНО ИСПОЛЬЗУЙ ЭТУ ИНФОРМАЦИЮ):
-{relevant_biography}
-
-КЛЮЧЕВЫЕ ФАКТЫ О СЕБЕ:
-- 27 лет, родилась 17 марта 1998 в Киеве
-- Мама: Ольга Викторовна, учительница литературы
-- Папа: Андрей Сергеевич, инженер на заводе
-- Образование: Киевский экономический университет, специальность "Менеджмент", затем переключилась на маркетинг
-- Карьера: Младший маркетолог → Руководитель отдела маркетинговых коммуникаций в Move Closer
-- Сейчас: Развиваю карьеру в маркетинге, занимаюсь трейдингом, планирую свое агентство
-- Живу в Варшаве с 2018 года
-
-ВАЖНО:
-- Отвечай в выбранном стиле: {context}
-- ИСПОЛЬЗУЙ ТОЛЬКО ИНФОРМАЦИЮ ИЗ БИОГРАФИИ ВЫШЕ
-- Ты МАРКЕТОЛОГ, а не программист или айтишник!
-- Отвечай КОНКРЕТНО на вопрос пользователя: {user_question}
-- Используй факты о маркетинге, работе, образовании
-- Будь прямой и по существу
-"""
-
-        return dynamic_prompt.strip()
+        # Все, кроме самого вопроса, собрано заранее для этой пары
+        prefix, suffix = self._get_dynamic_prompt_variant(context, topic)
+        return prefix + suffix.render(user_question=user_question)
 
     def _get_core_communication_style(self) -> str:
         """Получить основные правила стиля общения (сокращенная версия)"""
@@ -444,21 +474,8 @@ class PromptLoader:
                 "04_name_and_addressing.txt" # Обращения
             ]
 
-            style_parts = []
-            for filename in essential_files:
-                filepath = os.path.join(settings.BASE_DIR, "agata_prompt_data 2", "style", filename)
-                if os.path.exists(filepath):
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        # Убираем заголовки
-                        lines = content.split('\n')
-                        if lines and lines[0].startswith('==='):
-                            lines = lines[1:]
-                        style_parts.append('\n'.join(lines).strip())
-
-            core_style = '\n\n'.join(style_parts)
-            print(f"📝 Загружен core стиль: {len(core_style)} символов")
-            return core_style
+            paths = [self._full_style_path(filename) for filename in essential_files]
+            return self.assets.derived('core_style', paths, lambda: self._build_core_style(paths))
 
         except Exception as e:
             print(f"Warning: Could not load core style: {e}")
@@ -471,28 +488,8 @@ class PromptLoader:
         """Получить ОПТИМИЗИРОВАННЫЙ ЧЕЛОВЕЧЕСКИЙ СТИЛЬ"""
         try:
             # Загружаем только самые важные файлы стиля для естественного общения
-            essential_files = [
-                "01_behavior_core.txt",  # Основное поведение - КЛЮЧЕВОЕ!
-                "02_reactions_examples.txt", # Примеры реакций - НУЖНЫ!
-            ]
-
-            style_parts = []
-            for filename in essential_files:
-                filepath = os.path.join(settings.BASE_DIR, "agata_prompt_data 2", "style", filename)
-                if os.path.exists(filepath):
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        # Убираем заголовки и сокращаем для компактности
-                        lines = content.split('\n')
-                        if lines and lines[0].startswith('==='):
-                            lines = lines[1:]
-                        # Берем только первые 10 строк из каждого файла для компактности
-                        compact_content = '\n'.join(lines[:10]).strip()
-                        style_parts.append(compact_content)
-
-            full_style = '\n\n'.join(style_parts)
-            print(f"🎨 ОПТИМИЗИРОВАННЫЙ СТИЛЬ ЗАГРУЖЕН: {len(full_style)} символов")
-            return full_style
+            paths = self._human_style_paths()
+            return self.assets.derived('human_style', paths, lambda: self._build_human_style(paths))
 
         except Exception as e:
             print(f"Warning: Could not load optimized style: {e}")
@@ -504,6 +501,17 @@ class PromptLoader:
 - Не будь формальной, говори просто
 - Ты МАРКЕТОЛОГ, а не программист"""
 
+    def _build_core_style(self, paths: List[str]) -> str:
+        core_style = self._join_styles(paths)
+        print(f"📝 Загружен core стиль: {len(core_style)} символов")
+        return core_style
+
+    def _build_human_style(self, paths: List[str]) -> str:
+        # Берем только первые 10 строк из каждого файла для компактности
+        full_style = self._join_styles(paths, max_lines=10)
+        print(f"🎨 ОПТИМИЗИРОВАННЫЙ СТИЛЬ ЗАГРУЖЕН: {len(full_style)} символов")
+        return full_style
+
     def _get_default_stage_prompt(self, stage_number: int) -> str:
         """Совместимый stage промпт"""
         if stage_number == 1:
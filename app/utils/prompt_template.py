@@ -0,0 +1,109 @@
+"""
+Скомпилированные шаблоны промптов
+
+Шаблон в формате f-string ({name}, {{ и }} - экранирование, как у
+ChatPromptTemplate) разбирается один раз на статичные куски и слоты;
+подстановка - один ''.join без повторного разбора. split() отделяет
+префикс, в котором только статичные слоты: его рендер кешируется и
+повторяется байт-в-байт между ходами, что нужно для кеша промптов
+на стороне провайдера.
+"""
+from collections import OrderedDict
+from string import Formatter
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+_formatter = Formatter()
+
+# Слот: имя, преобразование (!r/!s/!a) и спецификация формата
+_Slot = Tuple[str, Optional[str], str]
+
+
+class CompiledPromptTemplate:
+    """Шаблон, разобранный на статичные куски и слоты {name}"""
+
+    def __init__(self, template: str):
+        literals: List[str] = []
+        slots: List[_Slot] = []
+        pending = ''
+
+        for literal, field, spec, conversion in _formatter.parse(template):
+            pending += literal
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Unsupported prompt slot: {{{field}}}")
+            literals.append(pending)
+            slots.append((field, conversion, spec or ''))
+            pending = ''
+
+        self._init_parts(literals + [pending], slots)
+
+    @classmethod
+    def literal(cls, text: str) -> 'CompiledPromptTemplate':
+        """Шаблон без слотов (текст используется как есть, скобки не разбираются)"""
+        return cls._from_parts([text], [])
+
+    @classmethod
+    def _from_parts(cls, literals: Sequence[str], slots: Sequence[_Slot]) -> 'CompiledPromptTemplate':
+        template = cls.__new__(cls)
+        template._init_parts(list(literals), list(slots))
+        return template
+
+    def _init_parts(self, literals: List[str], slots: List[_Slot]) -> None:
+        self._literals = literals      # len(slots) + 1 статичных кусков
+        self._slots = slots
+        self.variables: Tuple[str, ...] = tuple(dict.fromkeys(name for name, _, _ in slots))
+
+    @property
+    def is_static(self) -> bool:
+        return not self._slots
+
+    def render(self, **values: Any) -> str:
+        """Подставляет значения слотов (все слоты обязательны)"""
+        literals = self._literals
+        parts = [literals[0]]
+        for index, (name, conversion, spec) in enumerate(self._slots, 1):
+            value = values[name]
+            if conversion or spec:
+                value = format(_formatter.convert_field(value, conversion), spec)
+            parts.append(value if isinstance(value, str) else str(value))
+            parts.append(literals[index])
+        return ''.join(parts)
+
+    def split(self, static_slots: Iterable[str]) -> Tuple['CompiledPromptTemplate', 'CompiledPromptTemplate']:
+        """
+        Делит шаблон на префикс до первого слота не из static_slots и остаток.
+        Префикс зависит только от статичных значений и может кешироваться.
+        """
+        static = set(static_slots)
+        boundary = next((index for index, (name, _, _) in enumerate(self._slots) if name not in static),
+                        len(self._slots))
+
+        # Статичный текст перед первым динамическим слотом остается в префиксе
+        prefix = self._from_parts(self._literals[:boundary + 1], self._slots[:boundary])
+        suffix = self._from_parts([''] + self._literals[boundary + 1:], self._slots[boundary:])
+        return prefix, suffix
+
+
+class PrefixCache:
+    """LRU отрендеренных префиксов по значениям их слотов"""
+
+    def __init__(self, template: CompiledPromptTemplate, max_size: int = 64):
+        self.template = template
+        self.max_size = max_size
+        self._rendered: 'OrderedDict[Tuple[Any, ...], str]' = OrderedDict()
+
+    def render(self, **values: Any) -> str:
+        """Тот же объект строки для тех же значений, пока он в кеше"""
+        key = tuple(values[name] for name in self.template.variables)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = self._rendered[key] = self.template.render(**values)
+            while len(self._rendered) > self.max_size:
+                self._rendered.popitem(last=False)
+        else:
+            self._rendered.move_to_end(key)
+        return rendered
+
+    def clear(self) -> None:
+        self._rendered.clear()
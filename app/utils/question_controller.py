@@ -6,19 +6,46 @@ import re
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from app.utils.conversation_state import ConversationStateStore, conversation_state
+from app.utils.lexicon_matcher import lexicon_service
+
 logger = logging.getLogger(__name__)
 
+LEXICON_NAMESPACE = 'question_controller'
+
+# Поля состояния пользователя в хранилище диалогов
+COUNTER_FIELD = 'question_count'
+TOPICS_FIELD = 'question_topics'
+TOPIC_HISTORY_LIMIT = 20
+
+# Словарь тем и ключевых слов (основы слов)
+TOPIC_KEYWORDS = {
+    'работа': ['работ', 'карьер', 'офис', 'коллег', 'проект', 'начальник', 'зарплат'],
+    'хобби': ['хобби', 'увлеч', 'свободн', 'досуг', 'интерес', 'любл'],
+    'семья': ['семь', 'родител', 'мама', 'папа', 'брат', 'сестр', 'жена', 'муж', 'дети'],
+    'путешествия': ['путешеств', 'поездк', 'отпуск', 'страна', 'город', 'море', 'горы'],
+    'спорт': ['спорт', 'тренировк', 'зал', 'бег', 'футбол', 'плаван', 'фитнес'],
+    'еда': ['еда', 'готов', 'ресторан', 'кухн', 'рецепт', 'вкусн'],
+    'здоровье': ['здоровь', 'врач', 'болен', 'лечен', 'самочувств'],
+    'планы': ['план', 'будущ', 'мечт', 'цел', 'хоч', 'собираюсь'],
+    'настроение': ['настроен', 'чувств', 'эмоци', 'радост', 'грустн', 'устал'],
+    'учеба': ['учеб', 'универ', 'курс', 'экзамен', 'знания', 'изуча']
+}
+lexicon_service.register(LEXICON_NAMESPACE, TOPIC_KEYWORDS)
+
 class QuestionController:
     """Контроллер частоты задаваемых вопросов"""
     
-    def __init__(self, max_frequency: int = 3):
+    def __init__(self, max_frequency: int = 3, state: Optional[ConversationStateStore] = None):
         """
         Args:
             max_frequency: Максимальная частота вопросов (каждое N-е сообщение)
+            state: Хранилище счетчиков и тем (по умолчанию общее для процесса)
         """
         self.max_frequency = max_frequency
-        self.user_counters = {}  # user_id -> question_count
-        self.user_history = {}   # user_id -> список последних тем
+        # Счетчик и последние темы пользователя - в хранилище диалогов:
+        # с Redis backend они переживают рестарт и общие для всех воркеров
+        self.state = state if state is not None else conversation_state
         
     def should_avoid_question(self, user_id: str) -> bool:
         """
@@ -30,10 +57,7 @@ class QuestionController:
         Returns:
             True если следует избегать вопросов
         """
-        if user_id not in self.user_counters:
-            self.user_counters[user_id] = 0
-            
-        current_count = self.user_counters[user_id]
+        current_count = self.state.counter(user_id, COUNTER_FIELD)
         
         # Избегаем вопросов, если недавно задавали (не каждое сообщение)
         should_avoid = (current_count % self.max_frequency) != (self.max_frequency - 1)
@@ -43,13 +67,11 @@ class QuestionController:
     
     def increment_counter(self, user_id: str):
         """Увеличивает счетчик сообщений для пользователя"""
-        if user_id not in self.user_counters:
-            self.user_counters[user_id] = 0
-        self.user_counters[user_id] += 1
+        self.state.incr(user_id, COUNTER_FIELD)
     
     def reset_counter(self, user_id: str):
         """Сбрасывает счетчик для пользователя (например, при новом цикле)"""
-        self.user_counters[user_id] = 0
+        self.state.set_counter(user_id, COUNTER_FIELD, 0)
         logger.info(f"Счетчик вопросов сброшен для {user_id}")
     
     def generate_contextual_question(self, user_id: str, conversation_context: str, user_message: str) -> Optional[str]:
@@ -68,10 +90,7 @@ class QuestionController:
         topics = self._extract_topics(conversation_context, user_message)
         
         # Получаем историю тем для этого пользователя
-        if user_id not in self.user_history:
-            self.user_history[user_id] = []
-        
-        user_topics = self.user_history[user_id]
+        user_topics = self.state.recent(user_id, TOPICS_FIELD)
         
         # Выбираем тему, которую еще не обсуждали
         new_topics = [topic for topic in topics if topic not in user_topics[-5:]]  # Последние 5 тем
@@ -85,45 +104,20 @@ class QuestionController:
         # Генерируем вопрос по теме
         question = self._generate_question_for_topic(topic, user_message)
         
-        # Сохраняем тему в историю
-        if topic not in user_topics:
-            user_topics.append(topic)
-            # Ограничиваем историю
-            if len(user_topics) > 20:
-                user_topics = user_topics[-20:]
-            self.user_history[user_id] = user_topics
+        # Сохраняем тему в историю (без повторов, ограниченную)
+        self.state.push(user_id, TOPICS_FIELD, topic, TOPIC_HISTORY_LIMIT, unique=True)
         
         return question
     
     def _extract_topics(self, context: str, user_message: str) -> List[str]:
         """Извлекает темы из контекста разговора"""
-        topics = []
-        
-        # Объединяем контекст и сообщение
-        full_text = f"{context} {user_message}".lower()
-        
-        # Словарь тем и ключевых слов
-        topic_keywords = {
-            'работа': ['работ', 'карьер', 'офис', 'коллег', 'проект', 'начальник', 'зарплат'],
-            'хобби': ['хобби', 'увлеч', 'свободн', 'досуг', 'интерес', 'любл'],
-            'семья': ['семь', 'родител', 'мама', 'папа', 'брат', 'сестр', 'жена', 'муж', 'дети'],
-            'путешествия': ['путешеств', 'поездк', 'отпуск', 'страна', 'город', 'море', 'горы'],
-            'спорт': ['спорт', 'тренировк', 'зал', 'бег', 'футбол', 'плаван', 'фитнес'],
-            'еда': ['еда', 'готов', 'ресторан', 'кухн', 'рецепт', 'вкусн'],
-            'здоровье': ['здоровь', 'врач', 'болен', 'лечен', 'самочувств'],
-            'планы': ['план', 'будущ', 'мечт', 'цел', 'хоч', 'собираюсь'],
-            'настроение': ['настроен', 'чувств', 'эмоци', 'радост', 'грустн', 'устал'],
-            'учеба': ['учеб', 'универ', 'курс', 'экзамен', 'знания', 'изуча']
-        }
-        
-        # Ищем совпадения
-        for topic, keywords in topic_keywords.items():
-            for keyword in keywords:
-                if keyword in full_text:
-                    topics.append(topic)
-                    break
+        # Контекст и сообщение просматриваем по отдельности: сообщение
+        # обычно уже разобрано другими модулями и берется из кеша сервиса
+        hits = lexicon_service.match(LEXICON_NAMESPACE, user_message)
+        if context:
+            hits = {**lexicon_service.match(LEXICON_NAMESPACE, context), **hits}
         
-        return list(set(topics))  # Убираем дубликаты
+        return [topic for topic in TOPIC_KEYWORDS if topic in hits]
     
     def _generate_question_for_topic(self, topic: str, user_message: str) -> str:
         """Генерирует вопрос для конкретной темы"""
@@ -207,10 +201,11 @@ class QuestionController:
     
     def get_question_stats(self, user_id: str) -> Dict:
         """Возвращает статистику вопросов для пользователя"""
+        user_topics = self.state.recent(user_id, TOPICS_FIELD)
         return {
-            'question_count': self.user_counters.get(user_id, 0),
-            'topics_discussed': len(self.user_history.get(user_id, [])),
-            'recent_topics': self.user_history.get(user_id, [])[-5:]
+            'question_count': self.state.counter(user_id, COUNTER_FIELD),
+            'topics_discussed': len(user_topics),
+            'recent_topics': user_topics[-5:]
         }
 
 # Глобальный экземпляр контроллера
@@ -1,6 +1,9 @@
 from celery import Celery
+from celery.signals import before_task_publish, worker_process_init
+from kombu import Exchange, Queue
 import os
 import sys
+import time
 
 # Add the parent directory to the path - ИСПРАВЛЕНО
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
@@ -15,6 +18,28 @@ celery_app = Celery(
     include=['app.workers.tasks']
 )
 
+# Классы приоритета: у каждого свои очереди и свой пул воркеров
+# (см. docker-compose.yml). Интерактивные ходы диалога никогда не стоят
+# в одной очереди с фоновыми задачами. Приоритет сообщения - в соглашении
+# брокера Redis: 0 - самый высокий, 9 - самый низкий.
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_NEAR_REALTIME = 'near_realtime'
+PRIORITY_BATCH = 'batch'
+
+PRIORITY_CLASSES = {
+    PRIORITY_INTERACTIVE: {'queues': ['llm'], 'priority': 0},
+    PRIORITY_NEAR_REALTIME: {'queues': ['asr', 'vision'], 'priority': 3},
+    PRIORITY_BATCH: {'queues': ['summary', 'maintenance'], 'priority': 9},
+}
+
+QUEUE_PRIORITY_CLASS = {
+    queue: priority_class
+    for priority_class, spec in PRIORITY_CLASSES.items()
+    for queue in spec['queues']
+}
+
+_default_exchange = Exchange('agatha', type='direct')
+
 # Configure Celery
 celery_app.conf.update(
     task_serializer='json',
@@ -27,15 +52,103 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    task_queues=[
+        Queue(queue, _default_exchange, routing_key=queue)
+        for queue in QUEUE_PRIORITY_CLASS
+    ],
+    task_default_queue='llm',
+    task_default_exchange='agatha',
+    task_default_routing_key='llm',
+    task_default_priority=PRIORITY_CLASSES[PRIORITY_INTERACTIVE]['priority'],
+    # Redis: очереди воркера опрашиваются строго в порядке -Q, поэтому
+    # общий dev-воркер (-Q llm,asr,vision,summary,maintenance) сначала
+    # выбирает интерактивные задачи; priority_steps - приоритеты внутри
+    # очереди (0 первым). x-max-priority не задаем: это аргумент RabbitMQ
+    broker_transport_options={
+        'queue_order_strategy': 'priority',
+        'priority_steps': list(range(10)),
+        'sep': ':',
+    },
 )
 
 # Task routing
 celery_app.conf.task_routes = {
-    'app.workers.tasks.process_llm_request': {'queue': 'llm'},
-    'app.workers.tasks.process_asr_request': {'queue': 'asr'},
-    'app.workers.tasks.process_vision_request': {'queue': 'vision'},
-    'app.workers.tasks.generate_summary': {'queue': 'summary'},
+    'app.workers.tasks.process_llm_request': {
+        'queue': 'llm', 'priority': PRIORITY_CLASSES[PRIORITY_INTERACTIVE]['priority']},
+    'app.workers.tasks.process_asr_request': {
+        'queue': 'asr', 'priority': PRIORITY_CLASSES[PRIORITY_NEAR_REALTIME]['priority']},
+    'app.workers.tasks.process_vision_request': {
+        'queue': 'vision', 'priority': PRIORITY_CLASSES[PRIORITY_NEAR_REALTIME]['priority']},
+    'app.workers.tasks.generate_summary': {
+        'queue': 'summary', 'priority': PRIORITY_CLASSES[PRIORITY_BATCH]['priority']},
+    'app.workers.tasks.import_memory_history': {
+        'queue': 'maintenance', 'priority': PRIORITY_CLASSES[PRIORITY_BATCH]['priority']},
+    'app.workers.tasks.cleanup_old_sessions': {
+        'queue': 'maintenance', 'priority': PRIORITY_CLASSES[PRIORITY_BATCH]['priority']},
 }
 
+
+@before_task_publish.connect
+def _stamp_enqueued_at(headers=None, **kwargs):
+    """Проставляет время первой постановки в очередь (ретраи его сохраняют)"""
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@worker_process_init.connect
+def _warm_up_config(**kwargs):
+    """Прогрев кеша конфигурации в каждом процессе воркера до первых задач"""
+    try:
+        from app.config.production_config_manager import warm_up_config_cache
+        warm_up_config_cache()
+    except ImportError:
+        pass
+
+
+_depth_cache = {}
+
+
+def get_queue_depth(queue_name: str, max_age_seconds: float = 1.0) -> int:
+    """Число задач в очереди брокера (кешируется на max_age_seconds)"""
+    cached = _depth_cache.get(queue_name)
+    now = time.monotonic()
+    if cached and now - cached[1] < max_age_seconds:
+        return cached[0]
+
+    try:
+        with celery_app.connection_for_read() as conn:
+            depth = conn.default_channel.queue_declare(queue=queue_name, passive=True).message_count
+    except Exception:
+        # Очередь еще не создана или брокер недоступен - считаем пустой
+        depth = 0
+
+    _depth_cache[queue_name] = (depth, now)
+    return depth
+
+
+def get_priority_backlog(priority_class: str) -> int:
+    """Суммарная длина очередей класса приоритета"""
+    return sum(get_queue_depth(queue) for queue in PRIORITY_CLASSES[priority_class]['queues'])
+
+
+def batch_defer_countdown(enqueued_at) -> int:
+    """
+    Решает, должна ли batch-задача уступить место интерактивным.
+
+    Возвращает задержку в секундах (0 - выполнять сейчас). Задача уступает,
+    пока интерактивная очередь не пуста, но не дольше BATCH_MAX_WAIT_SECONDS
+    с момента постановки - после этого выполняется в любом случае.
+    """
+    if enqueued_at is not None:
+        waited = time.time() - float(enqueued_at)
+        if waited >= settings.BATCH_MAX_WAIT_SECONDS:
+            return 0
+
+    if get_priority_backlog(PRIORITY_INTERACTIVE) > settings.BATCH_INTERACTIVE_BACKLOG_THRESHOLD:
+        return settings.BATCH_DEFER_SECONDS
+
+    return 0
+
+
 if __name__ == '__main__':
-    celery_app.start() 
\ No newline at end of file
+    celery_app.start()
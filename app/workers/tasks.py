@@ -3,11 +3,22 @@ from typing import Dict, List, Any
 from datetime import datetime
 import logging
 
-from .celery_app import celery_app
+from .celery_app import celery_app, batch_defer_countdown
 from ..graph.pipeline import AgathaPipeline
 
 logger = logging.getLogger(__name__)
 
+
+def _defer_if_interactive_busy(task):
+    """Откладывает batch-задачу, пока интерактивная очередь занята"""
+    enqueued_at = getattr(task.request, 'enqueued_at', None)
+    countdown = batch_defer_countdown(enqueued_at)
+    if countdown:
+        logger.info(f"Deferring {task.name} for {countdown}s: interactive lane is busy")
+        # Сохраняем исходное время постановки, чтобы ожидание было ограничено
+        raise task.retry(countdown=countdown, max_retries=None,
+                         headers={'enqueued_at': enqueued_at})
+
 @celery_app.task(bind=True)
 def process_llm_request(self, user_id: str, messages: List[Dict], meta_time: str = None):
     """Process LLM request through Agatha pipeline"""
@@ -84,6 +95,8 @@ def process_vision_request(self, image_data: str, user_id: str):
 @celery_app.task(bind=True)
 def generate_summary(self, user_id: str, messages: List[Dict]):
     """Generate conversation summary"""
+    _defer_if_interactive_busy(self)
+    
     try:
         from ..memory.buffer_memory import BufferMemory
         from ..memory.base import Message
@@ -118,9 +131,65 @@ def generate_summary(self, user_id: str, messages: List[Dict]):
             'failed_at': datetime.utcnow().isoformat()
         }
 
-@celery_app.task
-def cleanup_old_sessions():
+@celery_app.task(bind=True)
+def import_memory_history(self, user_id: str, messages: List[Dict], day_number: int = 1):
+    """Import conversation history into vector memory with a single bulk COPY"""
+    _defer_if_interactive_busy(self)
+    
+    from ..memory.vector_memory import VectorMemory, MemoryWriteError
+    from ..memory.base import Message, MemoryContext
+    
+    try:
+        message_objects = [
+            Message(
+                role=msg['role'],
+                content=msg['content'],
+                timestamp=datetime.fromisoformat(msg.get('timestamp', datetime.utcnow().isoformat())),
+                metadata=msg.get('metadata')
+            )
+            for msg in messages
+        ]
+        
+        # Готовые эмбеддинги (если импорт их содержит) не запрашиваем повторно
+        embeddings = None
+        if messages and all(msg.get('embedding') for msg in messages):
+            embeddings = [msg['embedding'] for msg in messages]
+        
+        memory = VectorMemory(user_id)
+        context = MemoryContext(user_id=user_id, day_number=day_number)
+        imported = memory.add_messages(message_objects, context, embeddings=embeddings)
+        
+        logger.info(f"Imported {imported}/{len(messages)} messages into vector memory for user {user_id}")
+        return {
+            'status': 'success',
+            'imported': imported,
+            'message_count': len(messages),
+            'completed_at': datetime.utcnow().isoformat()
+        }
+        
+    except MemoryWriteError as e:
+        # Пачка не записана (БД недоступна, пул занят, COPY не удался) - повторяем целиком
+        logger.warning(f"Memory history import for user {user_id} not written, retrying: {e}")
+        self.retry(exc=e, countdown=60, max_retries=3)
+        return {
+            'status': 'error',
+            'error': str(e),
+            'failed_at': datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Memory history import failed for user {user_id}: {e}")
+        return {
+            'status': 'error',
+            'error': str(e),
+            'failed_at': datetime.utcnow().isoformat()
+        }
+
+@celery_app.task(bind=True)
+def cleanup_old_sessions(self):
     """Cleanup old user sessions and temporary data"""
+    _defer_if_interactive_busy(self)
+    
     try:
         # TODO: Implement cleanup logic
         logger.info("Cleanup task completed")
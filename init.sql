@@ -158,10 +158,11 @@ CREATE INDEX IF NOT EXISTS idx_vector_memories_timestamp ON vector_memories(time
 CREATE INDEX IF NOT EXISTS idx_vector_memories_importance ON vector_memories(importance_score);
 
 -- Vector index for semantic search using cosine similarity
-CREATE INDEX IF NOT EXISTS idx_vector_memories_embedding 
-ON vector_memories 
-USING ivfflat (embedding vector_cosine_ops) 
-WITH (lists = 100);
+-- (existing databases: app/database/migrations/005_vector_memories_hnsw.sql)
+CREATE INDEX IF NOT EXISTS idx_vector_memories_embedding_hnsw
+ON vector_memories
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- Functions for automatic updates
 CREATE OR REPLACE FUNCTION update_updated_at_column()
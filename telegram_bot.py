@@ -4,10 +4,18 @@ import os
 import sys
 import logging
 import asyncio
+import json
 import requests
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    print("⚠️ aiohttp не установлен. Установите: pip install aiohttp")
+
 # Добавляем путь к проекту
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, PROJECT_ROOT)
@@ -15,6 +23,7 @@ sys.path.insert(0, PROJECT_ROOT)
 # Telegram Bot API
 try:
     from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+    from telegram.constants import ChatAction
     from telegram.ext import (
         Application, CommandHandler, MessageHandler, 
         CallbackQueryHandler, filters, ContextTypes
@@ -37,6 +46,82 @@ API_HOST = os.getenv("API_HOST", "localhost")
 API_PORT = os.getenv("API_PORT", "8000")
 API_BASE_URL = f"http://{API_HOST}:{API_PORT}"
 BOT_NAME = os.getenv("BOT_NAME", "Agatha Memory Bot")
+BOT_INGESTION_MODE = os.getenv("BOT_INGESTION_MODE", "polling")  # polling | webhook
+
+# Пул HTTP соединений к API (общий для всех пользователей бота)
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "32"))
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+API_KEEPALIVE_SECONDS = float(os.getenv("API_KEEPALIVE_SECONDS", "30"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+
+
+class ApiResponse:
+    """Ответ API с интерфейсом, совместимым с requests.Response"""
+    
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+    
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class AgathaApiClient:
+    """
+    Асинхронный HTTP клиент к Agatha API с пулом keep-alive соединений.
+    
+    Один экземпляр на бота: сессия создается лениво в event loop бота,
+    число одновременных запросов ограничено семафором.
+    """
+    
+    def __init__(self, base_url: str, pool_size: int = API_POOL_SIZE,
+                 max_concurrency: int = API_MAX_CONCURRENCY):
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp не установлен")
+        
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=API_KEEPALIVE_SECONDS
+            )
+            self._session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(connect=API_CONNECT_TIMEOUT)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+    
+    async def request(self, method: str, path: str, json_data: Optional[Dict[str, Any]] = None,
+                      timeout: float = 10) -> ApiResponse:
+        """Выполняет запрос к API; бросает aiohttp.ClientError / asyncio.TimeoutError"""
+        session = self._get_session()
+        async with self._semaphore:
+            async with session.request(
+                method, path, json=json_data,
+                timeout=aiohttp.ClientTimeout(total=timeout, connect=API_CONNECT_TIMEOUT)
+            ) as response:
+                return ApiResponse(response.status, await response.text())
+    
+    async def post(self, path: str, json_data: Optional[Dict[str, Any]] = None,
+                   timeout: float = 10) -> ApiResponse:
+        return await self.request('POST', path, json_data=json_data, timeout=timeout)
+    
+    async def get(self, path: str, timeout: float = 10) -> ApiResponse:
+        return await self.request('GET', path, timeout=timeout)
+    
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
 
 class AgathaMemoryBot:
     """
@@ -50,8 +135,24 @@ class AgathaMemoryBot:
         if not TELEGRAM_AVAILABLE:
             raise ImportError("python-telegram-bot не установлен")
         
-        # Создаем bot application
-        self.application = Application.builder().token(TELEGRAM_TOKEN).build()
+        # Общий асинхронный клиент API
+        self.api = AgathaApiClient(self.api_base_url)
+        
+        # Части ответа уходят с паузами по таймерам event loop (см. app/bots/delivery.py)
+        from app.bots.delivery import ReplyDeliveryScheduler
+        self.delivery = ReplyDeliveryScheduler()
+        
+        # Создаем bot application; апдейты разных пользователей обрабатываются
+        # параллельно (медленный ответ LLM не блокирует остальных), а апдейты
+        # одного чата - по очереди, в порядке поступления
+        from app.bots.update_ordering import PerChatUpdateProcessor
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .concurrent_updates(PerChatUpdateProcessor(API_MAX_CONCURRENCY))
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         
         # Регистрируем handlers
         self._setup_handlers()
@@ -201,9 +302,9 @@ class AgathaMemoryBot:
                 'day_number': 1
             }
             
-            response = requests.post(
-                f"{self.api_base_url}/api/memory/{user_id}/add",
-                json=memory_data,
+            response = await self.api.post(
+                f"/api/memory/{user_id}/add",
+                json_data=memory_data,
                 timeout=10
             )
             
@@ -264,9 +365,9 @@ class AgathaMemoryBot:
                 'levels': ['short_term', 'long_term']
             }
             
-            response = requests.post(
-                f"{self.api_base_url}/api/memory/{user_id}/search",
-                json=search_data,
+            response = await self.api.post(
+                f"/api/memory/{user_id}/search",
+                json_data=search_data,
                 timeout=10
             )
             
@@ -325,8 +426,8 @@ class AgathaMemoryBot:
         user_id = str(update.effective_user.id)
         
         try:
-            response = requests.get(
-                f"{self.api_base_url}/api/memory/{user_id}/overview",
+            response = await self.api.get(
+                f"/api/memory/{user_id}/overview",
                 timeout=10
             )
             
@@ -370,8 +471,8 @@ class AgathaMemoryBot:
         user_id = str(update.effective_user.id)
         
         try:
-            response = requests.post(
-                f"{self.api_base_url}/api/memory/{user_id}/clear",
+            response = await self.api.post(
+                f"/api/memory/{user_id}/clear",
                 timeout=10
             )
             
@@ -457,9 +558,9 @@ class AgathaMemoryBot:
                     'day_number': 1
                 }
                 
-                response = requests.post(
-                    f"{self.api_base_url}/api/memory/{user_id}/add",
-                    json=memory_data,
+                response = await self.api.post(
+                    f"/api/memory/{user_id}/add",
+                    json_data=memory_data,
                     timeout=10
                 )
                 
@@ -483,9 +584,9 @@ class AgathaMemoryBot:
                 'levels': ['short_term', 'long_term']
             }
             
-            response = requests.post(
-                f"{self.api_base_url}/api/memory/{user_id}/search",
-                json=search_data,
+            response = await self.api.post(
+                f"/api/memory/{user_id}/search",
+                json_data=search_data,
                 timeout=10
             )
             
@@ -503,8 +604,8 @@ class AgathaMemoryBot:
                 await message.edit_text(test_text, parse_mode='Markdown')
                 
                 # Получаем обзор
-                response = requests.get(
-                    f"{self.api_base_url}/api/memory/{user_id}/overview",
+                response = await self.api.get(
+                    f"/api/memory/{user_id}/overview",
                     timeout=10
                 )
                 
@@ -554,39 +655,61 @@ class AgathaMemoryBot:
     async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик обычных сообщений - добавляет в память"""
         user_id = str(update.effective_user.id)
+        chat_id = update.effective_chat.id
         content = update.message.text
         
         # Пропускаем команды
         if content.startswith('/'):
             return
         
-        # Добавляем в память
+        # Пользователь написал снова - оставшиеся части прошлого ответа не отправляем
+        self.delivery.cancel(chat_id)
+        
+        # Один запрос: сохранение в память и ответ нейросети
         try:
-            memory_data = {
-                'role': 'user',
+            turn_data = {
+                'user_id': user_id,
                 'content': content,
                 'metadata': {
                     'source': 'telegram',
                     'user_id': user_id,
                     'timestamp': datetime.now().isoformat(),
-                    'auto_added': True
+                    'auto_added': True,
+                    'conversation_id': f'tg_{user_id}_{int(datetime.now().timestamp())}',
+                    'day_number': 1
                 },
-                'conversation_id': f'tg_{user_id}_{int(datetime.now().timestamp())}',
-                'day_number': 1
+                'metaTime': "2025-09-02T14:07:00Z"
             }
             
-            response = requests.post(
-                f"{self.api_base_url}/api/memory/{user_id}/add",
-                json=memory_data,
-                timeout=10
+            logger.info(f"🔄 Отправляем запрос к turn API для пользователя {user_id}")
+            
+            response = await self.api.post(
+                "/api/turn",
+                json_data=turn_data,
+                timeout=30  # Увеличиваем timeout для стабильности
             )
             
+            logger.info(f"📡 Turn API ответил: {response.status_code}")
+            
             if response.status_code == 200:
                 result = response.json()
-                memory_result = result.get('result', {})
+                memory_result = result.get('memory', {})
+                # API возвращает parts (массив частей ответа)
+                parts = result.get('parts', [])
+                logger.info(f"🧠 Получены части ответа: {len(parts) if parts else 0}")
                 
-                # Отправляем подтверждение
-                confirm_text = f"""
+                if parts:
+                    logger.info(f"✅ Отправляем ответ от AI: {parts[0][:50]}...")
+                    # Отправляем только ответ от нейросети, частями с паузами
+                    self.delivery.schedule(
+                        chat_id, parts, result.get('delays_ms'),
+                        send=update.message.reply_text,
+                        send_typing=lambda: context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+                    )
+                else:
+                    logger.warning("⚠️ Нет частей в ответе от API")
+                    # Если нет частей, показываем подтверждение
+                    confirm_text = f"""
 ✅ **Сообщение добавлено в память!**
 
 💾 **Статус:**
@@ -597,51 +720,7 @@ class AgathaMemoryBot:
 • `/search <запрос>` - поиск
 • `/overview` - обзор
 • `/help` - справка
-                """.strip()
-                
-                # Получаем ответ от нейросети через /api/chat
-                try:
-                    chat_data = {
-                        'user_id': user_id,
-                        'messages': [{'role': 'user', 'content': content}],
-                        'metaTime': "2025-09-02T14:07:00Z"
-                    }
-                    
-                    logger.info(f"🔄 Отправляем запрос к chat API для пользователя {user_id}")
-                    
-                    chat_response = requests.post(
-                        f"{self.api_base_url}/api/chat",
-                        json=chat_data,
-                        timeout=30  # Увеличиваем timeout для стабильности
-                    )
-                    
-                    logger.info(f"📡 Chat API ответил: {chat_response.status_code}")
-                    
-                    if chat_response.status_code == 200:
-                        chat_result = chat_response.json()
-                        # API возвращает parts (массив частей ответа)
-                        parts = chat_result.get('parts', [])
-                        logger.info(f"🧠 Получены части ответа: {len(parts) if parts else 0}")
-                        
-                        if parts:
-                            ai_response = ' '.join(parts)
-                            logger.info(f"✅ Отправляем ответ от AI: {ai_response[:50]}...")
-                            # Отправляем только ответ от нейросети
-                            await update.message.reply_text(ai_response)
-                            return  # Важно! Выходим, чтобы не показывать подтверждение
-                        else:
-                            logger.warning("⚠️ Нет частей в ответе от API")
-                            # Если нет частей, показываем подтверждение
-                            await update.message.reply_text(confirm_text, parse_mode='Markdown')
-                        
-                    else:
-                        logger.warning(f"❌ Chat API вернул ошибку: {chat_response.status_code} - {chat_response.text}")
-                        # Если LLM не работает, показываем подтверждение
-                        await update.message.reply_text(confirm_text, parse_mode='Markdown')
-                        
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"❌ Ошибка подключения к chat API: {e}")
-                    # Если LLM не работает, показываем подтверждение  
+                    """.strip()
                     await update.message.reply_text(confirm_text, parse_mode='Markdown')
                 
                 # Обновляем статистику сессии
@@ -650,8 +729,9 @@ class AgathaMemoryBot:
                     self.user_sessions[user_id]['last_activity'] = datetime.now()
                 
             else:
+                logger.warning(f"❌ Turn API вернул ошибку: {response.status_code} - {response.text}")
                 await update.message.reply_text(
-                    f"❌ **Ошибка добавления в память:** {response.status_code}"
+                    f"❌ **Ошибка обработки сообщения:** {response.status_code}"
                 )
                 
         except Exception as e:
@@ -718,6 +798,10 @@ class AgathaMemoryBot:
                 "• Получение обзора"
             )
     
+    async def _post_shutdown(self, application):
+        """Закрывает пул HTTP соединений при остановке бота"""
+        await self.api.close()
+    
     def run(self):
         """Запускает бота"""
         logger.info(f"🚀 Запуск {BOT_NAME}...")
@@ -734,6 +818,12 @@ class AgathaMemoryBot:
             logger.error(f"❌ API сервер недоступен: {e}")
             logger.warning("⚠️ Убедитесь, что API сервер запущен на http://localhost:8000")
         
+        if BOT_INGESTION_MODE == "webhook":
+            # Webhook: ingress + воркеры по партициям chat_id (см. app/bots/webhook.py)
+            from app.bots.webhook import WebhookConfig, run_webhook
+            asyncio.run(run_webhook(self.application, WebhookConfig.from_settings({})))
+            return
+        
         # Запускаем бота
         self.application.run_polling(
             allowed_updates=Update.ALL_TYPES,
@@ -0,0 +1,119 @@
+
+import random
+from pathlib import Path
+
+import pytest
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.behavioral_analyzer import BehavioralAnalyzer
+
+
+def _turn(content, turn_id=None):
+    message = {'role': 'user', 'content': content}
+    if turn_id is not None:
+        message['turn_id'] = turn_id
+    return message
+
+
+class TestIncrementalAnalysis:
+    """Тесты инкрементального анализа BehavioralAnalyzer"""
+    
+    def test_single_turn_appends_to_state(self):
+        """Тест: передан только текущий ход - состояние дописывается, а не пересобирается"""
+        analyzer = BehavioralAnalyzer()
+        
+        analyzer.analyze_user_behavior([_turn('Привет')], user_id='u1')
+        state = analyzer._user_states['u1']
+        analyzer.analyze_user_behavior([_turn('Как дела?')], user_id='u1')
+        
+        assert analyzer._user_states['u1'] is state
+        assert list(state.recent_lengths) == [len('Привет'), len('Как дела?')]
+    
+    def test_repeated_text_is_scored(self):
+        """Тест: два одинаковых сообщения подряд ("ок", "ок") учитываются оба"""
+        analyzer = BehavioralAnalyzer()
+        
+        analyzer.analyze_user_behavior([_turn('ок')], user_id='u1')
+        analyzer.analyze_user_behavior([_turn('ок')], user_id='u1')
+        
+        assert len(analyzer._user_states['u1'].recent_lengths) == 2
+    
+    def test_turn_id_distinguishes_turns(self):
+        """Тест: ходы с одинаковым текстом различаются по turn_id, повтор хода не учитывается"""
+        analyzer = BehavioralAnalyzer()
+        
+        analyzer.analyze_user_behavior([_turn('ок', 'a')], user_id='u1')
+        analyzer.analyze_user_behavior([_turn('ок', 'b')], user_id='u1')
+        analyzer.analyze_user_behavior([_turn('ок', 'b')], user_id='u1')
+        
+        assert len(analyzer._user_states['u1'].recent_lengths) == 2
+    
+    def test_full_history_matches_full_analysis(self):
+        """Тест: дописываемая история с повторами дает тот же результат, что и пересборка"""
+        history = [_turn(text) for text in ['ок', 'ок', 'мне грустно', 'ок', 'ок']]
+        incremental = BehavioralAnalyzer()
+        
+        for count in range(1, len(history) + 1):
+            result = incremental.analyze_user_behavior(history[:count], user_id='u1')
+        
+        rebuilt = BehavioralAnalyzer().analyze_user_behavior(history, user_id='u1')
+        assert len(incremental._user_states['u1'].recent_lengths) == len(history)
+        assert result == rebuilt
+
+
+class TestBatchAnalysis:
+    """Тесты пакетного анализа: результат совпадает с полным анализом каждого диалога"""
+    
+    CONTEXTS = [
+        None,
+        {},
+        {'relationship_stage': 'introduction'},
+        {'relationship_stage': 'getting_acquainted'},
+        {'relationship_stage': 'building_trust'},
+        {'relationship_stage': 'close_friend', 'personalization_level': 0.9},
+        {'relationship_stage': 'confidant'},
+        {'personalization_level': 0.8},
+    ]
+    
+    @staticmethod
+    def _vocabulary(analyzer):
+        words = ['привет', 'как', 'дела', '?', '!', '...', 'я', 'мы', 'вчера', 'было', '😊', '😢']
+        for markers in analyzer.emotion_patterns.values():
+            for values in markers.values():
+                words.extend(values)
+        for lexicon in (analyzer.topic_patterns, analyzer.need_indicators,
+                        analyzer.intimacy_indicators, analyzer.communication_lexicons):
+            for values in lexicon.values():
+                words.extend(values)
+        return words
+    
+    def test_batch_matches_full_analysis(self):
+        """Тест: analyze_batch().to_analyses() == analyze_user_behavior по каждому диалогу"""
+        pytest.importorskip('numpy')
+        analyzer = BehavioralAnalyzer()
+        words = self._vocabulary(analyzer)
+        rng = random.Random(44)
+        
+        conversations, contexts = [], []
+        for index in range(400):
+            messages = []
+            for _ in range(rng.randint(0, 8)):
+                length = rng.choice([1, 3, 8, 30])
+                messages.append({'role': rng.choice(['user', 'user', 'assistant']),
+                                 'content': ' '.join(rng.choice(words) for _ in range(length))})
+            conversations.append(messages)
+            contexts.append(self.CONTEXTS[index % len(self.CONTEXTS)])
+        
+        batch = analyzer.analyze_batch(conversations, contexts).to_analyses(analyzer)
+        
+        for messages, context, batch_result in zip(conversations, contexts, batch):
+            full = analyzer.analyze_user_behavior(messages, None, context)
+            assert set(batch_result) == set(full)
+            for key, value in full.items():
+                if isinstance(value, float):
+                    assert batch_result[key] == pytest.approx(value), key
+                else:
+                    assert batch_result[key] == value, key
@@ -0,0 +1,199 @@
+
+import struct
+import pytest
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+# Импорт тестируемого модуля (пакет app.memory импортирует VectorMemory, ей нужен psycopg2)
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip('psycopg2')
+
+from app.memory.bulk_ingest import (
+    MessageRow,
+    VectorMemoryRow,
+    _encode_message_row,
+    _encode_row,
+    _timestamptz,
+    as_utc,
+    encode_copy_batch,
+    encode_vector,
+)
+from app.memory import vector_memory
+from app.memory.base import MemoryContext, Message
+from app.memory.vector_memory import MemoryWriteError, VectorMemory
+
+
+def _fields(data: bytes):
+    """Разбирает строку бинарного COPY на значения полей (None для NULL)"""
+    (count,) = struct.unpack_from('>h', data, 0)
+    offset = 2
+    fields = []
+    for _ in range(count):
+        (length,) = struct.unpack_from('>i', data, offset)
+        offset += 4
+        if length < 0:
+            fields.append(None)
+            continue
+        fields.append(data[offset:offset + length])
+        offset += length
+    assert offset == len(data)
+    return fields
+
+
+class TestBinaryCopyEncoder:
+    """Тесты бинарного кодирования строк для COPY"""
+    
+    def test_vector_encoding(self):
+        """Тест: pgvector - int16 dim, int16 unused, float4[dim]"""
+        data = encode_vector([0.5, -1.0, 2.0])
+        
+        assert struct.unpack('>hh3f', data) == (3, 0, 0.5, -1.0, 2.0)
+    
+    def test_naive_timestamp_is_utc(self):
+        """Тест: наивное время считается UTC, а не локальным временем воркера"""
+        naive = datetime(2024, 5, 1, 12, 0, 0)
+        aware = datetime(2024, 5, 1, 15, 0, 0, tzinfo=timezone(timedelta(hours=3)))
+        
+        assert as_utc(naive) == datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+        assert as_utc(aware) is aware
+        assert _timestamptz(naive) == _timestamptz(aware)
+        assert _timestamptz(datetime(2000, 1, 1, 0, 0, 1)) == struct.pack('>iq', 8, 1_000_000)
+    
+    def test_vector_memory_row(self):
+        """Тест: строка vector_memories кодирует все колонки по порядку"""
+        row = VectorMemoryRow(
+            user_id='u1', content='Привет', role='user',
+            timestamp=datetime(2000, 1, 1), day_number=3, importance_score=0.75,
+            embedding=[1.0, 2.0], topics=['работа'], metadata={'source': 'import'}
+        )
+        
+        fields = _fields(_encode_row(row))
+        
+        assert len(fields) == 10
+        assert fields[0] == b'u1'
+        assert fields[1] == 'Привет'.encode('utf-8')
+        assert fields[3] == struct.pack('>q', 0)
+        assert fields[4] == struct.pack('>i', 3)
+        assert fields[5] == struct.pack('>d', 0.75)
+        assert fields[6] == b'\x01' + '["работа"]'.encode('utf-8')
+        assert fields[8] == b'\x01{"source": "import"}'
+        assert fields[9] == encode_vector([1.0, 2.0])
+    
+    def test_missing_embedding_is_null(self):
+        """Тест: строка без эмбеддинга пишет NULL"""
+        row = VectorMemoryRow(user_id='u1', content='x', role='user', timestamp=datetime(2000, 1, 1),
+                              day_number=1, importance_score=0.5, embedding=[])
+        
+        assert _fields(_encode_row(row))[9] is None
+    
+    def test_message_row(self):
+        """Тест: строка messages - UUID, массивы text[]/int4[], boolean и NULL"""
+        row = MessageRow(
+            conversation_id='00000000-0000-0000-0000-000000000001',
+            user_id='00000000-0000-0000-0000-000000000002',
+            role='assistant', content='Да', created_at=datetime(2000, 1, 1),
+            parts=['a', 'bc'], delays_ms=[], has_question=True
+        )
+        
+        fields = _fields(_encode_message_row(row))
+        
+        assert len(fields) == 11
+        assert fields[0] == bytes(15) + b'\x01'
+        assert fields[1] == bytes(15) + b'\x02'
+        assert fields[5] == (struct.pack('>iiiii', 1, 0, 25, 2, 1)
+                             + struct.pack('>i', 1) + b'a' + struct.pack('>i', 2) + b'bc')
+        assert fields[6] == struct.pack('>iii', 0, 0, 23)
+        assert fields[7] == b'\x01'
+        assert fields[8] is None and fields[9] is None and fields[10] is None
+    
+    def test_copy_batch_framing(self):
+        """Тест: пачка - сигнатура PGCOPY, строки и завершитель -1"""
+        row = VectorMemoryRow(user_id='u1', content='x', role='user', timestamp=datetime(2000, 1, 1),
+                              day_number=1, importance_score=0.5, embedding=[0.1])
+        
+        data = encode_copy_batch(_encode_row, [row, row])
+        
+        assert data.startswith(b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0))
+        assert data.endswith(struct.pack('>h', -1))
+        assert data.count(_encode_row(row)) == 2
+
+
+class _Provider:
+    """Провайдер соединений: conn=None - БД недоступна"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+class _Connection:
+    def __init__(self):
+        self.commits = 0
+    
+    def commit(self):
+        self.commits += 1
+
+
+class TestAddMessages:
+    """Тесты пакетной записи VectorMemory.add_messages"""
+    
+    MESSAGES = [
+        Message(role='user', content='ок', timestamp=datetime(2024, 5, 1, 12, 0)),
+        Message(role='user', content='Как ты думаешь, что мне делать?', timestamp=datetime(2024, 5, 1, 12, 1)),
+    ]
+    EMBEDDINGS = [[0.0], [0.1]]
+    
+    @pytest.fixture
+    def memory(self, monkeypatch):
+        memory = VectorMemory('u1')
+        monkeypatch.setattr(memory, '_ensure_tables', lambda: True)
+        monkeypatch.setattr(memory, '_cleanup_old_memories', lambda conn: None)
+        return memory
+    
+    def test_nothing_important_returns_zero(self, memory):
+        """Тест: 0 - ни одно сообщение не прошло порог, к БД не обращаемся"""
+        memory.db_pool = _Provider(None)
+        
+        assert memory.add_messages(self.MESSAGES[:1], MemoryContext(user_id='u1')) == 0
+    
+    def test_written_rows(self, memory, monkeypatch):
+        """Тест: важные сообщения пишутся одним COPY и коммитятся"""
+        conn = _Connection()
+        memory.db_pool = _Provider(conn)
+        copied = []
+        monkeypatch.setattr(vector_memory, 'copy_vector_memories',
+                            lambda conn, rows: copied.extend(rows) or len(rows))
+        
+        written = memory.add_messages(self.MESSAGES, MemoryContext(user_id='u1'), embeddings=self.EMBEDDINGS)
+        
+        assert written == 1
+        assert [row.embedding for row in copied] == [[0.1]]
+        assert conn.commits == 1
+    
+    def test_database_unavailable_raises(self, memory):
+        """Тест: недоступная БД - MemoryWriteError, а не 0"""
+        memory.db_pool = _Provider(None)
+        
+        with pytest.raises(MemoryWriteError):
+            memory.add_messages(self.MESSAGES, MemoryContext(user_id='u1'), embeddings=self.EMBEDDINGS)
+    
+    def test_copy_failure_raises(self, memory, monkeypatch):
+        """Тест: ошибка COPY - MemoryWriteError с исходной причиной"""
+        conn = _Connection()
+        memory.db_pool = _Provider(conn)
+        
+        def fail(conn, rows):
+            raise RuntimeError('copy failed')
+        monkeypatch.setattr(vector_memory, 'copy_vector_memories', fail)
+        
+        with pytest.raises(MemoryWriteError) as error:
+            memory.add_messages(self.MESSAGES, MemoryContext(user_id='u1'), embeddings=self.EMBEDDINGS)
+        
+        assert isinstance(error.value.__cause__, RuntimeError)
+        assert conn.commits == 0
@@ -1,6 +1,9 @@
 
 import os
+import copy
 import json
+import pickle
+import types
 import yaml
 import pytest
 import tempfile
@@ -14,14 +17,39 @@ from datetime import datetime, timedelta
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 
+from app.config import production_config_manager
 from app.config.production_config_manager import (
     ProductionConfigManager, 
     ConfigManagerConfig,
     ConfigCache,
-    CacheEntry
+    CacheEntry,
+    FrozenConfig,
+    freeze_config,
+    thaw_config
 )
 
 
+class _Clock:
+    """Управляемое время для TTL и LRU кеша"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+    
+    def tick(self, seconds=1.0):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(production_config_manager, 'time',
+                        types.SimpleNamespace(monotonic=fake.monotonic, time=time.time, sleep=time.sleep))
+    return fake
+
+
 class TestConfigCache:
     """Тесты для ConfigCache"""
     
@@ -108,6 +136,108 @@ class TestConfigCache:
         assert cache.get('key2') is None  # Должен быть вытеснен
         assert cache.get('key3') == {'value': 3}  # Должен остаться
         assert cache.get('key4') == {'value': 4}  # Новый элемент
+    
+    def test_cache_lru_eviction_across_namespaces(self, clock):
+        """Тест: вытесняется самый старый по обращению элемент среди всех namespace"""
+        cache = ConfigCache(max_size=3)
+        
+        cache.set('a', 1, ttl_seconds=60, namespace='ns1')
+        clock.tick()
+        cache.set('b', 2, ttl_seconds=60, namespace='ns2')
+        clock.tick()
+        cache.set('c', 3, ttl_seconds=60, namespace='ns1')
+        clock.tick()
+        cache.get('a', namespace='ns1')  # a свежий, голова ns1 - c
+        clock.tick()
+        
+        cache.set('d', 4, ttl_seconds=60, namespace='ns3')
+        
+        assert cache.get('b', namespace='ns2') is None
+        assert len(cache) == 3
+        
+        clock.tick()
+        cache.set('e', 5, ttl_seconds=60, namespace='ns2')
+        
+        assert cache.get('c', namespace='ns1') is None
+        assert cache.get('a', namespace='ns1') == 1
+        assert cache.get('d', namespace='ns3') == 4
+        assert cache.get('e', namespace='ns2') == 5
+    
+    def test_cache_ttl_expiry_removes_entry(self, clock):
+        """Тест: истекший элемент не возвращается и удаляется из шарда"""
+        cache = ConfigCache()
+        cache.set('key1', {'value': 1}, ttl_seconds=10, namespace='ns1')
+        
+        clock.tick(10)
+        assert cache.get('key1', namespace='ns1') == {'value': 1}
+        
+        clock.tick(1)
+        assert cache.get('key1', namespace='ns1') is None
+        assert len(cache) == 0
+    
+    def test_cache_get_does_not_wait_for_shard_lock(self, clock):
+        """Тест: попадание читается без ожидания лока шарда (порядок LRU тогда не меняется)"""
+        cache = ConfigCache()
+        cache.set('key1', 1, ttl_seconds=60, namespace='ns1')
+        cache.set('key2', 2, ttl_seconds=60, namespace='ns1')
+        shard = cache._shards['ns1']
+        
+        clock.tick()
+        with shard.lock:
+            assert cache.get('key1', namespace='ns1') == 1
+        
+        assert list(shard.entries) == ['key1', 'key2']
+        assert shard.entries['key1'].last_access == clock.now
+        
+        cache.get('key1', namespace='ns1')
+        assert list(shard.entries) == ['key2', 'key1']
+
+
+class TestFrozenConfig:
+    """Тесты неизменяемых снимков конфигурации"""
+    
+    def test_snapshot_rejects_mutation(self):
+        """Тест: снимок и вложенные значения нельзя изменить"""
+        snapshot = freeze_config({'nested': {'param': 1}, 'items': [1, {'x': 2}]}, version=3)
+        
+        assert isinstance(snapshot, FrozenConfig)
+        assert snapshot.version == 3
+        assert snapshot['items'] == (1, {'x': 2})
+        for mutate in (lambda: snapshot.__setitem__('new', 1),
+                       lambda: snapshot.__delitem__('nested'),
+                       lambda: snapshot.update(new=1),
+                       lambda: snapshot.pop('nested'),
+                       lambda: snapshot.setdefault('new', 1),
+                       lambda: snapshot.clear(),
+                       lambda: snapshot['nested'].__setitem__('param', 2),
+                       lambda: snapshot['items'][1].update(x=3)):
+            with pytest.raises(TypeError):
+                mutate()
+        assert snapshot == {'nested': {'param': 1}, 'items': (1, {'x': 2})}
+    
+    def test_copies_are_mutable(self):
+        """Тест: deepcopy и thaw_config дают изменяемую копию, снимок не меняется"""
+        snapshot = freeze_config({'nested': {'param': 1}, 'items': [1, 2]})
+        
+        for thawed in (copy.deepcopy(snapshot), thaw_config(snapshot)):
+            thawed['nested']['param'] = 2
+            thawed['items'].append(3)
+            assert type(thawed) is dict
+        
+        shallow = copy.copy(snapshot)
+        shallow['new'] = True
+        assert snapshot == {'nested': {'param': 1}, 'items': (1, 2)}
+    
+    def test_pickle_keeps_version(self):
+        """Тест: снимок переживает pickle вместе с версией"""
+        snapshot = freeze_config({'a': 1}, version=7)
+        
+        restored = pickle.loads(pickle.dumps(snapshot))
+        
+        assert restored == snapshot
+        assert restored.version == 7
+        with pytest.raises(TypeError):
+            restored['a'] = 2
 
 
 class TestConfigManagerConfig:
@@ -292,6 +422,37 @@ class TestProductionConfigManager:
         assert config1 == config2
         assert manager._metrics['cache_misses'] > cache_misses_before  # Должно увеличиться
     
+    def test_snapshot_shared_and_read_only(self, config_manager_no_db):
+        """Тест: get_config отдает один и тот же неизменяемый снимок"""
+        manager = config_manager_no_db
+        
+        config1 = manager.get_config('memory_thresholds')
+        config2 = manager.get_config('memory_thresholds')
+        
+        assert isinstance(config1, FrozenConfig)
+        assert config1 is config2
+        with pytest.raises(TypeError):
+            config1['semantic_similarity'] = 0.9
+    
+    def test_version_increases_on_update(self, config_manager_no_db, temp_config_dir):
+        """Тест: изменение конфига повышает версию, старый снимок не меняется"""
+        manager = config_manager_no_db
+        old = manager.get_config('memory_thresholds')
+        old_version = manager.get_config_version('memory_thresholds')
+        
+        file_path = Path(temp_config_dir) / 'memory_thresholds.yml'
+        with open(file_path, 'w') as f:
+            yaml.dump({'semantic_similarity': 0.9}, f)
+        manager._reload_file_config(file_path)
+        
+        new = manager.get_config('memory_thresholds')
+        assert manager.get_config_version('memory_thresholds') == old_version + 1
+        assert new.version > old.version
+        assert new['semantic_similarity'] == 0.9
+        assert old['semantic_similarity'] == 0.5
+        # Версии других конфигов не меняются
+        assert manager.get_config_version('search_weights') == 0
+    
     def test_default_values(self, config_manager_no_db):
         """Тест возврата значений по умолчанию"""
         manager = config_manager_no_db
@@ -0,0 +1,135 @@
+
+from pathlib import Path
+
+import pytest
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils import conversation_state as conversation_state_module
+from app.utils.conversation_state import (
+    ConversationStateStore,
+    LocalConversationStateBackend,
+    RedisConversationStateBackend,
+    create_conversation_state_backend,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(conversation_state_module.time, 'monotonic', fake)
+    return fake
+
+
+class _FailingBackend:
+    def __init__(self):
+        self.calls = 0
+    
+    def __getattr__(self, name):
+        def fail(*args):
+            self.calls += 1
+            raise ConnectionError('redis down')
+        return fail
+
+
+class TestLocalConversationStateBackend:
+    """Тесты локального хранилища состояния диалогов"""
+    
+    def test_counters(self):
+        """Тест: incr возвращает новое значение, set_counter перезаписывает"""
+        backend = LocalConversationStateBackend()
+        
+        assert backend.counter('u1', 'messages') == 0
+        assert backend.incr('u1', 'messages') == 1
+        assert backend.incr('u1', 'messages', 2) == 3
+        backend.set_counter('u1', 'messages', 0)
+        assert backend.counter('u1', 'messages') == 0
+        assert backend.counter('u2', 'messages') == 0
+    
+    def test_push_limit_and_unique(self):
+        """Тест: история ограничена limit последних, unique не дублирует элементы"""
+        backend = LocalConversationStateBackend()
+        
+        for topic in ['работа', 'кино', 'спорт', 'еда']:
+            backend.push('u1', 'topics', topic, limit=3)
+        assert backend.recent('u1', 'topics') == ['кино', 'спорт', 'еда']
+        
+        assert backend.push('u1', 'topics', 'кино', limit=3, unique=True) == ['кино', 'спорт', 'еда']
+        assert backend.push('u1', 'topics', 'кино', limit=3) == ['спорт', 'еда', 'кино']
+    
+    def test_recent_returns_copy(self):
+        """Тест: изменение возвращенного списка не меняет состояние"""
+        backend = LocalConversationStateBackend()
+        backend.push('u1', 'topics', 'работа', limit=3)
+        
+        backend.recent('u1', 'topics').append('лишнее')
+        
+        assert backend.recent('u1', 'topics') == ['работа']
+    
+    def test_idle_and_excess_users_evicted(self, clock):
+        """Тест: простаивающие дольше idle_ttl и лишние сверх max_users вытесняются"""
+        backend = LocalConversationStateBackend(max_users=2, idle_ttl=60)
+        backend.incr('u1', 'messages')
+        backend.incr('u2', 'messages')
+        
+        backend.incr('u3', 'messages')
+        assert len(backend) == 2
+        assert backend.counter('u1', 'messages') == 0
+        
+        clock.now += 61
+        backend.incr('u4', 'messages')
+        assert len(backend) == 1
+        assert backend.counter('u4', 'messages') == 1
+
+
+class TestConversationStateStore:
+    """Тесты хранилища состояния поверх backend'а"""
+    
+    def test_user_ids_normalized(self):
+        """Тест: числовой и строковый user_id - один пользователь"""
+        store = ConversationStateStore()
+        
+        store.incr(42, 'messages')
+        
+        assert store.counter('42', 'messages') == 1
+    
+    def test_backend_error_falls_back_and_retries_later(self, clock):
+        """Тест: при ошибке backend'а retry_after секунд используется локальный"""
+        failing = _FailingBackend()
+        store = ConversationStateStore(failing, retry_after=30)
+        
+        assert store.incr('u1', 'messages') == 1
+        assert store.incr('u1', 'messages') == 2
+        assert failing.calls == 1
+        
+        clock.now += 31
+        assert store.push('u1', 'topics', 'кино', limit=3) == ['кино']
+        assert failing.calls == 2
+    
+    def test_factory(self):
+        """Тест: redis без URL (или без пакета redis) заменяется локальным backend'ом"""
+        backend = create_conversation_state_backend('redis', redis_url=None, max_users=5, idle_ttl=10)
+        
+        assert isinstance(backend, LocalConversationStateBackend)
+        assert backend._max_users == 5
+        assert isinstance(create_conversation_state_backend('local'), LocalConversationStateBackend)
+
+
+class TestRedisConversationStateBackend:
+    """Тесты разбора ответов Redis backend'а"""
+    
+    def test_decode_list(self):
+        """Тест: пустая таблица cjson ({}) и отсутствующее поле - пустой список"""
+        assert RedisConversationStateBackend._decode_list(None) == []
+        assert RedisConversationStateBackend._decode_list('{}') == []
+        assert RedisConversationStateBackend._decode_list('["кино", "спорт"]') == ['кино', 'спорт']
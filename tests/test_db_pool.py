@@ -0,0 +1,123 @@
+
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Импорт тестируемого модуля (пакет app.memory импортирует VectorMemory, ей нужен psycopg2)
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+from app.memory.db_pool import PgConnectionProvider, PoolExhaustedError
+
+
+class _Cursor:
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def execute(self, query, params=None):
+        pass
+
+
+class _Connection:
+    closed = 0
+    status = psycopg2.extensions.STATUS_READY
+    
+    def cursor(self):
+        return _Cursor()
+    
+    def rollback(self):
+        pass
+
+
+class _Pool:
+    """Пул на maxconn соединений с семантикой ThreadedConnectionPool.getconn"""
+    
+    closed = False
+    
+    def __init__(self, maxconn):
+        self.free = [_Connection() for _ in range(maxconn)]
+        self.lock = threading.Lock()
+    
+    def getconn(self):
+        with self.lock:
+            if not self.free:
+                raise psycopg2.pool.PoolError("connection pool exhausted")
+            return self.free.pop()
+    
+    def putconn(self, conn, close=False):
+        with self.lock:
+            self.free.append(conn)
+
+
+def _provider(maxconn, pool_size=None, checkout_timeout=0.2):
+    provider = PgConnectionProvider(max_connections=maxconn, checkout_timeout=checkout_timeout)
+    provider._pool = _Pool(pool_size if pool_size is not None else maxconn)
+    return provider
+
+
+class TestPgConnectionProviderExhaustion:
+    """Тесты выдачи соединений при занятом пуле"""
+    
+    def test_waits_for_released_connection(self):
+        """Тест: при занятом пуле выдача ждет освобождения, а не возвращает None"""
+        provider = _provider(1, checkout_timeout=2.0)
+        taken = threading.Event()
+        
+        def hold():
+            with provider.connection() as conn:
+                assert conn is not None
+                taken.set()
+                time.sleep(0.1)
+        
+        holder = threading.Thread(target=hold)
+        holder.start()
+        taken.wait(1)
+        with provider.connection() as conn:
+            assert conn is not None
+        holder.join()
+    
+    def test_exhaustion_raises_without_backoff(self):
+        """Тест: пул занят дольше checkout_timeout - PoolExhaustedError, БД не считается недоступной"""
+        provider = _provider(1, checkout_timeout=0.05)
+        
+        with provider.connection():
+            with pytest.raises(PoolExhaustedError):
+                with provider.connection():
+                    pass
+        
+        assert provider._failures == 0
+        assert provider._retry_at == 0.0
+        with provider.connection() as conn:
+            assert conn is not None
+    
+    def test_shared_pool_busy_elsewhere(self):
+        """Тест: общий пул занят другими модулями - повтор до освобождения, затем ошибка"""
+        provider = _provider(2, pool_size=1, checkout_timeout=0.3)
+        other = provider._pool.getconn()
+        
+        threading.Timer(0.05, provider._pool.putconn, args=(other,)).start()
+        with provider.connection() as conn:
+            assert conn is not None
+            with pytest.raises(PoolExhaustedError):
+                with provider.connection():
+                    pass
+        assert provider._failures == 0
+    
+    def test_slots_released_after_error(self):
+        """Тест: ошибка внутри блока возвращает и соединение, и место в очереди"""
+        provider = _provider(1)
+        
+        with pytest.raises(ValueError):
+            with provider.connection():
+                raise ValueError("query failed")
+        
+        with provider.connection() as conn:
+            assert conn is not None
+        assert len(provider._pool.free) == 1
@@ -0,0 +1,112 @@
+
+import asyncio
+import logging
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.bots.delivery import ReplyDeliveryScheduler
+
+
+class TestReplyDeliveryScheduler:
+    """Тесты доставки многочастных ответов"""
+    
+    def test_parts_sent_in_order(self):
+        """Тест: части уходят по очереди, между ними - индикатор набора"""
+        events = []
+        
+        async def send(text):
+            events.append(text)
+        
+        async def typing():
+            events.append('typing')
+        
+        async def main():
+            scheduler = ReplyDeliveryScheduler()
+            scheduler.schedule(1, ['раз', 'два', 'три'], [0, 10, 10], send, typing)
+            assert len(scheduler._tasks) == 1
+            await asyncio.sleep(0.1)
+            return scheduler
+        
+        scheduler = asyncio.run(main())
+        
+        assert events == ['раз', 'typing', 'два', 'typing', 'три']
+        assert scheduler.pending_count() == 0
+        assert not scheduler._tasks
+    
+    def test_cancel_stops_remaining_parts(self):
+        """Тест: новое сообщение пользователя отменяет неотправленные части"""
+        sent = []
+        
+        async def send(text):
+            sent.append(text)
+        
+        async def main():
+            scheduler = ReplyDeliveryScheduler()
+            scheduler.schedule(1, ['раз', 'два'], [0, 50], send)
+            await asyncio.sleep(0.01)
+            assert scheduler.cancel(1)
+            await asyncio.sleep(0.08)
+            return scheduler
+        
+        scheduler = asyncio.run(main())
+        
+        assert sent == ['раз']
+        assert scheduler.pending_count() == 0
+    
+    def test_task_failure_is_logged(self, caplog):
+        """Тест: исключение задачи доставки не теряется, ссылка на задачу освобождается"""
+        async def send(text):
+            pass
+        
+        async def main():
+            scheduler = ReplyDeliveryScheduler()
+            # Ошибка вне обработки send: сломанная задержка следующей части
+            scheduler.schedule(1, ['раз', 'два'], [0, 'x'], send)
+            await asyncio.sleep(0.05)
+            return scheduler
+        
+        with caplog.at_level(logging.ERROR, logger='app.bots.delivery'):
+            scheduler = asyncio.run(main())
+        
+        assert 'Reply delivery task failed' in caplog.text
+        assert not scheduler._tasks
+    
+    def test_empty_part_drops_its_delay(self):
+        """Тест: пустая часть не сдвигает задержки следующих частей"""
+        async def send(text):
+            pass
+        
+        async def main():
+            scheduler = ReplyDeliveryScheduler()
+            scheduler.schedule(1, ['раз', '', 'два', 'три'], [0, 500, 10, 20], send)
+            delivery = scheduler._pending[1]
+            scheduler.cancel(1)
+            return delivery
+        
+        delivery = asyncio.run(main())
+        
+        assert delivery.parts == ['раз', 'два', 'три']
+        assert delivery.delays_ms == [0, 10, 20]
+    
+    def test_missing_delays_padded(self):
+        """Тест: недостающие задержки - 0, лишние отбрасываются"""
+        async def send(text):
+            pass
+        
+        async def main():
+            scheduler = ReplyDeliveryScheduler()
+            scheduler.schedule(1, ['раз', 'два'], None, send)
+            first = scheduler._pending[1]
+            scheduler.schedule(2, ['раз'], [0, 100, 200], send)
+            second = scheduler._pending[2]
+            scheduler.cancel(1)
+            scheduler.cancel(2)
+            return first, second
+        
+        first, second = asyncio.run(main())
+        
+        assert first.delays_ms == [0, 0]
+        assert second.delays_ms == [0]
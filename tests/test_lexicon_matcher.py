@@ -0,0 +1,128 @@
+
+import random
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.lexicon_matcher import LexiconMatcher, LexiconService
+
+
+class TestLexiconMatcher:
+    """Тесты подсчета вхождений LexiconMatcher"""
+    
+    def test_counts_match_str_count(self):
+        """Тест: число вхождений каждого шаблона совпадает с str.count (без перекрытий)"""
+        patterns = ['а', 'аа', 'аба', 'ба', 'б', 'абаб', 'ааа']
+        matcher = LexiconMatcher({'letters': patterns})
+        rng = random.Random(41)
+        
+        for _ in range(300):
+            text = ''.join(rng.choice('аб ') for _ in range(rng.randint(0, 30)))
+            scan = matcher.scan(text)
+            for pattern in patterns:
+                assert scan.count(pattern) == text.count(pattern), (pattern, text)
+    
+    def test_overlapping_occurrences_not_counted(self):
+        """Тест: перекрывающиеся вхождения одного шаблона считаются как в str.count"""
+        matcher = LexiconMatcher({'x': ['аа']})
+        
+        assert matcher.scan('аааа').count('аа') == 2
+        assert matcher.scan('ааа').count('аа') == 1
+    
+    def test_weighted_scores_and_shared_patterns(self):
+        """Тест: балл категории - сумма вхождений с весами; шаблон может быть в нескольких категориях"""
+        matcher = LexiconMatcher({
+            'positive': {'рад': 2.0, 'класс': 1.0},
+            'excited': ['класс', '!'],
+        })
+        
+        scores = matcher.scores('Рад, что класс! Класс!!')
+        
+        assert scores == {'positive': 4.0, 'excited': 5.0}
+    
+    def test_unmatched_categories_and_patterns_order(self):
+        """Тест: категории без вхождений - 0.0, найденные шаблоны в порядке объявления"""
+        matcher = LexiconMatcher({'topic': ['работа', 'офис', 'начальник'], 'other': ['кот']})
+        
+        scan = matcher.scan('Начальник в офисе')
+        
+        assert matcher.scores('Начальник в офисе')['other'] == 0.0
+        assert not scan.matched('other')
+        assert scan.patterns('topic') == ['офис', 'начальник']
+    
+    def test_case_sensitive_mode(self):
+        """Тест: lowercase=False не приводит текст к нижнему регистру"""
+        matcher = LexiconMatcher({'x': ['Да']}, lowercase=False)
+        
+        assert matcher.scan('Да да Да').count('Да') == 2
+    
+    def test_scans_add_up(self):
+        """Тест: сумма просмотров равна просмотру каждого сообщения по отдельности"""
+        matcher = LexiconMatcher({'x': {'ок': 1.5}})
+        
+        total = sum(matcher.scan(text) for text in ['ок', 'ок ок', 'нет'])
+        
+        assert total.count('ок') == 3
+        assert total.score('x') == 4.5
+
+
+class TestLexiconServiceContentNamespaces:
+    """Тесты регистрации лексиконов конфигурации по содержимому"""
+    
+    def test_different_configs_do_not_overwrite(self):
+        """Тест: конфигурации разных пользователей не перетирают друг друга"""
+        service = LexiconService()
+        first_config = {'topic:work': ['работа']}
+        second_config = {'topic:work': ['офис']}
+        
+        first = service.register_content('memory', first_config)
+        second = service.register_content('memory', second_config)
+        
+        assert first != second
+        assert service.match(first, 'работа и офис') == {'topic:work': 1.0}
+        assert service.match(first, 'офис') == {}
+        assert service.match(second, 'офис') == {'topic:work': 1.0}
+    
+    def test_same_content_shares_namespace_without_rebuild(self):
+        """Тест: одинаковые лексиконы делят пространство, автомат не пересобирается"""
+        service = LexiconService()
+        first = service.register_content('memory', {'topic:work': ['работа']})
+        matcher = service._get_matcher()
+        
+        second = service.register_content('memory', {'topic:work': ['работа']})
+        
+        assert first == second
+        assert service._get_matcher() is matcher
+    
+    def test_source_skips_lexicon_build(self):
+        """Тест: повторный вызов с тем же source не вычисляет лексиконы"""
+        service = LexiconService()
+        config = {'topic:work': ['работа']}
+        calls = []
+        
+        def build():
+            calls.append(1)
+            return config
+        
+        first = service.register_content('memory', build, source=config)
+        second = service.register_content('memory', build, source=config)
+        other = service.register_content('other', build, source=config)
+        
+        assert first == second
+        assert other.startswith('other:')
+        assert len(calls) == 2
+    
+    def test_stale_variants_evicted(self):
+        """Тест: старые варианты конфигурации вытесняются из автомата"""
+        service = LexiconService()
+        limit = service._MAX_CONTENT_NAMESPACES
+        namespaces = [service.register_content('memory', {'topic': [f'слово{i}']})
+                      for i in range(limit + 1)]
+        
+        assert namespaces[0] not in service._namespaces
+        assert all(namespace in service._namespaces for namespace in namespaces[1:])
+        # Вытесненный вариант регистрируется заново при следующем обращении
+        again = service.register_content('memory', {'topic': ['слово0']})
+        assert service.match(again, 'слово0') == {'topic': 1.0}
@@ -0,0 +1,83 @@
+
+import random
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.message_splitter import MessageSplitter
+
+
+def _stream(splitter, text, chunk_sizes):
+    """Прогоняет текст через MessageStream фрагментами заданных размеров"""
+    stream = splitter.stream()
+    parts = []
+    position = 0
+    while position < len(text):
+        size = next(chunk_sizes)
+        parts += stream.feed(text[position:position + size])
+        position += size
+    return parts + stream.close()
+
+
+def _fixed(size):
+    while True:
+        yield size
+
+
+class TestMessageStream:
+    """Тесты для потокового разбиения MessageStream"""
+    
+    def test_limit_keeps_started_group(self):
+        """Тест: при достижении лимита частей начатая группа не теряется"""
+        splitter = MessageSplitter(max_length=20)
+        text = "Один два три. Четыре пять шесть. Семь восемь девять. Десять одиннадцать. Конец."
+        
+        parts = _stream(splitter, text, _fixed(1))
+        
+        assert parts == ['Один два три.', 'Четыре пять шесть.',
+                         'Семь восемь девять. Десять одиннадцать. Конец.']
+    
+    def test_output_preserves_text(self):
+        """Тест: склеенные части содержат весь исходный текст"""
+        words = "один два три, четыре и пять! шесть? семь: восемь; девять. десять…".split()
+        rng = random.Random(0)
+        splitter = MessageSplitter()
+        
+        for _ in range(500):
+            splitter.max_length = rng.choice([15, 20, 40, 80])
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 60)))
+            if rng.random() < 0.3:
+                text = text.replace('. ', '.\n\n', 2)
+            
+            parts = _stream(splitter, text, iter(lambda: rng.randint(1, 7), None))
+            
+            assert len(parts) <= 3
+            assert ' '.join(parts).split() == text.split()
+    
+    def test_output_independent_of_chunking(self):
+        """Тест: результат не зависит от разбиения ответа на фрагменты"""
+        words = "один два три, четыре и пять! шесть? семь: восемь; девять. десять…".split()
+        rng = random.Random(1)
+        splitter = MessageSplitter()
+        
+        for _ in range(500):
+            splitter.max_length = rng.choice([15, 20, 40, 80])
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 60)))
+            if rng.random() < 0.3:
+                text = text.replace('. ', '.\n\n', 2)
+            
+            whole = _stream(splitter, text, _fixed(len(text)))
+            assert _stream(splitter, text, _fixed(1)) == whole
+            assert _stream(splitter, text, iter(lambda: rng.randint(1, 7), None)) == whole
+    
+    def test_short_text_single_part(self):
+        """Тест: короткий ответ отдается одной частью при close()"""
+        splitter = MessageSplitter()
+        stream = splitter.stream()
+        
+        assert stream.feed("Привет! Как ") == []
+        assert stream.feed("дела?") == []
+        assert stream.close() == ['Привет! Как дела?']
+        assert stream.close() == []
@@ -0,0 +1,144 @@
+
+import os
+import time
+import threading
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.config.file_watcher import ConfigFileWatcher
+from app.utils.prompt_assets import PromptAssetStore
+
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class TestPromptAssetStore:
+    """Тесты для PromptAssetStore"""
+    
+    def test_reload_on_change(self, tmp_path):
+        """Тест: измененный файл перечитывается, производное значение пересобирается"""
+        store = PromptAssetStore(check_interval=0, watch_enabled=False)
+        path = tmp_path / 'persona.txt'
+        path.write_text('Первая версия', encoding='utf-8')
+        builds = []
+        
+        def build():
+            builds.append(1)
+            return store.read(path).upper()
+        
+        assert store.read(path) == 'Первая версия'
+        assert store.derived('upper', [path], build) == 'ПЕРВАЯ ВЕРСИЯ'
+        assert store.derived('upper', [path], build) == 'ПЕРВАЯ ВЕРСИЯ'
+        assert len(builds) == 1
+        
+        path.write_text('Вторая, более длинная версия', encoding='utf-8')
+        
+        assert store.read(path) == 'Вторая, более длинная версия'
+        assert store.derived('upper', [path], build) == 'ВТОРАЯ, БОЛЕЕ ДЛИННАЯ ВЕРСИЯ'
+        assert len(builds) == 2
+        assert store.get_stats()['reloads'] == 1
+    
+    def test_cached_within_check_interval(self, tmp_path):
+        """Тест: без наблюдателя файл не проверяется чаще check_interval"""
+        store = PromptAssetStore(check_interval=60, watch_enabled=False)
+        path = tmp_path / 'style.txt'
+        path.write_text('старый стиль', encoding='utf-8')
+        
+        assert store.read(path) == 'старый стиль'
+        path.write_text('новый стиль', encoding='utf-8')
+        assert store.read(path) == 'старый стиль'
+        
+        store.invalidate([path])
+        assert store.read(path) == 'новый стиль'
+    
+    def test_missing_file(self, tmp_path):
+        """Тест: отсутствующий файл читается как None"""
+        store = PromptAssetStore(check_interval=0, watch_enabled=False)
+        
+        assert store.read(tmp_path / 'missing.txt') is None
+    
+    def test_watched_file_deleted(self, tmp_path):
+        """Тест: удаленный файл в наблюдаемом каталоге сбрасывается из кеша"""
+        store = PromptAssetStore(check_interval=60)
+        path = tmp_path / 'stage.txt'
+        path.write_text('этап', encoding='utf-8')
+        try:
+            assert store.watch([tmp_path])
+            assert store.read(path) == 'этап'
+            
+            path.unlink()
+            
+            assert _wait_for(lambda: store.read(path) is None)
+        finally:
+            store.stop()
+
+
+class TestConfigFileWatcher:
+    """Тесты для ConfigFileWatcher"""
+    
+    def _run_watcher(self, directory, use_inotify, action):
+        changes = []
+        watcher = ConfigFileWatcher([directory], changes.append, debounce_seconds=0.05,
+                                    poll_interval=0.05, use_inotify=use_inotify)
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            action()
+            _wait_for(lambda: bool(changes))
+        finally:
+            watcher.stop()
+            thread.join(timeout=2)
+            watcher.close()
+        return set().union(*changes) if changes else set()
+    
+    def test_polling_reports_deleted_and_renamed(self, tmp_path):
+        """Тест: опрос mtime сообщает об удаленных и переименованных файлах"""
+        deleted = tmp_path / 'deleted.yml'
+        renamed = tmp_path / 'renamed.yml'
+        deleted.write_text('a: 1')
+        renamed.write_text('b: 2')
+        
+        def action():
+            deleted.unlink()
+            os.rename(renamed, tmp_path / 'renamed.yml.bak')
+        
+        changed = self._run_watcher(tmp_path, False, action)
+        
+        assert {deleted, renamed} <= changed
+    
+    def test_inotify_reports_deleted(self, tmp_path):
+        """Тест: inotify (или опрос, если недоступен) сообщает об удалении файла"""
+        path = tmp_path / 'persona.txt'
+        path.write_text('x')
+        
+        changed = self._run_watcher(tmp_path, True, path.unlink)
+        
+        assert path in changed
+    
+    def test_stop_after_close_does_not_touch_reused_fd(self, tmp_path):
+        """Тест: stop() после close() не пишет в дескриптор, доставшийся другому файлу"""
+        watcher = ConfigFileWatcher([tmp_path], lambda paths: None, use_inotify=False)
+        watcher.close()
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        try:
+            watcher.stop()
+            
+            try:
+                data = os.read(read_fd, 16)
+            except BlockingIOError:
+                data = b''
+            assert data == b''
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
@@ -0,0 +1,131 @@
+
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.prompt_budget import PromptAssembler, PromptSection, TokenCounter
+
+
+class _CharCounter(TokenCounter):
+    """Счетчик по оценке 3 символа на токен - одинаковый с tiktoken и без него"""
+    
+    @staticmethod
+    def _load_encoding(model):
+        return None
+
+
+def _lines(prefix, count, width=12):
+    return '\n'.join(f"{prefix}{i:02d}".ljust(width, '.') for i in range(count))
+
+
+class TestPromptAssembler:
+    """Тесты для PromptAssembler"""
+    
+    def test_within_budget_untouched(self):
+        """Тест: секции в пределах бюджета не режутся"""
+        assembler = PromptAssembler(1000, _CharCounter('test'))
+        
+        assembled = assembler.assemble([PromptSection('a', 'первая'), PromptSection('b', 'вторая')])
+        
+        assert assembled.text == 'первая\n\nвторая'
+        assert not assembled.report['over_budget']
+        assert not any(section['trimmed'] for section in assembled.report['sections'].values())
+    
+    def test_section_max_tokens(self):
+        """Тест: секция обрезается до своего лимита целыми строками"""
+        assembler = PromptAssembler(1000, _CharCounter('test'))
+        text = _lines('факт', 10)
+        
+        assembled = assembler.assemble([PromptSection('facts', text, max_tokens=10)])
+        
+        assert assembled.report['sections']['facts']['tokens'] <= 10
+        assert text.startswith(assembled.sections['facts'])
+    
+    def test_trim_order_by_priority_then_later_sections(self):
+        """Тест: сначала режутся младшие по приоритету, при равенстве - более поздние"""
+        counter = _CharCounter('test')
+        sections = [
+            PromptSection('system', _lines('s', 5), priority=3),
+            PromptSection('early_low', _lines('e', 5), priority=0),
+            PromptSection('late_low', _lines('l', 5), priority=0),
+            PromptSection('middle', _lines('m', 5), priority=1),
+        ]
+        full = sum(counter.count(section.text) for section in sections)
+        # Бюджет без одной низкоприоритетной секции
+        assembler = PromptAssembler(full - counter.count(sections[2].text) + 3, counter)
+        
+        report = assembler.assemble(sections).report['sections']
+        
+        assert report['late_low']['trimmed']
+        assert not report['early_low']['trimmed']
+        assert not report['middle']['trimmed']
+        assert not report['system']['trimmed']
+    
+    def test_keep_tail_keeps_last_lines_and_header(self):
+        """Тест: keep_tail оставляет последние строки, заголовок секции не режется"""
+        assembler = PromptAssembler(30, _CharCounter('test'))
+        text = _lines('реплика', 10)
+        
+        assembled = assembler.assemble([
+            PromptSection('dialogue', text, keep_tail=True, header='[ТЕКУЩИЙ ДИАЛОГ]')
+        ])
+        
+        output = assembled.sections['dialogue']
+        assert output.startswith('[ТЕКУЩИЙ ДИАЛОГ]\n')
+        assert text.endswith(output.split('\n', 1)[1])
+        assert assembled.report['sections']['dialogue']['tokens'] <= 30
+    
+    def test_header_dropped_with_empty_section(self):
+        """Тест: заголовок не выводится без текста секции"""
+        assembler = PromptAssembler(1000, _CharCounter('test'))
+        
+        assembled = assembler.assemble([
+            PromptSection('system', 'система'),
+            PromptSection('summary', '', header='[КРАТКОСРОЧНАЯ ПАМЯТЬ]')
+        ])
+        
+        assert assembled.text == 'система'
+        assert assembled.report['sections']['summary']['tokens'] == 0
+    
+    def test_min_tokens_floor(self):
+        """Тест: секция не режется ниже min_tokens"""
+        counter = _CharCounter('test')
+        assembler = PromptAssembler(5, counter)
+        
+        assembled = assembler.assemble([PromptSection('context', _lines('к', 10), min_tokens=12)])
+        
+        # Текст режется целыми строками до уровня min_tokens, а не до бюджета
+        assert 5 < assembled.report['sections']['context']['tokens'] <= 12
+        assert assembled.report['over_budget']
+
+
+class TestPromptComposerBudget:
+    """Тесты бюджета промпта композитора с курсором"""
+    
+    def test_headers_and_marker_survive_trimming(self):
+        """Тест: заголовки памяти и маркер ответа сохраняются при обрезке"""
+        from app.utils.prompt_composer_with_cursor import (
+            PromptComposerWithCursor, SUMMARY_HEADER, DIALOGUE_HEADER, ASSISTANT_MARKER
+        )
+        
+        composer = PromptComposerWithCursor()
+        composer.budget = PromptAssembler(90, _CharCounter('test'))
+        short_memory = {
+            'summary_memory': [{'summary_text': f'резюме разговора {i}'} for i in range(20)],
+            'buffer': [
+                {'role': 'user' if i % 2 else 'assistant', 'text': f'сообщение номер {i}'}
+                for i in range(20)
+            ]
+        }
+        
+        prompt = composer.build_prompt('missing_base', 'missing_daily', 'care', short_memory)
+        
+        assert prompt.endswith(ASSISTANT_MARKER)
+        assert 'сообщение номер 19' in prompt
+        assert 'резюме разговора 0' not in prompt
+        for header in (SUMMARY_HEADER, DIALOGUE_HEADER):
+            if header in prompt:
+                assert prompt.split(header, 1)[1].startswith('\n')
+        assert DIALOGUE_HEADER in prompt
@@ -0,0 +1,83 @@
+
+from pathlib import Path
+
+import pytest
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.prompt_template import CompiledPromptTemplate, PrefixCache
+
+TEMPLATE = "Ты {name}.\n{bio}\n{{не слот}}\nКонтекст: {context}\nПамять: {memory}\nСнова {name}!"
+VALUES = {'name': 'Агата', 'bio': 'Биография', 'context': 'кофе', 'memory': 'вчера'}
+
+
+class TestCompiledPromptTemplate:
+    """Тесты скомпилированных шаблонов промптов"""
+    
+    def test_render_matches_format(self):
+        """Тест: рендер совпадает с str.format, включая экранированные скобки и спецификации"""
+        template = CompiledPromptTemplate(TEMPLATE + " {score:.2f} {name!r}")
+        values = dict(VALUES, score=0.5)
+        
+        assert template.render(**values) == (TEMPLATE + " {score:.2f} {name!r}").format(**values)
+        assert template.variables == ('name', 'bio', 'context', 'memory', 'score')
+    
+    def test_unsupported_slot(self):
+        """Тест: слоты с атрибутами и индексами не поддерживаются"""
+        with pytest.raises(ValueError):
+            CompiledPromptTemplate("{user.name}")
+    
+    def test_split_prefix_and_suffix_render_whole(self):
+        """Тест: префикс + остаток дают тот же текст, что и весь шаблон"""
+        template = CompiledPromptTemplate(TEMPLATE)
+        
+        prefix, suffix = template.split(['name', 'bio'])
+        
+        assert prefix.variables == ('name', 'bio')
+        assert suffix.variables == ('context', 'memory', 'name')
+        assert prefix.render(**VALUES) + suffix.render(**VALUES) == template.render(**VALUES)
+        # Статичный текст до первого динамического слота - в префиксе
+        assert prefix.render(**VALUES).endswith('\nКонтекст: ')
+    
+    def test_split_at_first_dynamic_slot(self):
+        """Тест: статичный слот после динамического остается в остатке"""
+        template = CompiledPromptTemplate(TEMPLATE)
+        
+        prefix, suffix = template.split(['name', 'memory'])
+        
+        assert prefix.variables == ('name',)
+        assert prefix.render(name='Агата') == 'Ты Агата.\n'
+        assert prefix.render(**VALUES) + suffix.render(**VALUES) == template.render(**VALUES)
+    
+    def test_split_all_static_or_none(self):
+        """Тест: без динамических слотов остаток пуст, без статичных - пуст префикс"""
+        template = CompiledPromptTemplate(TEMPLATE)
+        
+        prefix, suffix = template.split(VALUES)
+        assert suffix.is_static and suffix.render() == ''
+        assert prefix.render(**VALUES) == template.render(**VALUES)
+        
+        prefix, suffix = template.split([])
+        assert prefix.render() == 'Ты '
+        assert prefix.render() + suffix.render(**VALUES) == template.render(**VALUES)
+    
+    def test_literal_keeps_braces(self):
+        """Тест: literal() не разбирает скобки"""
+        assert CompiledPromptTemplate.literal('{x} {{y}}').render() == '{x} {{y}}'
+
+
+class TestPrefixCache:
+    """Тесты кеша отрендеренных префиксов"""
+    
+    def test_same_values_same_string(self):
+        """Тест: одинаковые значения дают тот же объект строки, LRU ограничен max_size"""
+        prefix, _ = CompiledPromptTemplate(TEMPLATE).split(['name', 'bio'])
+        cache = PrefixCache(prefix, max_size=1)
+        
+        first = cache.render(name='Агата', bio='Биография')
+        assert cache.render(name='Агата', bio='Биография') is first
+        
+        cache.render(name='Агата', bio='Другая')
+        assert cache.render(name='Агата', bio='Биография') is not first
@@ -0,0 +1,99 @@
+
+from pathlib import Path
+
+import pytest
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.bots import rate_limiter
+from app.bots.rate_limiter import GCRARateLimiter, LocalRateLimitBackend, create_rate_limit_backend
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake)
+    return fake
+
+
+class _FailingBackend:
+    def acquire(self, key, emission_interval, period):
+        raise ConnectionError('redis down')
+
+
+class TestGCRARateLimiter:
+    """Тесты GCRA rate limiter"""
+    
+    def test_burst_then_deny(self, clock):
+        """Тест: пропускается burst из limit событий, следующее отклоняется"""
+        limiter = GCRARateLimiter(limit=3, period=3.0)
+        
+        assert [limiter.allow('u1') for _ in range(4)] == [True, True, True, False]
+    
+    def test_recovers_after_emission_interval(self, clock):
+        """Тест: через period / limit секунд освобождается одно событие"""
+        limiter = GCRARateLimiter(limit=3, period=3.0)
+        for _ in range(3):
+            limiter.allow('u1')
+        
+        clock.now += 0.5
+        assert not limiter.allow('u1')
+        clock.now += 0.5
+        assert limiter.allow('u1')
+        assert not limiter.allow('u1')
+    
+    def test_denied_event_does_not_consume(self, clock):
+        """Тест: отклоненные события не отодвигают восстановление лимита"""
+        limiter = GCRARateLimiter(limit=2, period=2.0)
+        limiter.allow('u1')
+        limiter.allow('u1')
+        for _ in range(10):
+            assert not limiter.allow('u1')
+        
+        clock.now += 1.0
+        assert limiter.allow('u1')
+    
+    def test_keys_are_independent(self, clock):
+        """Тест: лимит одного ключа не влияет на другой"""
+        limiter = GCRARateLimiter(limit=1, period=1.0)
+        
+        assert limiter.allow('u1')
+        assert not limiter.allow('u1')
+        assert limiter.allow(2)
+    
+    def test_idle_keys_evicted(self, clock):
+        """Тест: ключи с TAT в прошлом вытесняются, размер ограничен max_keys"""
+        backend = LocalRateLimitBackend(max_keys=2)
+        limiter = GCRARateLimiter(limit=5, period=5.0, backend=backend)
+        limiter.allow('a')
+        limiter.allow('b')
+        
+        clock.now += 10
+        limiter.allow('c')
+        assert len(backend) == 1
+        
+        for key in ('d', 'e', 'f'):
+            limiter.allow(key)
+        assert len(backend) <= 2
+    
+    def test_backend_error_falls_back_to_local(self, clock):
+        """Тест: при ошибке общего backend'а лимит действует локально"""
+        limiter = GCRARateLimiter(limit=2, period=2.0, backend=_FailingBackend())
+        
+        assert [limiter.allow('u1') for _ in range(3)] == [True, True, False]
+        assert isinstance(limiter._fallback, LocalRateLimitBackend)
+    
+    def test_factory_without_redis_url_is_local(self):
+        """Тест: redis backend без URL (или без пакета redis) заменяется локальным"""
+        assert isinstance(create_rate_limit_backend('redis', redis_url=None), LocalRateLimitBackend)
+        assert isinstance(create_rate_limit_backend('local'), LocalRateLimitBackend)
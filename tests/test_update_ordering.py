@@ -0,0 +1,75 @@
+
+import asyncio
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.bots.update_ordering import ChatSerializer
+
+
+class TestChatSerializer:
+    """Тесты последовательной обработки апдейтов одного чата"""
+    
+    def test_same_chat_runs_in_order(self):
+        """Тест: работы одного чата не перекрываются и идут в порядке поступления"""
+        events = []
+        
+        async def handle(name, delay):
+            events.append(('start', name))
+            await asyncio.sleep(delay)
+            events.append(('end', name))
+        
+        async def main():
+            chats = ChatSerializer()
+            await asyncio.gather(
+                chats.run(1, handle('first', 0.02)),
+                chats.run(1, handle('second', 0)),
+            )
+            return chats
+        
+        chats = asyncio.run(main())
+        
+        assert events == [('start', 'first'), ('end', 'first'), ('start', 'second'), ('end', 'second')]
+        assert len(chats) == 0
+    
+    def test_different_chats_run_concurrently(self):
+        """Тест: разные чаты обрабатываются параллельно"""
+        events = []
+        
+        async def handle(name, delay):
+            events.append(('start', name))
+            await asyncio.sleep(delay)
+            events.append(('end', name))
+        
+        async def main():
+            chats = ChatSerializer()
+            await asyncio.gather(
+                chats.run(1, handle('slow', 0.02)),
+                chats.run(2, handle('fast', 0)),
+            )
+        
+        asyncio.run(main())
+        
+        assert events.index(('end', 'fast')) < events.index(('end', 'slow'))
+    
+    def test_lock_released_on_error(self):
+        """Тест: ошибка обработчика не блокирует следующие апдейты чата"""
+        async def fail():
+            raise ValueError("boom")
+        
+        async def ok():
+            return 'ok'
+        
+        async def main():
+            chats = ChatSerializer()
+            results = await asyncio.gather(chats.run(1, fail()), chats.run(1, ok()),
+                                           return_exceptions=True)
+            return chats, results
+        
+        chats, results = asyncio.run(main())
+        
+        assert isinstance(results[0], ValueError)
+        assert results[1] == 'ok'
+        assert len(chats) == 0
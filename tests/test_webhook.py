@@ -0,0 +1,65 @@
+
+from pathlib import Path
+
+# Импорт тестируемого модуля
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.bots.webhook import WebhookConfig, extract_chat_id, partition_for
+
+
+class TestExtractChatId:
+    """Тесты извлечения chat_id из сырых апдейтов Telegram"""
+    
+    def test_message(self):
+        """Тест: обычное и отредактированное сообщение - id чата"""
+        update = {'update_id': 1, 'message': {'message_id': 5, 'chat': {'id': 42}, 'from': {'id': 7}}}
+        edited = {'update_id': 2, 'edited_message': {'chat': {'id': -100123}, 'from': {'id': 7}}}
+        
+        assert extract_chat_id(update) == 42
+        assert extract_chat_id(edited) == -100123
+    
+    def test_callback_query_uses_message_chat(self):
+        """Тест: callback_query - чат вложенного сообщения, а не пользователь"""
+        update = {'update_id': 3, 'callback_query': {
+            'id': 'q', 'from': {'id': 7}, 'message': {'chat': {'id': 42}}
+        }}
+        
+        assert extract_chat_id(update) == 42
+    
+    def test_user_only_update(self):
+        """Тест: апдейт без чата (inline_query) - id пользователя"""
+        update = {'update_id': 4, 'inline_query': {'id': 'q', 'from': {'id': 7}, 'query': ''}}
+        
+        assert extract_chat_id(update) == 7
+    
+    def test_no_chat(self):
+        """Тест: апдейт без чата и пользователя - 0"""
+        assert extract_chat_id({'update_id': 5, 'poll': {'id': 'p', 'question': '?'}}) == 0
+        assert extract_chat_id({'update_id': 6}) == 0
+
+
+class TestPartitioning:
+    """Тесты распределения чатов по партициям"""
+    
+    def test_partition_in_range(self):
+        """Тест: партиция неотрицательна и для отрицательных id групп"""
+        for chat_id in (0, 1, 15, 16, -1, -100123456789):
+            assert 0 <= partition_for(chat_id, 16) < 16
+    
+    def test_same_chat_same_partition(self):
+        """Тест: все апдейты чата попадают в одну партицию"""
+        updates = [
+            {'update_id': 1, 'message': {'chat': {'id': -1001}}},
+            {'update_id': 2, 'edited_message': {'chat': {'id': -1001}}},
+            {'update_id': 3, 'callback_query': {'from': {'id': 7}, 'message': {'chat': {'id': -1001}}}},
+        ]
+        
+        assert len({partition_for(extract_chat_id(update), 16) for update in updates}) == 1
+    
+    def test_owned_partitions_cover_all(self):
+        """Тест: воркеры делят партиции без пересечений и пропусков"""
+        owned = [WebhookConfig(partitions=16, worker_index=index, worker_count=3).owned_partitions()
+                 for index in range(3)]
+        
+        assert sorted(p for partitions in owned for p in partitions) == list(range(16))